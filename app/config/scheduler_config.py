@@ -19,19 +19,97 @@ REDDIT_CATEGORIES = [
     "programming", "science", "history", "politics", "sports"
 ]
 
+# Categories the feeds and the in-process catalog precompute; requests for any
+# other category name go straight to the database
+MEME_CATEGORIES = [c.strip() for c in os.getenv("MEME_CATEGORIES", ",".join(REDDIT_CATEGORIES)).split(",") if c.strip()]
+# Categories the scheduled ingestion writes to; every worker announces their new memes to its streams
+INGESTION_CATEGORIES = list(dict.fromkeys(REDDIT_CATEGORIES + ["instagram"]))
+
 # Number of categories to fetch per cycle (randomly selected)
 REDDIT_CATEGORIES_PER_CYCLE = int(os.getenv("REDDIT_CATEGORIES_PER_CYCLE", "3"))
 
-# Delay between category fetches (to avoid rate limiting)
+# Legacy delay between category fetches (kept for backward compatibility but not used;
+# requests are now paced by the shared Reddit rate budget below)
 REDDIT_FETCH_DELAY_SECONDS = int(os.getenv("REDDIT_FETCH_DELAY_SECONDS", "2"))
 
+# Reddit rate budget: starting rate until Reddit's rate-limit headers are seen, and burst size
+REDDIT_REQUESTS_PER_MINUTE = float(os.getenv("REDDIT_REQUESTS_PER_MINUTE", "60"))
+REDDIT_REQUEST_BURST = float(os.getenv("REDDIT_REQUEST_BURST", "5"))
+# Subreddit listings fetched in parallel
+REDDIT_FETCH_CONCURRENCY = int(os.getenv("REDDIT_FETCH_CONCURRENCY", "4"))
+
 # Instagram fetch configuration
-INSTAGRAM_ACCOUNTS_PER_CYCLE = int(os.getenv("INSTAGRAM_ACCOUNTS_PER_CYCLE", "1"))
+INSTAGRAM_ACCOUNTS_PER_CYCLE = int(os.getenv("INSTAGRAM_ACCOUNTS_PER_CYCLE", "3"))
 INSTAGRAM_POSTS_PER_ACCOUNT = int(os.getenv("INSTAGRAM_POSTS_PER_ACCOUNT", "20"))
+# Accounts scraped at the same time, across the whole process
+INSTAGRAM_FETCH_CONCURRENCY = int(os.getenv("INSTAGRAM_FETCH_CONCURRENCY", "2"))
+# Parallel Cloudinary uploads per account
+INSTAGRAM_UPLOAD_CONCURRENCY = int(os.getenv("INSTAGRAM_UPLOAD_CONCURRENCY", "3"))
+# An account is not scraped again until this long after its last scrape
+INSTAGRAM_ACCOUNT_MIN_INTERVAL_SECONDS = int(os.getenv("INSTAGRAM_ACCOUNT_MIN_INTERVAL_SECONDS", "900"))
+# Per-cycle budget: stop uploading once either limit is reached
+INSTAGRAM_MAX_POSTS_PER_CYCLE = int(os.getenv("INSTAGRAM_MAX_POSTS_PER_CYCLE", "40"))
+INSTAGRAM_CYCLE_TIME_BUDGET_SECONDS = int(os.getenv("INSTAGRAM_CYCLE_TIME_BUDGET_SECONDS", "180"))
 
 # Logging configuration
 SCHEDULER_LOG_LEVEL = os.getenv("SCHEDULER_LOG_LEVEL", "INFO")
 
 # Error handling
 MAX_RETRIES_PER_CATEGORY = int(os.getenv("MAX_RETRIES_PER_CATEGORY", "3"))
-RETRY_DELAY_SECONDS = int(os.getenv("RETRY_DELAY_SECONDS", "30")) 
\ No newline at end of file
+RETRY_DELAY_SECONDS = int(os.getenv("RETRY_DELAY_SECONDS", "30")) 
+
+# Leader election: only the process holding the lock runs scheduled jobs.
+# "file" protects workers on one host, "postgres" uses an advisory lock across hosts,
+# "none" makes every process a leader (single-worker deployments).
+SCHEDULER_LEADER_LOCK = os.getenv("SCHEDULER_LEADER_LOCK", "file")
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", "/tmp/memee_scheduler.lock")
+SCHEDULER_LOCK_DATABASE_URL = os.getenv("SCHEDULER_LOCK_DATABASE_URL")
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "7243001"))
+# How often followers retry the lock (and the leader re-checks it)
+LEADER_ELECTION_INTERVAL_SECONDS = int(os.getenv("LEADER_ELECTION_INTERVAL_SECONDS", "60"))
+# How long stopping the scheduler waits to hand the leader lock back
+LEADER_RELEASE_TIMEOUT_SECONDS = int(os.getenv("LEADER_RELEASE_TIMEOUT_SECONDS", "10"))
+
+# Postgres connection string of the Supabase project (Settings > Database)
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
+# Persistent job store so a run missed during a restart is coalesced and run once.
+# Defaults to the Supabase database; the SQLite fallback lives in the working
+# directory, which is lost on every deploy to an ephemeral disk (e.g. Render).
+SCHEDULER_JOBSTORE_URL = os.getenv("SCHEDULER_JOBSTORE_URL") or SUPABASE_DB_URL or "sqlite:///scheduler_jobs.sqlite"
+if SCHEDULER_JOBSTORE_URL.startswith("postgres://"):
+    # Supabase hands out postgres:// URLs; SQLAlchemy only accepts postgresql://
+    SCHEDULER_JOBSTORE_URL = "postgresql://" + SCHEDULER_JOBSTORE_URL[len("postgres://"):]
+# A missed night session is still started if the process comes back within this window
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", str(NIGHT_FETCH_DURATION_MINUTES * 60)))
+
+# Yield-adaptive subreddit selection
+SUBREDDIT_STATS_FILE = os.getenv("SUBREDDIT_STATS_FILE", "subreddit_stats.json")
+# Weight of the latest fetch in the moving averages (higher reacts faster)
+SUBREDDIT_STATS_DECAY = float(os.getenv("SUBREDDIT_STATS_DECAY", "0.3"))
+# UCB exploration strength (0 = always pick the best known subreddit)
+SUBREDDIT_EXPLORATION = float(os.getenv("SUBREDDIT_EXPLORATION", "0.5"))
+# Subreddits that redirect or 404 are skipped for this long
+SUBREDDIT_BAN_HOURS = int(os.getenv("SUBREDDIT_BAN_HOURS", "24"))
+
+# Incremental Reddit fetching
+# "hot" re-reads the hot listing and filters posts already examined;
+# "new" reads the new listing with before=<newest seen post> so only unseen posts come back
+REDDIT_LISTING = os.getenv("REDDIT_LISTING", "hot")
+REDDIT_LISTING_LIMIT = int(os.getenv("REDDIT_LISTING_LIMIT", "25"))
+REDDIT_CHECKPOINT_FILE = os.getenv("REDDIT_CHECKPOINT_FILE", "reddit_checkpoints.json")
+# How many recently examined post ids are remembered per subreddit
+REDDIT_RECENT_ID_WINDOW = int(os.getenv("REDDIT_RECENT_ID_WINDOW", "200"))
+# Drop the before= anchor if nothing newer turned up for this long (the anchor post may be deleted)
+REDDIT_CHECKPOINT_STALE_HOURS = int(os.getenv("REDDIT_CHECKPOINT_STALE_HOURS", "24"))
+# Cycles a post whose upload or insert failed is retried before it is skipped for good
+REDDIT_MAX_UPLOAD_ATTEMPTS = int(os.getenv("REDDIT_MAX_UPLOAD_ATTEMPTS", "3"))
+
+# Instagram: logged-in clients kept alive and shared across scrapes (one Instagram session)
+INSTAGRAM_SESSION_POOL_SIZE = int(os.getenv("INSTAGRAM_SESSION_POOL_SIZE", "2"))
+
+# Media metadata backfill for memes stored before width/height/etc. were captured at ingest
+MEDIA_BACKFILL_INTERVAL_MINUTES = int(os.getenv("MEDIA_BACKFILL_INTERVAL_MINUTES", "60"))
+MEDIA_BACKFILL_BATCH_SIZE = int(os.getenv("MEDIA_BACKFILL_BATCH_SIZE", "100"))
+MEDIA_BACKFILL_CONCURRENCY = int(os.getenv("MEDIA_BACKFILL_CONCURRENCY", "4"))
+# Rows that could not be measured are tried again after this long
+MEDIA_BACKFILL_RETRY_HOURS = int(os.getenv("MEDIA_BACKFILL_RETRY_HOURS", "24"))
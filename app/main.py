@@ -17,11 +17,26 @@ logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("supabase").setLevel(logging.WARNING)
 logging.getLogger("cloudinary").setLevel(logging.WARNING)
 
-from app.routes import memes, products, fetch_memes, auth, friends, scheduler
+from app.routes import memes, products, fetch_memes, auth, friends, scheduler, feed, health
 from app.services.async_scheduler_service import async_meme_scheduler
+from app.services.integrations import start_warming
+from app.middleware import CompressionMiddleware, RateLimitMiddleware
+from app.services.meme_catalog import meme_catalog
+from app.services.engagement_buffer import engagement_buffer
+from app.services.leaderboard_service import leaderboards
+from app.services.trending_service import trending_index
+from app.config.scheduler_config import MEME_CATEGORIES
+
+# Heavy integrations are warmed in the background by the worker that wins the scheduler
+# election (it runs ingestion); other workers import them on first use. Set to true to
+# warm every worker right after startup instead.
+WARM_INTEGRATIONS_ON_STARTUP = os.getenv("WARM_INTEGRATIONS_ON_STARTUP", "false").lower() == "true"
 
 app = FastAPI(title="Memee Meme Aggregator API")
 
+# Per-user token buckets; added first so it runs innermost and 429s still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # CORS configuration
 origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 app.add_middleware(
@@ -30,7 +45,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
+# gzip/brotli for JSON bodies above COMPRESSION_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
 
 # Include routers
 app.include_router(memes.router)
@@ -39,6 +57,8 @@ app.include_router(fetch_memes.router)
 app.include_router(auth.router)
 app.include_router(friends.router)
 app.include_router(scheduler.router)
+app.include_router(feed.router)
+app.include_router(health.router)
 
 @app.on_event("startup")
 async def startup_event():
@@ -48,12 +68,28 @@ async def startup_event():
         logging.info("Async meme scheduler started successfully")
     except Exception as e:
         logging.error(f"Failed to start async meme scheduler: {e}")
+    if WARM_INTEGRATIONS_ON_STARTUP:
+        start_warming()
+    # Load the hot set of each category in the background and keep it in sync
+    meme_catalog.start_sync(MEME_CATEGORIES)
+    leaderboards.start()
+    trending_index.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Stop the meme scheduler when the app shuts down"""
     try:
-        async_meme_scheduler.stop()
+        # Awaited here: the leader lock is released on this event loop
+        await async_meme_scheduler.shutdown()
         logging.info("Async meme scheduler stopped successfully")
     except Exception as e:
-        logging.error(f"Failed to stop async meme scheduler: {e}") 
\ No newline at end of file
+        logging.error(f"Failed to stop async meme scheduler: {e}")
+    meme_catalog.stop_sync()
+    trending_index.stop()
+    # Write likes/saves still held in memory before the process exits
+    try:
+        engagement_buffer.close()
+    except Exception as e:
+        logging.error(f"Failed to flush engagement buffer: {e}")
+    # After the flush, so its likes/saves are in the snapshot
+    leaderboards.stop() 
\ No newline at end of file
@@ -0,0 +1,4 @@
+from .compression import CompressionMiddleware
+from .etag import page_etag, if_none_match, not_modified
+from .responses import ORJSONResponse, fast_json
+from .rate_limit import RateLimitMiddleware, RateLimitRule, RateLimitStore, MemoryRateLimitStore
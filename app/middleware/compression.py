@@ -0,0 +1,106 @@
+import os
+import gzip
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred encoding we support from an Accept-Encoding header (brotli over gzip)."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Brotli/gzip for complete JSON and text responses above COMPRESSION_MIN_BYTES.
+    Streaming responses (more_body, e.g. server-sent events) pass through untouched.
+    The ETag of an encoded response gets an encoding suffix so it stays a strong
+    validator per representation; etag.if_none_match strips it again.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            compressible = (
+                "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            )
+            if message.get("more_body", False) or not compressible:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and etag.endswith('"'):
+                    headers["ETag"] = f'{etag[:-1]}-{"br" if encoding == "br" else "gzip"}"'
+                message = {**message, "body": body}
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
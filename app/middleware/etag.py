@@ -0,0 +1,61 @@
+import hashlib
+from typing import Iterable, Optional
+from fastapi import Request, Response
+
+# Suffixes CompressionMiddleware appends to the ETag of an encoded representation
+ENCODING_ETAG_SUFFIXES = ("-gzip", "-br")
+
+
+def _field(meme, name: str):
+    return meme.get(name) if isinstance(meme, dict) else getattr(meme, name, None)
+
+
+def page_etag(memes: Iterable, *variant) -> str:
+    """
+    Strong ETag for a page of memes, derived from the ids in page order and the
+    fields that change after insert (counters, title, layout metadata, the
+    requesting user's like/save flags). `variant` carries request parameters that
+    shape the body, e.g. the media width and the user.
+    Computed from the rows, so a match can be answered before any serialization.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in variant:
+        digest.update(repr(part).encode())
+        digest.update(b"\x1f")
+    for meme in memes:
+        digest.update(
+            f"{_field(meme, 'id')}:{_field(meme, 'like_count')}:{_field(meme, 'save_count')}:"
+            f"{_field(meme, 'width')}:{_field(meme, 'title')}:"
+            f"{_field(meme, 'liked_by_me')}:{_field(meme, 'saved_by_me')}\x1e".encode()
+        )
+    return f'"{digest.hexdigest()}"'
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_ETAG_SUFFIXES:
+        if tag.endswith(f'{suffix}"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """True when the client already holds this representation (weak comparison, as for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(_opaque_tag(tag) == etag for tag in header.split(","))
+
+
+def not_modified(etag: str, response: Optional[Response] = None) -> Response:
+    """304 carrying the ETag and any Vary/Accept-CH headers already set on `response`."""
+    headers = {"ETag": etag}
+    if response is not None:
+        for name in ("vary", "accept-ch", "cache-control"):
+            if name in response.headers:
+                headers[name] = response.headers[name]
+    return Response(status_code=304, headers=headers)
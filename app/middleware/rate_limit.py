@@ -0,0 +1,207 @@
+import os
+import math
+import time
+import threading
+import ipaddress
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import orjson
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.services.token_bucket import TokenBucket
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Scraping/upload triggers: /fetch-memes/* POSTs and /scheduler/trigger/*
+RATE_LIMIT_INGEST_PER_MINUTE = float(os.getenv("RATE_LIMIT_INGEST_PER_MINUTE", "2"))
+RATE_LIMIT_INGEST_BURST = float(os.getenv("RATE_LIMIT_INGEST_BURST", "3"))
+# Signup/login/OTP endpoints, keyed by client address
+RATE_LIMIT_AUTH_PER_MINUTE = float(os.getenv("RATE_LIMIT_AUTH_PER_MINUTE", "10"))
+RATE_LIMIT_AUTH_BURST = float(os.getenv("RATE_LIMIT_AUTH_BURST", "10"))
+# Everything else (feeds, likes, lookups)
+RATE_LIMIT_DEFAULT_PER_SECOND = float(os.getenv("RATE_LIMIT_DEFAULT_PER_SECOND", "10"))
+RATE_LIMIT_DEFAULT_BURST = float(os.getenv("RATE_LIMIT_DEFAULT_BURST", "40"))
+# Buckets kept by the in-memory store; the least recently used are dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Peers allowed to report the client address in X-Forwarded-For: comma-separated
+# addresses or CIDR ranges, or "*" behind a platform proxy (e.g. Render) whose
+# addresses are not fixed. Without it every client behind the proxy shares one bucket.
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+
+# Paths never limited (health checks, API docs)
+EXEMPT_PREFIXES = ("/health", "/docs", "/redoc", "/openapi.json")
+
+
+class RateLimitRule:
+    """Token bucket parameters for requests whose method and path match."""
+    __slots__ = ("name", "methods", "prefixes", "rate", "capacity")
+
+    def __init__(self, name: str, prefixes: Tuple[str, ...], rate: float, capacity: float,
+                 methods: Optional[Tuple[str, ...]] = None):
+        self.name = name
+        self.prefixes = prefixes
+        self.rate = rate
+        self.capacity = capacity
+        self.methods = methods
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.methods is None or method in self.methods) and path.startswith(self.prefixes)
+
+
+# First match wins
+DEFAULT_RULES: List[RateLimitRule] = [
+    RateLimitRule("ingest", ("/fetch-memes/",), RATE_LIMIT_INGEST_PER_MINUTE / 60, RATE_LIMIT_INGEST_BURST, ("POST",)),
+    RateLimitRule("ingest", ("/scheduler/trigger/",), RATE_LIMIT_INGEST_PER_MINUTE / 60, RATE_LIMIT_INGEST_BURST),
+    RateLimitRule("auth", ("/auth/",), RATE_LIMIT_AUTH_PER_MINUTE / 60, RATE_LIMIT_AUTH_BURST, ("POST",)),
+    RateLimitRule("default", ("/",), RATE_LIMIT_DEFAULT_PER_SECOND, RATE_LIMIT_DEFAULT_BURST),
+]
+
+
+class RateLimitStore:
+    """
+    Where buckets live. The in-memory store limits per worker process; a shared
+    implementation (e.g. Redis with an atomic refill-and-take script) limits
+    across workers. Returns (allowed, seconds until the request would be allowed).
+    """
+
+    def try_acquire(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """TokenBuckets in an LRU map bounded by RATE_LIMIT_MAX_KEYS."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate=rate, capacity=capacity)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_acquire(cost)
+
+
+class _IdentityCache:
+    """Verified bearer token -> user id, so a repeat token costs a dict lookup instead of a JWT check."""
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def user_id(self, token: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(token)
+            if cached is not None and cached[1] > now:
+                self._entries.move_to_end(token)
+                return cached[0]
+        from app.services.jwt_service import verify_access_token
+        payload = verify_access_token(token) or {}
+        user_id = payload.get("sub")
+        # Invalid tokens are remembered briefly too, so a flood of them stays cheap
+        expires_at = float(payload.get("exp", now + 60)) if user_id else now + 60
+        with self._lock:
+            self._entries[token] = (str(user_id) if user_id else None, expires_at)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return str(user_id) if user_id else None
+
+
+class _TrustedProxies:
+    """Which peers may set X-Forwarded-For, and the client address a request really came from."""
+
+    def __init__(self, spec: str = RATE_LIMIT_TRUSTED_PROXIES):
+        entries = [entry.strip() for entry in spec.split(",") if entry.strip()]
+        self.trust_all = "*" in entries
+        self.networks = [ipaddress.ip_network(entry, strict=False) for entry in entries if entry != "*"]
+
+    def trusted(self, address: str) -> bool:
+        if self.trust_all:
+            return True
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.networks)
+
+    def client_address(self, peer: Optional[str], forwarded_for: Optional[str]) -> Optional[str]:
+        if not peer or not forwarded_for or not self.trusted(peer):
+            return peer
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if not hops:
+            return peer
+        if self.trust_all:
+            # Only the proxy that connected to us is known: its hop is the last one appended
+            return hops[-1]
+        # Each proxy appends the address it received from: the first untrusted hop
+        # from the right is the client, anything left of it could be forged
+        for hop in reversed(hops):
+            if not self.trusted(hop):
+                return hop
+        return hops[0]
+
+
+class RateLimitMiddleware:
+    """
+    Per-user, per-route-group token buckets. Requests are keyed by the bearer token's
+    user id, or by client address when there is no valid token. A request over its
+    budget gets 429 with Retry-After and never reaches the route.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Optional[List[RateLimitRule]] = None,
+                 store: Optional[RateLimitStore] = None):
+        self.app = app
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.store = store or MemoryRateLimitStore()
+        self.identities = _IdentityCache()
+        self.proxies = _TrustedProxies()
+        self.limited = 0
+
+    def _identity(self, scope: Scope) -> str:
+        headers = Headers(scope=scope)
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            user_id = self.identities.user_id(token.strip())
+            if user_id:
+                return f"user:{user_id}"
+        client = scope.get("client")
+        address = self.proxies.client_address(client[0] if client else None, headers.get("x-forwarded-for"))
+        return f"ip:{address or 'unknown'}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        if path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        rule = next((r for r in self.rules if r.matches(scope["method"], path)), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        allowed, retry_after = self.store.try_acquire(f"{rule.name}:{self._identity(scope)}", rule.rate, rule.capacity)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+        self.limited += 1
+        retry_seconds = max(1, math.ceil(retry_after)) if math.isfinite(retry_after) else 3600
+        body = orjson.dumps({"detail": f"Too many requests. Retry in {retry_seconds}s."})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_seconds).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,31 @@
+from typing import Any, Optional
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any):
+    # Models built with Meme.from_row hold raw column values, so their __dict__ is already JSON-ready
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    return str(obj)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON rendered with orjson; models are dumped from their attributes without re-validation."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_json(content: Any, response: Optional[Response] = None) -> ORJSONResponse:
+    """
+    ORJSONResponse for a list endpoint. Returning it directly skips FastAPI's
+    response_model validation, so only use it for data from our own database.
+    Headers already set on the injected `response` (ETag, Vary, ...) are kept.
+    """
+    headers = None
+    if response is not None:
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return ORJSONResponse(content, headers=headers)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from typing import Optional, Dict, List, Literal
 from datetime import datetime
 
 class Meme(BaseModel):
@@ -13,4 +13,44 @@ class Meme(BaseModel):
     like_count: Optional[int] = 0
     save_count: Optional[int] = 0
     uploader_username: Optional[str] = None
-    uploader_id: Optional[str] = None 
\ No newline at end of file
+    uploader_id: Optional[str] = None
+    # Layout metadata captured at ingest
+    width: Optional[int] = None
+    height: Optional[int] = None
+    duration: Optional[float] = None
+    bytes: Optional[int] = None
+    dominant_color: Optional[str] = None
+    # Derived responsive delivery URLs (see media_urls.responsive_media)
+    media: Optional[Dict] = None
+    # Whether the requesting user liked / saved this meme (set on per-user pages)
+    liked_by_me: Optional[bool] = None
+    saved_by_me: Optional[bool] = None
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "Meme":
+        """
+        Build a Meme from a row of our own memes table without validation.
+        Rows were validated on insert, so re-parsing URLs and timestamps on every read is wasted work.
+        """
+        values = {name: row.get(name, default) for name, default in _MEME_DEFAULTS.items()}
+        # Same result as model_construct(), minus its per-field default/alias handling
+        meme = cls.__new__(cls)
+        object.__setattr__(meme, "__dict__", values)
+        object.__setattr__(meme, "__pydantic_fields_set__", set(row.keys() & values.keys()))
+        object.__setattr__(meme, "__pydantic_extra__", None)
+        object.__setattr__(meme, "__pydantic_private__", None)
+        return meme
+
+
+# Field -> default for Meme.from_row; required fields default to None
+_MEME_DEFAULTS = {
+    name: None if field.is_required() else field.get_default(call_default_factory=True)
+    for name, field in Meme.model_fields.items()
+} 
+
+class EngagementOp(BaseModel):
+    meme_id: int
+    action: Literal["like", "unlike", "save", "unsave"]
+
+class EngagementBatch(BaseModel):
+    ops: List[EngagementOp]
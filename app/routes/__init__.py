@@ -2,4 +2,6 @@ from .memes import router as memes_router
 from .products import router as products_router
 from .fetch_memes import router as fetch_memes_router
 from .auth import router as auth_router
-from .friends import router as friends_router 
\ No newline at end of file
+from .friends import router as friends_router 
+from .feed import router as feed_router
+from .health import router as health_router
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, Path, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.services.feed_service import get_personalized_feed
+from app.routes.auth import get_current_user
+from app.routes.memes import get_media_width
+from app.services.media_urls import attach_media
+from app.services.supabase_service import attach_engagement_flags, get_memes_by_ids
+from app.services.leaderboard_service import leaderboards, LEADERBOARD_WINDOWS
+from app.services.push_hub import push_hub
+from app.middleware.responses import ORJSONResponse, fast_json
+
+router = APIRouter(prefix="/feed", tags=["Feed"])
+
+@router.get("/home", response_class=ORJSONResponse)
+def get_home_feed(
+    response: Response,
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    weights: str = Query("", description="Optional category weights, e.g. 'funny:2,dank:1'. Defaults to the user's meme_choices"),
+    media_width: int = Depends(get_media_width),
+    user=Depends(get_current_user)
+):
+    """Personalized feed interleaving the user's preferred categories"""
+    user_id = user['sub']
+    try:
+        feed = get_personalized_feed(user_id, page_size, cursor, weights)
+        attach_engagement_flags(feed["memes"], user_id)
+        attach_media(feed["memes"], media_width)
+        return fast_json(feed, response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/top/{window}", response_class=ORJSONResponse)
+def get_top_memes(
+    response: Response,
+    window: str = Path(..., description=f"One of: {', '.join(LEADERBOARD_WINDOWS)}"),
+    limit: int = Query(20, ge=1, le=100),
+    media_width: int = Depends(get_media_width),
+    user=Depends(get_current_user)
+):
+    """Most liked/saved memes over the last hour, day or week, best first"""
+    if window not in LEADERBOARD_WINDOWS:
+        raise HTTPException(status_code=404, detail=f"Unknown window '{window}'. Use one of: {', '.join(LEADERBOARD_WINDOWS)}")
+    try:
+        ranked = leaderboards.top(window, limit)
+        scores = dict(ranked)
+        memes = get_memes_by_ids([meme_id for meme_id, _ in ranked])
+        for meme in memes:
+            meme["window_score"] = scores.get(meme["id"], 0)
+        attach_engagement_flags(memes, user['sub'])
+        attach_media(memes, media_width)
+        return fast_json({"window": window, "memes": memes}, response)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stream")
+async def stream_feed(
+    request: Request,
+    categories: str = Query("", description="Comma-separated categories to follow; empty follows all"),
+    user=Depends(get_current_user)
+):
+    """
+    Server-sent events: `meme` for each new meme in the followed categories, `counts`
+    with the latest like/save counts of memes that changed (debounced), and `resync`
+    when updates were dropped because the client fell behind.
+    """
+    if push_hub.is_full():
+        raise HTTPException(status_code=503, detail="Too many open streams")
+    return StreamingResponse(
+        push_hub.stream([c.strip() for c in categories.split(",") if c.strip()], request.is_disconnected),
+        media_type="text/event-stream",
+        # Proxies must not buffer or cache the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
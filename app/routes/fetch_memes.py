@@ -1,17 +1,27 @@
 import os
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request, Response
 from app.services.reddit_service import fetch_and_store_memes
+from app.services.subreddit_stats import subreddit_selector
 import random
 from app.services.gemini_service import search_indian_memes_on_reddit
-from app.services.supabase_service import insert_meme, get_supabase, get_meme_counts_batch
-import cloudinary.uploader
+from app.services.supabase_service import insert_meme, get_supabase, get_memes_by_ids, attach_engagement_flags
+from app.services.trending_service import get_trending_page_ids
+from app.services.integrations import cloudinary_uploader
+from app.services.media_metadata import upload_options, metadata_from_upload
 from datetime import datetime
 from app.meme_subreddits import MEME_SUBREDDITS
 from app.routes.auth import get_current_user
 from app.services.instagram_service import scrape_and_upload_instagram_memes, scrape_and_upload_instagram_memes_instagrapi
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from app.models.meme import Meme
+from app.routes.memes import get_media_width
+from app.services.media_urls import attach_media
+from app.middleware.etag import page_etag, if_none_match, not_modified
+from app.middleware.responses import ORJSONResponse, fast_json
+from app.services.response_cache import (
+    cached, cache_control, FEED_HEAD_CACHE_SECONDS, FEED_HEAD_STALE_SECONDS, RESPONSE_CACHE_ERROR_SECONDS
+)
 
 router = APIRouter(prefix="/fetch-memes", tags=["Fetch Memes"])
 
@@ -61,7 +71,8 @@ def fetch_instagram_memes_instagrapi(
                         "subreddit": "instagram",  # Required field
                         "timestamp": datetime.utcnow().isoformat(),
                         "uploader_id": user.get("id") if user else None,
-                        "uploader_username": user.get("username") if user else None
+                        "uploader_username": user.get("username") if user else None,
+                        **meme.get("metadata", {})
                     }).execute()
                     saved_count += 1
             except Exception as insert_e:
@@ -83,7 +94,8 @@ def fetch_memes(
     user=Depends(get_current_user)
 ):
     try:
-        subreddit_name = random.choice(MEME_SUBREDDITS)
+        ranked = subreddit_selector.select(MEME_SUBREDDITS, 1)
+        subreddit_name = ranked[0] if ranked else random.choice(MEME_SUBREDDITS)
         background_tasks.add_task(fetch_and_store_memes, category, subreddit_name)
         return {"message": f"Fetching memes for category '{category}' from subreddit '{subreddit_name}' started."}
     except Exception as e:
@@ -103,7 +115,7 @@ def fetch_memes_gemini(user=Depends(get_current_user)):
                 continue
             # Upload to Cloudinary
             try:
-                upload_result = cloudinary.uploader.upload(image_url, resource_type="auto")
+                upload_result = cloudinary_uploader().upload(image_url, resource_type="auto", **upload_options(image_url))
                 cloudinary_url = upload_result["secure_url"]
             except Exception:
                 continue
@@ -114,7 +126,8 @@ def fetch_memes_gemini(user=Depends(get_current_user)):
                 "reddit_post_url": post_url,
                 "subreddit": subreddit,
                 "category": "gemini",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow().isoformat(),
+                **metadata_from_upload(upload_result)
             }
             try:
                 insert_meme(meme_data)
@@ -125,61 +138,48 @@ def fetch_memes_gemini(user=Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/feed", response_model=List[Meme])
+# Each request gets its own copies of the rows: flags are set per user
+@cached(ttl=FEED_HEAD_CACHE_SECONDS, stale=FEED_HEAD_STALE_SECONDS, error_ttl=RESPONSE_CACHE_ERROR_SECONDS,
+        copy=lambda rows: [dict(row) for row in rows])
+def trending_head(category: Optional[str], page_size: int) -> List[dict]:
+    """First page of the trending feed, globally or within a category"""
+    return get_memes_by_ids(get_trending_page_ids(1, page_size, category))
+
+@router.get("/feed", response_model=List[Meme], response_class=ORJSONResponse)
 def get_feed(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     exclude_ids: str = Query("", description="Comma-separated meme IDs to exclude"),
+    category: Optional[str] = Query(None, description="Trending within one category instead of across all"),
+    media_width: int = Depends(get_media_width),
     user=Depends(get_current_user)
 ):
+    """Trending memes: likes and saves decayed by age, read from the incremental trending index, then the newest unranked memes"""
     try:
         exclude_ids_list = [int(i) for i in exclude_ids.split(",") if i.strip()]
         
-        # Fetch all memes from Supabase
-        memes_resp = get_supabase().table("memes").select("*").execute()
-        memes = memes_resp.data or []
-        
-        # Exclude already seen memes
-        if exclude_ids_list:
-            memes = [m for m in memes if m.get("id") not in exclude_ids_list]
-        
-        # Get all like counts in batch (much more efficient than individual queries)
-        meme_ids = [m["id"] for m in memes if m.get("id") is not None]
-        counts = get_meme_counts_batch(meme_ids)
-        like_counts = counts["like_counts"]
-        save_counts = counts["save_counts"]
-        
-        # Calculate trending score: recency + like count
-        import time, datetime
-        for m in memes:
-            meme_id = m.get("id")
-            if meme_id is not None:
-                m["like_count"] = like_counts.get(meme_id, 0)
-                m["save_count"] = save_counts.get(meme_id, 0)
-            else:
-                m["like_count"] = 0
-                m["save_count"] = 0
+        if page == 1 and not exclude_ids_list:
+            # Head page: shared by everyone, a few seconds stale at most
+            page_memes = trending_head(category, page_size)
+            trending_head.cache.set_headers(response)
+        else:
+            # Ranked ids for the requested page, without sorting the table
+            page_ids = get_trending_page_ids(page, page_size, category, exclude_ids_list)
             
-            ts = m.get("timestamp")
-            if ts:
-                if isinstance(ts, str):
-                    try:
-                        dt = datetime.datetime.fromisoformat(ts)
-                    except Exception:
-                        dt = datetime.datetime.utcnow()
-                else:
-                    dt = ts
-                m["trending_score"] = m["like_count"] * 10 + int(time.mktime(dt.timetuple()))
-            else:
-                m["trending_score"] = m["like_count"] * 10
-        
-        # Sort by trending score descending
-        memes.sort(key=lambda m: m["trending_score"], reverse=True)
-        
-        # Paginate
-        start = (page - 1) * page_size
-        end = start + page_size
-        return memes[start:end]
+            # Rows and counts for just this page
+            page_memes = get_memes_by_ids(page_ids)
+            cache_control(response)
+        attach_engagement_flags(page_memes, user['sub'])
+        etag = page_etag(page_memes, media_width, user['sub'])
+        if if_none_match(request, etag):
+            return not_modified(etag, response)
+        response.headers["ETag"] = etag
+        # Trusted rows from our own table: skip re-validation
+        memes = [Meme.from_row(m) for m in page_memes]
+        attach_media(memes, media_width)
+        return fast_json(memes, response)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
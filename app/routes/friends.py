@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from app.services.friend_service import send_friend_request, respond_friend_request, list_friends, search_users
-from typing import List
+from app.services.activity_service import get_friends_activity
+from typing import List, Optional
 from app.routes.auth import get_current_user
 
 router = APIRouter(prefix="/friends", tags=["Friends"])
@@ -24,4 +25,17 @@ def friends(user=Depends(get_current_user)):
 
 @router.get("/search", response_model=List[dict])
 def search(q: str = Query(..., min_length=1), user=Depends(get_current_user)):
-    return [u.dict() for u in search_users(q)] 
\ No newline at end of file
+    return [u.dict() for u in search_users(q)] 
+
+@router.get("/activity")
+def friends_activity(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[int] = Query(None, description="Cursor from the previous page's next_cursor"),
+    user=Depends(get_current_user)
+):
+    """What the user's friends recently liked, saved or uploaded, newest first"""
+    user_id = user['sub']
+    try:
+        return get_friends_activity(user_id, limit, before)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from app.services.integrations import integrations_status
+from app.services.meme_catalog import meme_catalog
+from app.services.push_hub import push_hub
+from app.services.single_flight import single_flight_stats
+from app.services.response_cache import response_cache_stats
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+@router.get("/ready")
+def readiness(require_integrations: bool = Query(False, description="Return 503 until heavy integrations are warmed")):
+    """
+    Startup readiness. `serving` is true as soon as the app answers requests;
+    `integrations_warmed` turns true once the background warm-up imported the
+    scraping/upload clients, so the first scrape or upload pays no import cost.
+    Only the scheduler leader warms (or every worker with WARM_INTEGRATIONS_ON_STARTUP),
+    so other workers stay lazy and report false.
+    """
+    status = integrations_status()
+    body = {
+        "serving": True,
+        "integrations_warmed": status["warmed"],
+        "warm_started_at": status["warm_started_at"],
+        "warm_finished_at": status["warm_finished_at"],
+        "integrations": status["integrations"],
+    }
+    if require_integrations and not status["warmed"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@router.get("/catalog")
+def catalog_status():
+    """Size of the in-process hot-set catalog, with bytes per 100k memes and hit/miss counts"""
+    return meme_catalog.memory_report()
+
+@router.get("/push")
+def push_status():
+    """Open /feed/stream connections (total and per followed category) and event counters"""
+    return push_hub.stats()
+
+@router.get("/coalescing")
+def coalescing_status():
+    """Per data-access function: calls, backend calls made and how many callers each one served"""
+    return single_flight_stats()
+
+@router.get("/cache")
+def cache_status():
+    """Per cached data provider: entries, fresh/stale hits, misses, cached errors and background refreshes"""
+    return response_cache_stats()
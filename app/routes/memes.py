@@ -1,30 +1,81 @@
-from fastapi import APIRouter, Query, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, Query, HTTPException, Depends, UploadFile, File, Form, Request, Response
 from typing import List, Optional
-from app.models.meme import Meme
+from app.models.meme import Meme, EngagementBatch
 from app.services.supabase_service import (
     get_memes_by_category, like_meme, unlike_meme, get_meme_like_count, get_meme_by_id,
     save_meme, unsave_meme, get_saved_memes, get_saved_meme_ids, upload_meme, get_my_memes,
-    edit_meme, delete_meme, get_meme_counts_batch, get_supabase
+    edit_meme, delete_meme, get_meme_counts_batch, get_supabase,
+    get_memes_by_ids, attach_engagement_flags, MEMES_BATCH_MAX_IDS
 )
 from app.routes.auth import get_current_user
-import cloudinary.uploader
+from app.services.integrations import cloudinary_uploader
+from app.services.media_urls import width_for_hints, attach_media
+from app.services.media_metadata import upload_options, metadata_from_upload
+from app.middleware.etag import page_etag, if_none_match, not_modified
+from app.middleware.responses import ORJSONResponse, fast_json
+from app.services.meme_catalog import meme_catalog
+from app.services.engagement_buffer import apply_engagement_batch, ENGAGEMENT_BATCH_MAX_OPS
+from app.services.response_cache import (
+    cached, cache_control, FEED_HEAD_CACHE_SECONDS, FEED_HEAD_STALE_SECONDS, RESPONSE_CACHE_ERROR_SECONDS
+)
 
 router = APIRouter(prefix="/memes", tags=["Memes"])
 
-@router.get("/{category}", response_model=List[Meme])
-def get_memes(
-    category: str,
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
-    after: str = Query(None, description="Fetch memes newer than this ISO timestamp"),
-    random: bool = Query(False, description="Return memes in random order"),
-    exclude_ids: str = Query("", description="Comma-separated meme IDs to exclude"),
+def get_media_width(
+    request: Request,
+    response: Response,
+    size: Optional[str] = Query(None, description="Rendition size: thumb, small, medium, large, full or a CSS pixel width")
+) -> int:
+    """Rendition width from `size` or the DPR / Viewport-Width client hints"""
+    # Ask browsers to send the hints, and keep caches from mixing renditions
+    response.headers["Accept-CH"] = "DPR, Viewport-Width"
+    response.headers.add_vary_header("DPR, Viewport-Width")
+    headers = request.headers
+    return width_for_hints(
+        size,
+        headers.get("sec-ch-dpr") or headers.get("dpr"),
+        headers.get("sec-ch-viewport-width") or headers.get("viewport-width"),
+    )
+
+# Declared before /{category}, which would otherwise capture "batch"
+@router.get("/batch", response_model=List[Meme], response_class=ORJSONResponse)
+def get_memes_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description=f"Comma-separated meme IDs (at most {MEMES_BATCH_MAX_IDS})"),
+    media_width: int = Depends(get_media_width),
     user=Depends(get_current_user)
 ):
+    """
+    Memes by id with like/save counts and the caller's liked_by_me/saved_by_me flags,
+    in the order requested (unknown ids are omitted). Costs a fixed number of queries
+    however many ids are asked for.
+    """
     try:
-        exclude_ids = exclude_ids or ""
-        exclude_ids_list = [int(i) for i in exclude_ids.split(",") if i.strip()]
-        memes = get_memes_by_category(category, page, page_size, after, random, exclude_ids_list)
+        meme_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(meme_ids) > MEMES_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MEMES_BATCH_MAX_IDS} ids per request")
+    try:
+        memes = [Meme.from_row(row) for row in get_memes_by_ids(meme_ids)]
+        attach_engagement_flags(memes, user['sub'])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    etag = page_etag(memes, media_width, user['sub'])
+    if if_none_match(request, etag):
+        return not_modified(etag, response)
+    response.headers["ETag"] = etag
+    attach_media(memes, media_width)
+    return fast_json(memes, response)
+
+def load_category_page(category: str, page: int, page_size: int, after: Optional[str] = None,
+                       random: bool = False, exclude_ids: Optional[list] = None) -> List[Meme]:
+    """A page of a category with like/save counts, from the catalog or the database"""
+    # Hot pages come from the in-process catalog, counts included
+    memes = meme_catalog.category_page(category, page, page_size, after, random, exclude_ids)
+    if memes is None:
+        memes = get_memes_by_category(category, page, page_size, after, random, exclude_ids)
         
         # Get all like counts in batch (much more efficient than individual queries)
         meme_ids = [meme.id for meme in memes if meme.id is not None]
@@ -41,8 +92,47 @@ def get_memes(
             else:
                 meme.like_count = 0
                 meme.save_count = 0
-                
-        return memes
+    return memes
+
+# Each request gets its own copies: flags and media URLs are set per user
+@cached(ttl=FEED_HEAD_CACHE_SECONDS, stale=FEED_HEAD_STALE_SECONDS, error_ttl=RESPONSE_CACHE_ERROR_SECONDS,
+        copy=lambda memes: [meme.model_copy() for meme in memes])
+def category_head(category: str, page_size: int) -> List[Meme]:
+    """First page of a category, newest first"""
+    return load_category_page(category, 1, page_size)
+
+@router.get("/{category}", response_model=List[Meme], response_class=ORJSONResponse)
+def get_memes(
+    category: str,
+    request: Request,
+    response: Response,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    after: str = Query(None, description="Fetch memes newer than this ISO timestamp"),
+    random: bool = Query(False, description="Return memes in random order"),
+    exclude_ids: str = Query("", description="Comma-separated meme IDs to exclude"),
+    media_width: int = Depends(get_media_width),
+    user=Depends(get_current_user)
+):
+    try:
+        exclude_ids = exclude_ids or ""
+        exclude_ids_list = [int(i) for i in exclude_ids.split(",") if i.strip()]
+        if page == 1 and not after and not random and not exclude_ids_list:
+            # Head page: shared by everyone reading the category, a few seconds stale at most
+            memes = category_head(category, page_size)
+            category_head.cache.set_headers(response)
+        else:
+            memes = load_category_page(category, page, page_size, after, random, exclude_ids_list)
+            cache_control(response)
+        attach_engagement_flags(memes, user['sub'])
+        
+        # Unchanged page: answer 304 before building the response body
+        etag = page_etag(memes, media_width, user['sub'])
+        if if_none_match(request, etag):
+            return not_modified(etag, response)
+        response.headers["ETag"] = etag
+        attach_media(memes, media_width)
+        return fast_json(memes, response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -56,21 +146,41 @@ def unlike_meme_endpoint(meme_id: int, user=Depends(get_current_user)):
     user_id = user['sub']
     return unlike_meme(user_id, meme_id)
 
+@router.post("/engagement/batch")
+def engagement_batch_endpoint(batch: EngagementBatch, user=Depends(get_current_user)):
+    """
+    Apply many like/unlike/save/unsave operations in one request, e.g. when a client
+    syncs offline activity. Operations run in order; each gets its own status
+    (applied, unchanged or not_found).
+    """
+    if len(batch.ops) > ENGAGEMENT_BATCH_MAX_OPS:
+        raise HTTPException(status_code=413, detail=f"At most {ENGAGEMENT_BATCH_MAX_OPS} operations per batch")
+    try:
+        results = apply_engagement_batch(user['sub'], [op.model_dump() for op in batch.ops])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"results": results, "applied": sum(r["status"] == "applied" for r in results)}
+
 @router.get("/{meme_id}/likes")
 def meme_like_count(meme_id: int, user=Depends(get_current_user)):
     count = get_meme_like_count(meme_id)
     return {"meme_id": meme_id, "like_count": count}
 
 @router.get("/id/{meme_id}")
-def get_meme(meme_id: int, user=Depends(get_current_user)):
+def get_meme(meme_id: int, media_width: int = Depends(get_media_width), user=Depends(get_current_user)):
     meme = get_meme_by_id(meme_id)
     if not meme:
         raise HTTPException(status_code=404, detail="Meme not found")
-    like_count = get_meme_like_count(meme_id)
-    # Count saves
-    save_count = len(get_supabase().table("meme_saves").select("id").eq("meme_id", meme_id).execute().data or [])
-    meme["like_count"] = like_count
-    meme["save_count"] = save_count
+    # Rows served from the catalog already carry their counts
+    if "like_count" not in meme:
+        like_count = get_meme_like_count(meme_id)
+        # Count saves
+        save_count = len(get_supabase().table("meme_saves").select("id").eq("meme_id", meme_id).execute().data or [])
+        meme["like_count"] = like_count
+        meme["save_count"] = save_count
+    attach_engagement_flags([meme], user['sub'])
+    # A single meme can afford every rendition, for the client's own <img srcset>
+    attach_media([meme], media_width, srcset=True)
     return meme
 
 @router.post("/{meme_id}/save")
@@ -88,8 +198,13 @@ def get_saved_memes_endpoint(user=Depends(get_current_user)):
     user_id = user['sub']
     return get_saved_memes(user_id)
 
-@router.get("/saved/ids")
-def get_saved_memes_full_endpoint(user=Depends(get_current_user)):
+@router.get("/saved/ids", response_class=ORJSONResponse)
+def get_saved_memes_full_endpoint(
+    request: Request,
+    response: Response,
+    media_width: int = Depends(get_media_width),
+    user=Depends(get_current_user)
+):
     user_id = user['sub']
     meme_ids = get_saved_meme_ids(user_id)
     if not meme_ids:
@@ -110,7 +225,13 @@ def get_saved_memes_full_endpoint(user=Depends(get_current_user)):
         else:
             meme['like_count'] = 0
             meme['save_count'] = 0
-    return memes
+    attach_engagement_flags(memes, user_id)
+    etag = page_etag(memes, media_width, user_id)
+    if if_none_match(request, etag):
+        return not_modified(etag, response)
+    response.headers["ETag"] = etag
+    attach_media(memes, media_width)
+    return fast_json(memes, response)
 
 @router.post("/upload")
 def upload_meme_endpoint(
@@ -122,9 +243,9 @@ def upload_meme_endpoint(
     uploader_id = user['sub']
     uploader_username = user.get('username', None)
     # Upload file to Cloudinary
-    upload_result = cloudinary.uploader.upload(file.file, resource_type="auto")
+    upload_result = cloudinary_uploader().upload(file.file, resource_type="auto", **upload_options(file.filename or ""))
     file_url = upload_result["secure_url"]
-    meme = upload_meme(title, category, file_url, uploader_id, uploader_username)
+    meme = upload_meme(title, category, file_url, uploader_id, uploader_username, metadata_from_upload(upload_result))
     return meme
 
 @router.get("/my")
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
+import os
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List
 from app.models.product import Product
 from app.routes.auth import get_current_user
+from app.services.response_cache import cached, RESPONSE_CACHE_ERROR_SECONDS
+
+# Product list changes only on deploy
+PRODUCTS_CACHE_SECONDS = int(os.getenv("PRODUCTS_CACHE_SECONDS", "3600"))
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -11,9 +16,15 @@ affiliate_products = [
     Product(title="Dank Meme T-Shirt", image="https://memee.com/static/tshirt.jpg", link="https://memee.com/products/tshirt"),
 ]
 
+@cached(ttl=PRODUCTS_CACHE_SECONDS, stale=PRODUCTS_CACHE_SECONDS, error_ttl=RESPONSE_CACHE_ERROR_SECONDS)
+def list_products() -> List[Product]:
+    return affiliate_products
+
 @router.get("/", response_model=List[Product])
-def get_products(user=Depends(get_current_user)):
+def get_products(response: Response, user=Depends(get_current_user)):
     try:
-        return affiliate_products
+        products = list_products()
+        list_products.cache.set_headers(response)
+        return products
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
@@ -13,6 +13,10 @@ def get_scheduler_status(user=Depends(get_current_user)):
         return {
             "scheduler_status": status["status"],
             "jobs": status["jobs"],
+            "leader": status["leader"],
+            "subreddits": status["subreddits"],
+            "reddit_incremental": status["reddit_incremental"],
+            "instagram_sessions": status["instagram_sessions"],
             "message": "Scheduler status retrieved successfully"
         }
     except Exception as e:
@@ -107,4 +111,19 @@ def trigger_night_session(user=Depends(get_current_user)):
         else:
             raise HTTPException(status_code=500, detail="Failed to trigger night session")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to trigger night session: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to trigger night session: {str(e)}") 
+
+@router.post("/trigger/media-backfill")
+def trigger_media_backfill(user=Depends(get_current_user)):
+    """Manually run one batch of the media metadata backfill"""
+    try:
+        success = async_meme_scheduler.trigger_manual_fetch("media_backfill")
+        if success:
+            return {
+                "message": "Media metadata backfill triggered successfully",
+                "status": "triggered"
+            }
+        else:
+            raise HTTPException(status_code=500, detail="Failed to trigger media metadata backfill")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to trigger media metadata backfill: {str(e)}")
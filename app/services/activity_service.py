@@ -0,0 +1,184 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from typing import List, Dict, Optional
+from app.services.supabase_service import get_supabase
+
+# Activities and timelines live in Postgres (migrations/002 and 003), so every worker
+# serves the same feed and it survives restarts.
+# Timelines are trimmed to this many entries on every fan-out, so storage per user stays bounded
+ACTIVITY_TIMELINE_MAX_LENGTH = int(os.getenv("ACTIVITY_TIMELINE_MAX_LENGTH", "500"))
+# Actors with more friends than this are not fanned out on write; readers pull them in
+ACTIVITY_FANOUT_MAX_FRIENDS = int(os.getenv("ACTIVITY_FANOUT_MAX_FRIENDS", "500"))
+# Per-process caches; invalidate_friends only clears this worker's copy
+ACTIVITY_FRIENDS_CACHE_SECONDS = int(os.getenv("ACTIVITY_FRIENDS_CACHE_SECONDS", "300"))
+ACTIVITY_FAN_IN_CACHE_SECONDS = int(os.getenv("ACTIVITY_FAN_IN_CACHE_SECONDS", "60"))
+
+ACTIVITY_TYPES = {"like", "save", "upload"}
+
+# Columns of an activity as returned to clients
+_ENTRY_COLUMNS = "id, type, actor_id, meme_id, timestamp:created_at"
+# Actor ids per fan-in query, keeping the in() filter within URL limits
+_ACTOR_CHUNK = 200
+
+_friends_lock = threading.Lock()
+# user_id -> (expires_at, friend_ids)
+_friends_cache: Dict[str, tuple] = {}
+# (expires_at, actor ids whose activities readers pull in)
+_fan_in_actors: tuple = (0.0, frozenset())
+
+
+def get_friend_ids(user_id: str) -> List[str]:
+    """Friend ids for a user, cached for ACTIVITY_FRIENDS_CACHE_SECONDS."""
+    user_id = str(user_id)
+    now = time.monotonic()
+    with _friends_lock:
+        cached = _friends_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    try:
+        resp = get_supabase().table("friends").select("friend_id").eq("user_id", user_id).execute()
+        friend_ids = [str(row["friend_id"]) for row in resp.data or [] if row.get("friend_id") is not None]
+    except Exception as e:
+        raise RuntimeError(f"Failed to get friend ids: {e}")
+    with _friends_lock:
+        _friends_cache[user_id] = (now + ACTIVITY_FRIENDS_CACHE_SECONDS, friend_ids)
+    return friend_ids
+
+
+def invalidate_friends(*user_ids):
+    """Drop cached friend lists, e.g. after a friend request is accepted."""
+    with _friends_lock:
+        for user_id in user_ids:
+            _friends_cache.pop(str(user_id), None)
+
+
+def get_fan_in_actors() -> frozenset:
+    """
+    Actors with activities that are not fanned out on write, cached for
+    ACTIVITY_FAN_IN_CACHE_SECONDS. Only actors above ACTIVITY_FANOUT_MAX_FRIENDS
+    (or whose fan-out failed) are listed, so the set stays small.
+    """
+    global _fan_in_actors
+    now = time.monotonic()
+    with _friends_lock:
+        expires_at, actors = _fan_in_actors
+    if expires_at > now:
+        return actors
+    try:
+        resp = get_supabase().table("activity_fan_in_actors").select("actor_id").execute()
+        actors = frozenset(str(row["actor_id"]) for row in resp.data or [])
+    except Exception as e:
+        raise RuntimeError(f"Failed to get fan-in actors: {e}")
+    with _friends_lock:
+        _fan_in_actors = (now + ACTIVITY_FAN_IN_CACHE_SECONDS, actors)
+    return actors
+
+
+def _mark_fan_in(actor_id: str):
+    """List an actor for fan-in; readers on this worker see it immediately, others within the cache TTL."""
+    global _fan_in_actors
+    get_supabase().table("activity_fan_in_actors").upsert(
+        {"actor_id": actor_id}, on_conflict="actor_id", ignore_duplicates=True
+    ).execute()
+    with _friends_lock:
+        expires_at, actors = _fan_in_actors
+        _fan_in_actors = (expires_at, actors | {actor_id})
+
+
+def record_activity(actor_id: str, activity_type: str, meme_id: int) -> Optional[Dict]:
+    """
+    Store an activity and fan it out to the timelines of the actor's friends, each
+    trimmed to ACTIVITY_TIMELINE_MAX_LENGTH. Activities of actors with more than
+    ACTIVITY_FANOUT_MAX_FRIENDS friends are stored with fanned_out false, the actor
+    is listed in activity_fan_in_actors, and readers merge them in (fan-in). The
+    flag is per activity, so history is kept when an actor crosses the threshold.
+    Never raises: a failed fan-out must not fail the like/save/upload that caused it.
+    """
+    if activity_type not in ACTIVITY_TYPES or actor_id is None or meme_id is None:
+        return None
+    actor_id = str(actor_id)
+    try:
+        friend_ids = get_friend_ids(actor_id)
+    except Exception as e:
+        print(f"[activity] Could not load friends for {actor_id}: {e}")
+        return None
+
+    fan_out = len(friend_ids) <= ACTIVITY_FANOUT_MAX_FRIENDS
+    try:
+        if not fan_out:
+            # Listed before the activity exists, so readers never miss it
+            _mark_fan_in(actor_id)
+        resp = get_supabase().table("activities").insert({
+            "actor_id": actor_id,
+            "type": activity_type,
+            "meme_id": meme_id,
+            "fanned_out": fan_out,
+        }).execute()
+        row = resp.data[0]
+    except Exception as e:
+        print(f"[activity] Could not record {activity_type} by {actor_id}: {e}")
+        return None
+    entry = {key: row.get(key) for key in ("id", "type", "actor_id", "meme_id")}
+    entry["timestamp"] = row.get("created_at")
+
+    if fan_out and friend_ids:
+        try:
+            get_supabase().rpc("fan_out_activity", {
+                "p_activity_id": entry["id"],
+                "p_user_ids": friend_ids,
+                "p_max_length": ACTIVITY_TIMELINE_MAX_LENGTH,
+            }).execute()
+        except Exception as e:
+            # Leave it to readers instead, so the activity is not lost
+            print(f"[activity] Fan-out of activity {entry['id']} failed, falling back to fan-in: {e}")
+            try:
+                _mark_fan_in(actor_id)
+                get_supabase().table("activities").update({"fanned_out": False}).eq("id", entry["id"]).execute()
+            except Exception as e:
+                print(f"[activity] Could not mark activity {entry['id']} for fan-in: {e}")
+    return entry
+
+
+def get_friends_activity(user_id: str, limit: int = 20, before: Optional[int] = None) -> Dict:
+    """
+    Newest-first page of friends' activity for a user: one range read of their
+    timeline, plus one query for the activities of any fan-in actors among their
+    friends. `before` is the `next_cursor` returned by the previous page.
+    """
+    user_id = str(user_id)
+    try:
+        query = get_supabase().table("activity_timelines").select(
+            f"activity_id, activities({_ENTRY_COLUMNS})"
+        ).eq("user_id", user_id)
+        if before is not None:
+            query = query.lt("activity_id", before)
+        rows = query.order("activity_id", desc=True).limit(limit).execute().data or []
+    except Exception as e:
+        raise RuntimeError(f"Failed to get friends activity: {e}")
+    sources = [[row["activities"] for row in rows if row.get("activities")]]
+
+    try:
+        fan_in_actors = get_fan_in_actors()
+        # Friends are only needed when someone is pulled in at read time
+        followed = sorted(fan_in_actors.intersection(get_friend_ids(user_id))) if fan_in_actors else []
+    except Exception as e:
+        print(f"[activity] Could not load fan-in friends for {user_id}: {e}")
+        followed = []
+    try:
+        for start in range(0, len(followed), _ACTOR_CHUNK):
+            query = get_supabase().table("activities").select(_ENTRY_COLUMNS).in_(
+                "actor_id", followed[start:start + _ACTOR_CHUNK]
+            ).eq("fanned_out", False)
+            if before is not None:
+                query = query.lt("id", before)
+            sources.append(query.order("id", desc=True).limit(limit).execute().data or [])
+    except Exception as e:
+        raise RuntimeError(f"Failed to get friends activity: {e}")
+
+    merged = heapq.merge(*sources, key=lambda entry: entry["id"], reverse=True)
+    items = list(itertools.islice(merged, limit))
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
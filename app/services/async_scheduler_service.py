@@ -6,15 +6,24 @@ import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from app.services.reddit_service import fetch_and_store_memes
+from app.services.reddit_service import fetch_and_store_category_batch
 from app.services.instagram_service import fetch_and_store_instagram_memes_batch
+from app.services.leader_lock import create_leader_lock, process_identity
+from app.services.subreddit_stats import subreddit_selector
+from app.services.reddit_checkpoints import reddit_checkpoints
+from app.services.instagram_session import instagram_sessions
+from app.services.media_metadata import backfill_media_metadata
+from app.services.integrations import start_warming
 from app.meme_subreddits import MEME_SUBREDDITS
 from app.config.scheduler_config import (
     SCHEDULER_ENABLED, NIGHT_FETCH_START_HOUR, NIGHT_FETCH_DURATION_MINUTES, 
     NIGHT_FETCH_INTERVAL_MINUTES, REDDIT_CATEGORIES, REDDIT_CATEGORIES_PER_CYCLE, 
-    REDDIT_FETCH_DELAY_SECONDS, SCHEDULER_LOG_LEVEL
+    SCHEDULER_LOG_LEVEL, SCHEDULER_LEADER_LOCK,
+    LEADER_ELECTION_INTERVAL_SECONDS, LEADER_RELEASE_TIMEOUT_SECONDS, SCHEDULER_JOBSTORE_URL, SCHEDULER_MISFIRE_GRACE_SECONDS,
+    MEDIA_BACKFILL_INTERVAL_MINUTES, MEDIA_BACKFILL_BATCH_SIZE, MEDIA_BACKFILL_CONCURRENCY
 )
 import logging
 
@@ -35,14 +44,28 @@ logger = logging.getLogger(__name__)
 # Thread pool for running fetch operations
 fetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="meme_fetch")
 
+# Job store holding the leader-only jobs; only attached while this process is the leader
+PERSISTENT_JOBSTORE = "persistent"
+
 class AsyncMemeScheduler:
     def __init__(self):
-        self.scheduler = AsyncIOScheduler()
+        self.scheduler = AsyncIOScheduler(
+            jobstores={"default": MemoryJobStore()},
+            job_defaults={
+                "coalesce": True,
+                "max_instances": 1,
+                "misfire_grace_time": SCHEDULER_MISFIRE_GRACE_SECONDS,
+            },
+        )
         self.is_running = False
         self.loop = None
+        self.leader_lock = None
+        self.is_leader = False
+        self.leader_owner = None
+        self.leader_checked_at = None
         
     def start(self):
-        """Start the scheduler"""
+        """Start the scheduler and join leader election - only the leader gets the fetch jobs"""
         if not self.is_running and SCHEDULER_ENABLED:
             try:
                 # Get or create event loop
@@ -52,18 +75,22 @@ class AsyncMemeScheduler:
                     self.loop = asyncio.new_event_loop()
                     asyncio.set_event_loop(self.loop)
                 
-                # Schedule Reddit meme fetching at 3 AM daily
+                if self.leader_lock is None:
+                    self.leader_lock = create_leader_lock(SCHEDULER_LEADER_LOCK)
+                
+                # Every worker competes for the lock; the winner attaches the persistent job store
                 self.scheduler.add_job(
-                    func=self.start_night_fetch_session,
-                    trigger=CronTrigger(hour=NIGHT_FETCH_START_HOUR, minute=0),
-                    id='night_fetch_session',
-                    name='Night Fetch Session (3 AM)',
+                    func=self.run_leader_election,
+                    trigger=IntervalTrigger(seconds=LEADER_ELECTION_INTERVAL_SECONDS),
+                    id='leader_election',
+                    name='Scheduler Leader Election',
+                    next_run_time=datetime.now(),
                     replace_existing=True
                 )
                 
                 self.scheduler.start()
                 self.is_running = True
-                logger.info(f"Async meme scheduler started successfully - Night fetch at {NIGHT_FETCH_START_HOUR}:00 AM for {NIGHT_FETCH_DURATION_MINUTES} minutes")
+                logger.info(f"Async meme scheduler started - competing for leadership via '{self.leader_lock.backend}' lock")
                 
                 # No initial fetch - only fetch at night
                 logger.info("Scheduler configured for night-only fetching. No initial fetch.")
@@ -76,6 +103,98 @@ class AsyncMemeScheduler:
         else:
             logger.info("Scheduler is already running")
     
+    async def run_leader_election(self):
+        """Acquire (or confirm) the leader lock and attach/detach the leader-only jobs accordingly"""
+        try:
+            acquired = await self.leader_lock.acquire()
+        except Exception as e:
+            logger.error(f"[Leader Election] Failed to acquire leader lock: {e}")
+            acquired = False
+        
+        if acquired and not self.is_leader:
+            try:
+                self._become_leader()
+            except Exception as e:
+                # Don't hold the lock without the jobs: let another worker (or the next round) take over
+                logger.error(f"[Leader Election] Failed to attach leader-only jobs: {e}")
+                await self.release_leadership()
+        elif not acquired and self.is_leader:
+            self._step_down()
+        
+        try:
+            self.leader_owner = await self.leader_lock.owner()
+        except Exception as e:
+            logger.warning(f"[Leader Election] Could not determine current leader: {e}")
+            self.leader_owner = None
+        self.leader_checked_at = datetime.now().isoformat()
+    
+    def _become_leader(self):
+        """Attach the persistent job store; a run missed while no leader was up is coalesced and run once"""
+        # Imported here: SQLAlchemy is only needed by the process that wins the election
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        if SCHEDULER_JOBSTORE_URL.startswith("sqlite:"):
+            logger.warning("[Leader Election] Scheduled jobs are stored in SQLite on local disk; "
+                           "set SUPABASE_DB_URL or SCHEDULER_JOBSTORE_URL to keep them across deploys")
+        try:
+            self.scheduler.add_jobstore(SQLAlchemyJobStore(url=SCHEDULER_JOBSTORE_URL), PERSISTENT_JOBSTORE)
+            self._schedule_leader_jobs()
+        except Exception:
+            # add_jobstore registers the store before starting it, so remove it even if that failed
+            self._detach_jobstore()
+            raise
+        self.is_leader = True
+        # Ingestion runs here: import its clients now rather than in the first job
+        start_warming()
+        logger.info(f"[Leader Election] This process is now the scheduler leader - Night fetch at {NIGHT_FETCH_START_HOUR}:00 AM for {NIGHT_FETCH_DURATION_MINUTES} minutes")
+    
+    def _schedule_leader_jobs(self):
+        """Add (or update) the leader-only jobs in the persistent job store"""
+        trigger = CronTrigger(hour=NIGHT_FETCH_START_HOUR, minute=0)
+        job = self.scheduler.get_job('night_fetch_session', jobstore=PERSISTENT_JOBSTORE)
+        if job is None:
+            # Schedule Reddit meme fetching at 3 AM daily
+            self.scheduler.add_job(
+                func=run_night_fetch_session,
+                trigger=trigger,
+                id='night_fetch_session',
+                name='Night Fetch Session (3 AM)',
+                jobstore=PERSISTENT_JOBSTORE
+            )
+        elif str(job.trigger) != str(trigger):
+            # Keep the stored job (and its pending run) but pick up a changed start hour
+            job.reschedule(trigger=trigger)
+        # Fill in layout metadata for older memes, a bounded batch at a time
+        self.scheduler.add_job(
+            func=run_media_backfill,
+            trigger=IntervalTrigger(minutes=MEDIA_BACKFILL_INTERVAL_MINUTES),
+            id='media_metadata_backfill',
+            name='Media Metadata Backfill',
+            jobstore=PERSISTENT_JOBSTORE,
+            replace_existing=True
+        )
+    
+    def _detach_jobstore(self):
+        """Remove the persistent job store from this scheduler without deleting the stored jobs"""
+        try:
+            self.scheduler.remove_jobstore(PERSISTENT_JOBSTORE)
+        except KeyError:
+            pass
+    
+    def _step_down(self):
+        """Detach the persistent job store without deleting the stored jobs"""
+        self._detach_jobstore()
+        self.is_leader = False
+        logger.warning("[Leader Election] Lost scheduler leadership; leader-only jobs detached")
+    
+    async def release_leadership(self):
+        """Give up the leader lock so another worker can take over"""
+        if self.leader_lock is not None:
+            try:
+                await self.leader_lock.release()
+            except Exception as e:
+                logger.error(f"[Leader Election] Failed to release leader lock: {e}")
+        self.is_leader = False
+    
     async def start_night_fetch_session(self):
         """Start the night fetch session at 3 AM - runs for 30 minutes"""
         try:
@@ -138,28 +257,17 @@ class AsyncMemeScheduler:
             # Randomly select categories to fetch from
             selected_categories = random.sample(REDDIT_CATEGORIES, min(REDDIT_CATEGORIES_PER_CYCLE, len(REDDIT_CATEGORIES)))
             
-            total_inserted = 0
+            # Spend this cycle's fetches on the highest-yield subreddits (with some exploration)
+            selected_subreddits = subreddit_selector.select(MEME_SUBREDDITS, len(selected_categories)) or MEME_SUBREDDITS
+            # One category per distinct subreddit: a second pull of the same listing finds
+            # nothing new and would be scored as a zero-yield fetch
+            assignments = list(zip(selected_categories, selected_subreddits))
+            logger.info(f"[Reddit Scheduler] Fetching memes for: {assignments}")
             
-            for category in selected_categories:
-                try:
-                    logger.info(f"[Reddit Scheduler] Fetching memes for category: {category}")
-                    
-                    # Randomly select a subreddit for this category
-                    subreddit = random.choice(MEME_SUBREDDITS)
-                    
-                    # Fetch and store memes
-                    fetch_and_store_memes(category, subreddit)
-                    
-                    logger.info(f"[Reddit Scheduler] Completed fetch for category: {category}, subreddit: {subreddit}")
-                    
-                    # Add a small delay between categories to avoid rate limiting
-                    time.sleep(REDDIT_FETCH_DELAY_SECONDS)
-                    
-                except Exception as e:
-                    logger.error(f"[Reddit Scheduler] Error fetching for category {category}: {e}")
-                    continue
+            # Listings are fetched concurrently and paced by the shared Reddit rate budget
+            total_inserted = fetch_and_store_category_batch(assignments)
             
-            logger.info(f"[Reddit Scheduler] Reddit meme fetch worker completed at {datetime.now()}")
+            logger.info(f"[Reddit Scheduler] Reddit meme fetch worker completed at {datetime.now()}, {total_inserted} new memes")
             
         except Exception as e:
             logger.error(f"[Reddit Scheduler] Critical error in Reddit fetch worker: {e}")
@@ -182,19 +290,44 @@ class AsyncMemeScheduler:
     def _fetch_instagram_memes_worker(self):
         """Worker function that runs in separate thread to fetch Instagram memes"""
         try:
-            # Use the existing Instagram batch function
-            fetch_and_store_instagram_memes_batch()
+            # Several accounts are scraped concurrently within the cycle's post/time budget
+            total_inserted = fetch_and_store_instagram_memes_batch()
             
-            logger.info(f"[Instagram Scheduler] Instagram meme fetch worker completed at {datetime.now()}")
+            logger.info(f"[Instagram Scheduler] Instagram meme fetch worker completed at {datetime.now()}, {total_inserted} new memes")
             
         except Exception as e:
             logger.error(f"[Instagram Scheduler] Critical error in Instagram fetch worker: {e}")
             raise
     
+    async def media_backfill_job(self):
+        """Async job to backfill media metadata - runs in separate thread to avoid blocking"""
+        try:
+            loop = asyncio.get_event_loop()
+            summary = await loop.run_in_executor(
+                fetch_executor, backfill_media_metadata, MEDIA_BACKFILL_BATCH_SIZE, MEDIA_BACKFILL_CONCURRENCY
+            )
+            logger.info(f"[Media Backfill] Completed at {datetime.now()}: {summary}")
+        except Exception as e:
+            logger.error(f"[Media Backfill] Critical error in media backfill job: {e}")
+    
     def get_job_status(self):
-        """Get the status of scheduled jobs"""
+        """Get the status of scheduled jobs and which process owns them"""
+        leader = {
+            "backend": self.leader_lock.backend if self.leader_lock else SCHEDULER_LEADER_LOCK,
+            "is_leader": self.is_leader,
+            "this_process": process_identity(),
+            "owner": self.leader_owner,
+            "checked_at": self.leader_checked_at
+        }
         if not self.is_running:
-            return {"status": "stopped", "jobs": []}
+            return {
+                "status": "stopped",
+                "jobs": [],
+                "leader": leader,
+                "subreddits": subreddit_selector.snapshot(),
+                "reddit_incremental": reddit_checkpoints.metrics(),
+                "instagram_sessions": instagram_sessions.stats()
+            }
         
         jobs = []
         for job in self.scheduler.get_jobs():
@@ -207,7 +340,11 @@ class AsyncMemeScheduler:
         
         return {
             "status": "running",
-            "jobs": jobs
+            "jobs": jobs,
+            "leader": leader,
+            "subreddits": subreddit_selector.snapshot(),
+            "reddit_incremental": reddit_checkpoints.metrics(),
+            "instagram_sessions": instagram_sessions.stats()
         }
     
     async def trigger_manual_fetch_async(self, source="reddit"):
@@ -219,6 +356,9 @@ class AsyncMemeScheduler:
             elif source.lower() == "instagram":
                 logger.info("[Manual Trigger] Starting manual Instagram fetch")
                 await self.fetch_instagram_memes_job()
+            elif source.lower() == "media_backfill":
+                logger.info("[Manual Trigger] Starting manual media metadata backfill")
+                await self.media_backfill_job()
             elif source.lower() == "night_session":
                 logger.info("[Manual Trigger] Starting manual night fetch session")
                 await self.start_night_fetch_session()
@@ -250,17 +390,50 @@ class AsyncMemeScheduler:
             return False
     
     def stop(self):
-        """Stop the scheduler"""
+        """
+        Stop the scheduler. Called from another thread (a sync route), this also hands
+        leadership to another worker; on the event loop itself use `await shutdown()`,
+        which can wait for the release.
+        """
         if self.is_running:
             self.scheduler.shutdown()
             self.is_running = False
             logger.info("Async meme scheduler stopped")
             
-            # Shutdown the thread pool
-            fetch_executor.shutdown(wait=True)
+            # Hand leadership to another worker
+            if self.loop and self.loop.is_running() and not self._on_loop():
+                try:
+                    asyncio.run_coroutine_threadsafe(self.release_leadership(), self.loop).result(LEADER_RELEASE_TIMEOUT_SECONDS)
+                except Exception as e:
+                    logger.error(f"[Leader Election] Failed to release leader lock: {e}")
+            
+            # Shutdown the thread pool; on the event loop, without waiting for running
+            # fetches, so in-flight requests are not blocked behind them
+            fetch_executor.shutdown(wait=not self._on_loop())
             logger.info("Thread pool shutdown completed")
         else:
             logger.info("Scheduler is not running")
+    
+    async def shutdown(self):
+        """Stop the scheduler and release the leader lock, from the event loop (app shutdown)"""
+        was_running = self.is_running
+        self.stop()
+        if was_running:
+            await self.release_leadership()
+    
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
 
 # Global scheduler instance
-async_meme_scheduler = AsyncMemeScheduler() 
\ No newline at end of file
+async_meme_scheduler = AsyncMemeScheduler()
+
+async def run_night_fetch_session():
+    """Module-level entry point so the persistent job store can serialize a reference to it"""
+    await async_meme_scheduler.start_night_fetch_session() 
+
+async def run_media_backfill():
+    """Module-level entry point for the persistent media metadata backfill job"""
+    await async_meme_scheduler.media_backfill_job()
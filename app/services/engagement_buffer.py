@@ -0,0 +1,274 @@
+import os
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.services.supabase_service import get_supabase
+
+# Likes and saves are acknowledged from memory and written in batches. Set to false
+# to write each change straight through (still via the same batched statements).
+ENGAGEMENT_WRITE_BEHIND = os.getenv("ENGAGEMENT_WRITE_BEHIND", "true").lower() == "true"
+# Pending changes are flushed at least this often...
+ENGAGEMENT_FLUSH_SECONDS = float(os.getenv("ENGAGEMENT_FLUSH_SECONDS", "2"))
+# ...or as soon as this many (user, meme) pairs are waiting
+ENGAGEMENT_FLUSH_MAX_PENDING = int(os.getenv("ENGAGEMENT_FLUSH_MAX_PENDING", "500"))
+
+# Most operations accepted by one batch engagement request
+ENGAGEMENT_BATCH_MAX_OPS = int(os.getenv("ENGAGEMENT_BATCH_MAX_OPS", "500"))
+
+# Engagement kind -> table holding one (user_id, meme_id) row per active like/save
+ENGAGEMENT_TABLES = {"like": "meme_likes", "save": "meme_saves"}
+# Client action -> (kind, wanted state)
+ENGAGEMENT_ACTIONS = {"like": ("like", True), "unlike": ("like", False), "save": ("save", True), "unsave": ("save", False)}
+
+# Postgres error codes that retrying cannot fix; such rows are dropped:
+# foreign_key_violation (e.g. the meme was deleted), invalid_text_representation
+_PERMANENT_ERROR_CODES = ("23503", "22P02")
+
+logger = logging.getLogger(__name__)
+
+# (kind, user_id, meme_id); the value is the wanted state: True = row present, False = absent
+Key = Tuple[str, str, int]
+
+
+class EngagementBuffer:
+    """
+    Write-behind buffer for likes and saves. Each (kind, user, meme) keeps only its
+    latest wanted state, so like/unlike toggles between flushes cost nothing; a flush
+    writes all additions of a kind in one upsert and all removals in one delete per
+    user. Until a change is written, reads for the acting user see it through
+    pending_state() and overlay_ids().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Key, bool] = {}
+        # Changes taken by a flush that is still writing them
+        self._inflight: Dict[Key, bool] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.coalesced = 0
+
+    def set_state(self, kind: str, user_id: str, meme_id: int, present: bool, autoflush: bool = True) -> bool:
+        """
+        Record that the user's like/save of a meme should be present (or absent).
+        Returns False when that is already the state this process knows of.
+        With autoflush=False a write-through buffer leaves the write to the caller's flush_soon().
+        """
+        if kind not in ENGAGEMENT_TABLES:
+            raise ValueError(f"Unknown engagement kind: {kind}")
+        key = (kind, str(user_id), int(meme_id))
+        with self._lock:
+            known = self._pending.get(key, self._inflight.get(key))
+            if known == present:
+                return False
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = present
+            backlog = len(self._pending)
+        if not ENGAGEMENT_WRITE_BEHIND:
+            if autoflush:
+                self.flush()
+            return True
+        self._ensure_thread()
+        if backlog >= ENGAGEMENT_FLUSH_MAX_PENDING:
+            self._wake.set()
+        return True
+
+    def flush_soon(self):
+        """Ask the flush thread to write pending changes now instead of at the next interval."""
+        if ENGAGEMENT_WRITE_BEHIND:
+            self._ensure_thread()
+            self._wake.set()
+        else:
+            self.flush()
+
+    def pending_state(self, kind: str, user_id: str, meme_id: int) -> Optional[bool]:
+        """The unwritten state of one like/save, or None if nothing is pending for it."""
+        key = (kind, str(user_id), int(meme_id))
+        with self._lock:
+            return self._pending.get(key, self._inflight.get(key))
+
+    def overlay_ids(self, kind: str, user_id: str, meme_ids: Iterable[int]) -> List[int]:
+        """Apply the user's unwritten changes to a list of liked/saved meme ids read from the database."""
+        user_id = str(user_id)
+        result = list(meme_ids)
+        with self._lock:
+            changes = {**self._inflight, **self._pending}
+        for (change_kind, change_user, meme_id), present in changes.items():
+            if change_kind != kind or change_user != user_id:
+                continue
+            if present and meme_id not in result:
+                result.append(meme_id)
+            elif not present and meme_id in result:
+                result.remove(meme_id)
+        return result
+
+    def flush(self) -> Dict[str, int]:
+        """Write every pending change; failed writes are queued again unless superseded."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = dict(batch)
+            if not batch:
+                return {"added": 0, "removed": 0, "failed": 0, "dropped": 0}
+            summary = {"added": 0, "removed": 0, "failed": 0, "dropped": 0}
+            failed: Dict[Key, bool] = {}
+            for kind, table in ENGAGEMENT_TABLES.items():
+                additions = [(user_id, meme_id) for (k, user_id, meme_id), present in batch.items() if k == kind and present]
+                removals: Dict[str, List[int]] = {}
+                for (k, user_id, meme_id), present in batch.items():
+                    if k == kind and not present:
+                        removals.setdefault(user_id, []).append(meme_id)
+                if additions:
+                    try:
+                        summary["added"] += self._write_additions(kind, table, additions)
+                    except Exception as e:
+                        # One bad row fails the whole statement: retry row by row to isolate it
+                        logger.warning(f"[Engagement] Could not write {len(additions)} {kind}s, retrying one by one: {e}")
+                        for user_id, meme_id in additions:
+                            try:
+                                summary["added"] += self._write_additions(kind, table, [(user_id, meme_id)])
+                            except Exception as row_e:
+                                if getattr(row_e, "code", None) in _PERMANENT_ERROR_CODES:
+                                    logger.warning(f"[Engagement] Dropping {kind} of meme {meme_id} by {user_id}: {row_e}")
+                                    summary["dropped"] += 1
+                                else:
+                                    failed[(kind, user_id, meme_id)] = True
+                for user_id, meme_ids in removals.items():
+                    try:
+                        summary["removed"] += self._write_removals(kind, table, user_id, meme_ids)
+                    except Exception as e:
+                        logger.warning(f"[Engagement] Could not remove {len(meme_ids)} {kind}s for {user_id}: {e}")
+                        failed.update({(kind, user_id, meme_id): False for meme_id in meme_ids})
+            with self._lock:
+                for key, present in failed.items():
+                    # A newer change for the same pair wins over the retry
+                    self._pending.setdefault(key, present)
+                self._inflight = {}
+            summary["failed"] = len(failed)
+            self.flushes += 1
+            return summary
+
+    def _write_additions(self, kind: str, table: str, additions: List[Tuple[str, int]]) -> int:
+        resp = get_supabase().table(table).upsert(
+            [{"user_id": user_id, "meme_id": meme_id} for user_id, meme_id in additions],
+            on_conflict="user_id,meme_id", ignore_duplicates=True
+        ).execute()
+        # Only rows that did not exist yet come back
+        from app.services.activity_service import record_activity
+        for row in resp.data or []:
+            _count_engagement(row["meme_id"], kind, 1)
+            record_activity(row["user_id"], kind, row["meme_id"])
+        return len(resp.data or [])
+
+    def _write_removals(self, kind: str, table: str, user_id: str, meme_ids: List[int]) -> int:
+        resp = get_supabase().table(table).delete().eq("user_id", user_id).in_("meme_id", meme_ids).execute()
+        for row in resp.data or []:
+            _count_engagement(row["meme_id"], kind, -1)
+        return len(resp.data or [])
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(ENGAGEMENT_FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[Engagement] Flush failed: {e}")
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="engagement_flush", daemon=True)
+                self._thread.start()
+
+    def close(self) -> Dict[str, int]:
+        """Stop the flush thread and write whatever is still pending (called on shutdown)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=ENGAGEMENT_FLUSH_SECONDS + 5)
+        return self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pending": len(self._pending), "inflight": len(self._inflight),
+                    "flushes": self.flushes, "coalesced": self.coalesced}
+
+
+def engagement_exists(kind: str, user_id: str, meme_id: int) -> bool:
+    """Whether the like/save is already written (pending changes not included)."""
+    resp = (
+        get_supabase().table(ENGAGEMENT_TABLES[kind]).select("meme_id")
+        .eq("user_id", user_id).eq("meme_id", meme_id).limit(1).execute()
+    )
+    return bool(resp.data)
+
+
+def meme_exists(meme_id: int) -> bool:
+    from app.services.meme_catalog import meme_catalog
+    if meme_catalog.get(meme_id) is not None:
+        return True
+    return bool(get_supabase().table("memes").select("id").eq("id", meme_id).limit(1).execute().data)
+
+
+def _count_engagement(meme_id: int, kind: str, delta: int):
+    """Pass a written like/save change on to the catalog counters, trending scores, leaderboards and live streams."""
+    from app.services.meme_catalog import meme_catalog
+    from app.services.trending_service import trending_index
+    from app.services.leaderboard_service import leaderboards
+    from app.services.push_hub import push_hub
+    meme_catalog.on_engagement(meme_id, kind, delta)
+    leaderboards.record(meme_id, kind, delta)
+    cached = meme_catalog.get(meme_id) or {}
+    trending_index.on_engagement(meme_id, kind, delta, cached.get("category"), cached.get("timestamp"))
+    if cached:
+        # Counts are only known for hot memes; those are the ones clients are looking at
+        push_hub.publish_counts(cached)
+
+
+# Global engagement buffer instance
+engagement_buffer = EngagementBuffer()
+
+
+def apply_engagement_batch(user_id: str, ops: List[Dict]) -> List[Dict]:
+    """
+    Apply a list of {"meme_id", "action"} operations for one user, in order.
+    Memes that do not exist are reported per item and skipped; everything else goes
+    through the buffer, so all of the batch is written by one flush of bulk statements.
+    """
+    if len(ops) > ENGAGEMENT_BATCH_MAX_OPS:
+        raise ValueError(f"At most {ENGAGEMENT_BATCH_MAX_OPS} operations per batch")
+    from app.services.meme_catalog import meme_catalog
+    meme_ids = {int(op["meme_id"]) for op in ops}
+    existing = {meme_id for meme_id in meme_ids if meme_catalog.get(meme_id) is not None}
+    unknown = list(meme_ids - existing)
+    try:
+        for start in range(0, len(unknown), 200):
+            resp = get_supabase().table("memes").select("id").in_("id", unknown[start:start + 200]).execute()
+            existing.update(row["id"] for row in resp.data or [])
+    except Exception as e:
+        raise RuntimeError(f"Failed to look up memes for engagement batch: {e}")
+
+    results = []
+    for index, op in enumerate(ops):
+        meme_id, action = int(op["meme_id"]), op["action"]
+        result = {"index": index, "meme_id": meme_id, "action": action}
+        if action not in ENGAGEMENT_ACTIONS:
+            result["status"] = "invalid_action"
+        elif meme_id not in existing:
+            result["status"] = "not_found"
+        else:
+            kind, present = ENGAGEMENT_ACTIONS[action]
+            changed = engagement_buffer.set_state(kind, user_id, meme_id, present, autoflush=False)
+            result["status"] = "applied" if changed else "unchanged"
+        results.append(result)
+    if any(result["status"] == "applied" for result in results):
+        engagement_buffer.flush_soon()
+    return results
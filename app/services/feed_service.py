@@ -0,0 +1,187 @@
+import os
+import json
+import math
+import time
+import heapq
+import base64
+import bisect
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from app.services.supabase_service import get_supabase, get_meme_counts_batch
+from app.config.scheduler_config import MEME_CATEGORIES
+
+# How many memes are kept in each precomputed per-category ranking
+FEED_RANKED_LIST_SIZE = int(os.getenv("FEED_RANKED_LIST_SIZE", "300"))
+FEED_RANKING_TTL_SECONDS = int(os.getenv("FEED_RANKING_TTL_SECONDS", "120"))
+FEED_PREFERENCES_TTL_SECONDS = int(os.getenv("FEED_PREFERENCES_TTL_SECONDS", "300"))
+# A meme's engagement counts half as much for every FEED_HALF_LIFE_HOURS of age
+FEED_HALF_LIFE_HOURS = float(os.getenv("FEED_HALF_LIFE_HOURS", "12"))
+# Most categories a single `weights` parameter may name
+FEED_MAX_CATEGORIES = int(os.getenv("FEED_MAX_CATEGORIES", "12"))
+
+# category -> (expires_at, ranked list of meme dicts, their (-score, -id) keys in ascending order)
+_rankings: Dict[str, tuple] = {}
+_ranking_locks: Dict[str, threading.Lock] = {category: threading.Lock() for category in MEME_CATEGORIES}
+# user_id -> (expires_at, meme_choices)
+_preferences: Dict[str, tuple] = {}
+
+
+def _rank_score(meme: Dict, now: float) -> float:
+    """
+    log2 of engagement plus the upload time in half-lives: fresh memes with some likes
+    float to the top. Every meme ages at the same rate, so the order of these scores
+    never changes with time and a (score, id) cursor stays valid across rebuilds.
+    """
+    engagement = meme.get("like_count", 0) + 2 * meme.get("save_count", 0) + 1
+    ts = meme.get("timestamp")
+    try:
+        created = datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp() if ts else now
+    except ValueError:
+        created = now
+    return math.log2(engagement) + created / (FEED_HALF_LIFE_HOURS * 3600)
+
+
+def _build_ranking(category: str) -> Tuple[List[Dict], List[tuple]]:
+    resp = (
+        get_supabase().table("memes").select("*").eq("category", category)
+        .order("id", desc=True).range(0, FEED_RANKED_LIST_SIZE - 1).execute()
+    )
+    memes = [m for m in resp.data or [] if m.get("id") is not None]
+    counts = get_meme_counts_batch([m["id"] for m in memes])
+    now = time.time()
+    for meme in memes:
+        meme["like_count"] = counts["like_counts"].get(meme["id"], 0)
+        meme["save_count"] = counts["save_counts"].get(meme["id"], 0)
+    keyed = sorted(((-_rank_score(m, now), -m["id"]), m) for m in memes)
+    return [m for _, m in keyed], [key for key, _ in keyed]
+
+
+def get_category_ranking(category: str) -> Tuple[List[Dict], List[tuple]]:
+    """
+    Precomputed ranked list for one of MEME_CATEGORIES, with its sort keys, rebuilt
+    at most once per FEED_RANKING_TTL_SECONDS.
+    """
+    lock = _ranking_locks.get(category)
+    if lock is None:
+        raise ValueError(f"Unknown category '{category}'")
+    cached = _rankings.get(category)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    with lock:
+        # Another request may have rebuilt it while we waited
+        cached = _rankings.get(category)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+        try:
+            ranking, keys = _build_ranking(category)
+        except Exception as e:
+            raise RuntimeError(f"Failed to rank memes for category '{category}': {e}")
+        _rankings[category] = (time.monotonic() + FEED_RANKING_TTL_SECONDS, ranking, keys)
+        return ranking, keys
+
+
+def invalidate_category_ranking(category: Optional[str] = None):
+    if category is None:
+        _rankings.clear()
+    else:
+        _rankings.pop(category, None)
+
+
+def get_meme_choices(user_id: str) -> List[str]:
+    """The categories the user picked at signup, cached per user."""
+    cached = _preferences.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    try:
+        resp = get_supabase().table("users").select("meme_choices").eq("id", user_id).execute()
+    except Exception as e:
+        raise RuntimeError(f"Failed to get meme choices: {e}")
+    choices = (resp.data[0].get("meme_choices") if resp.data else None) or []
+    choices = [c.strip() for c in choices if isinstance(c, str) and c.strip()]
+    _preferences[user_id] = (time.monotonic() + FEED_PREFERENCES_TTL_SECONDS, choices)
+    return choices
+
+
+def parse_weights(weights: str) -> Dict[str, float]:
+    """Parse 'funny:2,dank:1' into {'funny': 2.0, 'dank': 1.0}; bare names weigh 1."""
+    parsed = {}
+    for part in (weights or "").split(","):
+        name, _, value = part.partition(":")
+        name = name.strip()
+        if not name:
+            continue
+        if name not in _ranking_locks:
+            raise ValueError(f"Unknown category '{name}'. Use any of: {', '.join(MEME_CATEGORIES)}")
+        try:
+            weight = float(value) if value.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight for category '{name}': {value}")
+        if weight > 0:
+            parsed[name] = weight
+    if len(parsed) > FEED_MAX_CATEGORIES:
+        raise ValueError(f"At most {FEED_MAX_CATEGORIES} categories can be weighted")
+    return parsed
+
+
+def encode_cursor(positions: Dict[str, list]) -> str:
+    raw = json.dumps(positions, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Dict[str, list]:
+    """category -> [score, id, items consumed] of the last meme served from that category."""
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        positions = json.loads(raw)
+        return {str(k): [float(v[0]), int(v[1]), int(v[2])] for k, v in positions.items()}
+    except Exception:
+        raise ValueError("Invalid feed cursor")
+
+
+def get_personalized_feed(user_id: str, page_size: int = 20, cursor: Optional[str] = None, weights: str = "") -> Dict:
+    """
+    Interleave the per-category rankings in proportion to the user's weights.
+    Each category is a stream; its n-th item is due at virtual time n / weight and a
+    k-way heap merge always emits the earliest due item, so a weight-2 category
+    contributes twice as often as a weight-1 category. The cursor records the
+    (score, id) of the last meme taken from each stream, so a ranking rebuilt between
+    pages resumes after that meme instead of at a stale position.
+    """
+    category_weights = parse_weights(weights)
+    if not category_weights:
+        choices = [c for c in get_meme_choices(user_id) if c in _ranking_locks] or MEME_CATEGORIES
+        category_weights = {category: 1.0 for category in choices[:FEED_MAX_CATEGORIES]}
+    positions = decode_cursor(cursor)
+
+    streams = {}
+    heap = []
+    for category, weight in category_weights.items():
+        ranking, keys = get_category_ranking(category)
+        consumed = 0
+        index = 0
+        if category in positions:
+            score, meme_id, consumed = positions[category]
+            index = bisect.bisect_right(keys, (-score, -meme_id))
+        streams[category] = [ranking, keys, index, consumed]
+        if index < len(ranking):
+            heap.append(((consumed + 1) / weight, category))
+    heapq.heapify(heap)
+
+    memes = []
+    while heap and len(memes) < page_size:
+        _, category = heapq.heappop(heap)
+        stream = streams[category]
+        ranking, keys, index, consumed = stream
+        memes.append(dict(ranking[index]))
+        stream[2], stream[3] = index + 1, consumed + 1
+        positions[category] = [-keys[index][0], -keys[index][1], consumed + 1]
+        if index + 1 < len(ranking):
+            heapq.heappush(heap, ((consumed + 2) / category_weights[category], category))
+
+    return {
+        "memes": memes,
+        "next_cursor": encode_cursor(positions) if heap else None,
+    }
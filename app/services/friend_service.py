@@ -2,6 +2,7 @@ import os
 from supabase import create_client
 from app.models.friend import FriendRequest, Friend
 from app.models.user import UserOut
+from app.services.activity_service import invalidate_friends
 from typing import List
 from datetime import datetime
 
@@ -29,6 +30,7 @@ def respond_friend_request(request_id: int, accept: bool) -> FriendRequest:
         # Add to friends table (bidirectional)
         supabase.table("friends").insert({"user_id": fr.from_user_id, "friend_id": fr.to_user_id, "since": datetime.utcnow().isoformat()}).execute()
         supabase.table("friends").insert({"user_id": fr.to_user_id, "friend_id": fr.from_user_id, "since": datetime.utcnow().isoformat()}).execute()
+        invalidate_friends(fr.from_user_id, fr.to_user_id)
     return fr
 
 def list_friends(user_id: int) -> List[UserOut]:
@@ -1,11 +1,14 @@
 import os
-import google.generativeai as genai
+import time
+import threading
 from typing import List, Dict
 from app.services.supabase_service import get_supabase
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-genai.configure(api_key=GEMINI_API_KEY)
+# Pin a model (e.g. "models/gemini-1.5-flash") to skip model discovery entirely
+GEMINI_MODEL = os.getenv("GEMINI_MODEL")
+# How long a discovered model is reused before the model list is checked again
+GEMINI_MODEL_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_MODEL_CACHE_TTL_SECONDS", "86400"))
 
 PROMPT_MEMES = (
     "Find the top 20 most popular Indian memes posted on Reddit in the last 24 hours. "
@@ -23,29 +26,62 @@ PROMPT_SUBREDDITS = (
     "Return only the subreddit names as a JSON array of strings."
 )
 
+_cached_model = None
+_cached_model_expires_at = 0.0
+_model_lock = threading.Lock()
+_genai_module = None
+
+def _genai():
+    """google.generativeai, imported and configured on first use (it is slow to import)"""
+    global _genai_module
+    if _genai_module is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai_module = genai
+    return _genai_module
+
 def list_gemini_models():
-    models = genai.list_models()
+    models = _genai().list_models()
     print("Available Gemini models:")
     for m in models:
         print(f"- {m.name} (methods: {m.supported_generation_methods})")
     return models
 
-# Call this once at import to print available models
-list_gemini_models()
-
 # Use the first available model that supports 'generateContent'
 def get_first_supported_model():
-    models = genai.list_models()
+    models = _genai().list_models()
     for m in models:
         if 'generateContent' in getattr(m, 'supported_generation_methods', []):
             return m.name
     raise RuntimeError("No Gemini model with generateContent support found.")
 
+def get_gemini_model():
+    """
+    GenerativeModel for the pinned GEMINI_MODEL, or the first model discovered to support
+    generateContent. Resolved on first use and cached for GEMINI_MODEL_CACHE_TTL_SECONDS,
+    so neither importing this module nor each search pays for a model listing.
+    """
+    global _cached_model, _cached_model_expires_at
+    with _model_lock:
+        if _cached_model is None or time.monotonic() >= _cached_model_expires_at:
+            try:
+                model_name = GEMINI_MODEL or get_first_supported_model()
+            except Exception as e:
+                if _cached_model is None:
+                    raise
+                # Discovery failed on refresh: keep the model we already have for another TTL
+                print(f"Gemini model discovery failed, reusing {_cached_model.model_name}: {e}")
+                _cached_model_expires_at = time.monotonic() + GEMINI_MODEL_CACHE_TTL_SECONDS
+                return _cached_model
+            print(f"Using Gemini model: {model_name}")
+            _cached_model = _genai().GenerativeModel(model_name)
+            # A pinned model never needs rediscovery
+            _cached_model_expires_at = float("inf") if GEMINI_MODEL else time.monotonic() + GEMINI_MODEL_CACHE_TTL_SECONDS
+        return _cached_model
+
 
 def search_indian_memes_on_reddit() -> List[Dict]:
-    model_name = get_first_supported_model()
-    print(f"Using Gemini model: {model_name}")
-    model = genai.GenerativeModel(model_name)
+    model = get_gemini_model()
     response = model.generate_content(PROMPT_MEMES)
     # Try to extract JSON from the response
     import json
@@ -73,9 +109,7 @@ def search_indian_memes_on_reddit() -> List[Dict]:
 
 
 def search_active_indian_meme_subreddits() -> List[str]:
-    model_name = get_first_supported_model()
-    print(f"Using Gemini model for subreddits: {model_name}")
-    model = genai.GenerativeModel(model_name)
+    model = get_gemini_model()
     response = model.generate_content(PROMPT_SUBREDDITS)
     import json
     import re
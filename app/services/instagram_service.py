@@ -1,13 +1,17 @@
 import os
-import instaloader
-import cloudinary
-import cloudinary.uploader
 from typing import List, Dict
-from instagrapi import Client
-from pathlib import Path
-from instagrapi.exceptions import ClientError, ClientLoginRequired
+from app.services.instagram_session import instagram_sessions
+from app.services.media_transfer import upload_from_url
+from app.services.media_metadata import upload_options, metadata_from_upload
 import random
-from app.services.supabase_service import get_supabase
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.supabase_service import get_supabase, notify_memes_inserted
+from app.config.scheduler_config import (
+    INSTAGRAM_ACCOUNTS_PER_CYCLE, INSTAGRAM_POSTS_PER_ACCOUNT, INSTAGRAM_FETCH_CONCURRENCY,
+    INSTAGRAM_UPLOAD_CONCURRENCY, INSTAGRAM_ACCOUNT_MIN_INTERVAL_SECONDS,
+    INSTAGRAM_MAX_POSTS_PER_CYCLE, INSTAGRAM_CYCLE_TIME_BUDGET_SECONDS
+)
 import time
 from datetime import datetime
 import logging
@@ -21,13 +25,6 @@ logging.getLogger("cloudinary").setLevel(logging.WARNING)
 logging.getLogger("instagrapi").setLevel(logging.WARNING)
 logging.getLogger("instaloader").setLevel(logging.WARNING)
 
-# Configure Cloudinary from environment variables
-cloudinary.config(
-    cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-    api_key=os.getenv('CLOUDINARY_API_KEY'),
-    api_secret=os.getenv('CLOUDINARY_API_SECRET')
-)
-
 def scrape_and_upload_instagram_memes(
     instagram_username: str,
     session_file: str,
@@ -37,6 +34,7 @@ def scrape_and_upload_instagram_memes(
     Scrape latest posts from an Instagram page and upload to Cloudinary.
     Returns a list of dicts: { 'cloudinary_url', 'caption', 'instagram_post_url' }
     """
+    import instaloader
     L = instaloader.Instaloader()
     # Load session from custom file in project root
     L.load_session_from_file(instagram_username, filename=session_file)
@@ -46,87 +44,69 @@ def scrape_and_upload_instagram_memes(
     for post in profile.get_posts():
         if count >= max_posts:
             break
-        # Download to temp file
-        L.download_post(post, target="_tmp")
-        # Find the downloaded file
-        local_file = None
-        for ext in (".jpg", ".mp4"):
-            candidate = f"_tmp/{post.date_utc.strftime('%Y-%m-%d_%H-%M-%S_UTC')}{ext}"
-            if os.path.exists(candidate):
-                local_file = candidate
-                break
-        if not local_file:
+        # Stream straight from Instagram's CDN into Cloudinary; media URLs are signed,
+        # so like instaloader's own downloads this needs no logged-in session
+        resource_type = "video" if post.is_video else "image"
+        media_url = post.video_url if post.is_video else post.url
+        if not media_url:
             continue
-        # Upload to Cloudinary
-        resource_type = "video" if local_file.endswith(".mp4") else "image"
-        upload_result = cloudinary.uploader.upload(local_file, resource_type=resource_type)
-        # Clean up local file
-        os.remove(local_file)
-        # Add to results
+        upload_result = upload_from_url(media_url, resource_type=resource_type, **upload_options(resource_type=resource_type))
         results.append({
             "cloudinary_url": upload_result["secure_url"],
             "caption": post.caption,
-            "instagram_post_url": f"https://instagram.com/p/{post.shortcode}/"
+            "instagram_post_url": f"https://instagram.com/p/{post.shortcode}/",
+            "metadata": metadata_from_upload(upload_result)
         })
         count += 1
-    # Optionally, clean up the _tmp directory
-    try:
-        os.rmdir("_tmp")
-    except Exception:
-        pass
     return results
 
-# New instagrapi-based function
-def scrape_and_upload_instagram_memes_instagrapi(
-    instagram_username: str,
-    max_posts: int = 10
-) -> List[Dict]:
-    """
-    Scrape latest posts from an Instagram page using instagrapi and upload to Cloudinary.
-    Returns a list of dicts: { 'cloudinary_url', 'caption', 'instagram_post_url' }
-    """
-    ig_user = os.getenv('INSTA_USERNAME')
-    ig_pass = os.getenv('INSTA_PASSWORD')
-    cl = Client()
-    cl.request_timeout = 20  # Increase timeout to 20 seconds for downloads
-    settings_path = Path('instagrapi_settings.json')
-    if settings_path.exists():
-        cl.load_settings(settings_path)
-    cl.login(ig_user, ig_pass)
-    cl.dump_settings(settings_path)
-    try:
+def _media_source(media):
+    """(url, resource_type) to transfer for an instagrapi media, or (None, None)"""
+    if media.media_type == 1:
+        return (str(media.thumbnail_url) if media.thumbnail_url else None), "image"
+    return (str(media.video_url) if media.video_url else None), "video"
+
+def _fetch_account_medias(instagram_username: str, max_posts: int) -> List:
+    """Latest medias of an account through the pooled, logged-in instagrapi clients"""
+    def fetch_medias(cl):
         user_id = cl.user_id_from_username(instagram_username)
         try:
-            medias = cl.user_medias(user_id, max_posts)
+            return cl.user_medias(user_id, max_posts)
         except KeyError as e:
             print(f"KeyError in user_medias: {e}, trying user_medias_v1 fallback")
-            medias = cl.user_medias_v1(user_id, max_posts)
+            return cl.user_medias_v1(user_id, max_posts)
+
+    try:
+        # Re-logs in only if the session expired
+        medias = instagram_sessions.run(fetch_medias)
     except Exception as e:
         print(f"Error fetching medias: {e}")
         raise RuntimeError(f"Failed to fetch posts for {instagram_username}: {e}")
     if not medias:
         raise RuntimeError(f"No posts found for user {instagram_username} or the account is private/restricted.")
+    return medias
+
+# New instagrapi-based function
+def scrape_and_upload_instagram_memes_instagrapi(
+    instagram_username: str,
+    max_posts: int = 10
+) -> List[Dict]:
+    """
+    Scrape latest posts from an Instagram page using instagrapi and upload to Cloudinary.
+    Returns a list of dicts: { 'cloudinary_url', 'caption', 'instagram_post_url' }
+    """
+    medias = _fetch_account_medias(instagram_username, max_posts)
     results = []
     for media in medias:
-        url = None
-        if media.media_type == 1:
-            url = str(media.thumbnail_url) if media.thumbnail_url else None
-        else:
-            url = str(media.video_url) if media.video_url else None
+        url, resource_type = _media_source(media)
         if not url:
             continue
-        local_filename = url.split("?")[0].split("/")[-1]
-        if media.media_type == 1:
-            downloaded_path = cl.photo_download_by_url(url, filename=local_filename)
-        else:
-            downloaded_path = cl.video_download_by_url(url, filename=local_filename)
-        resource_type = "video" if media.media_type != 1 else "image"
-        upload_result = cloudinary.uploader.upload(downloaded_path, resource_type=resource_type)
-        os.remove(downloaded_path)
+        upload_result = upload_from_url(url, resource_type=resource_type, **upload_options(resource_type=resource_type))
         results.append({
             "cloudinary_url": upload_result["secure_url"],
             "caption": media.caption_text,
-            "instagram_post_url": f"https://instagram.com/p/{media.code}/"
+            "instagram_post_url": f"https://instagram.com/p/{media.code}/",
+            "metadata": metadata_from_upload(upload_result)
         })
     return results
 
@@ -144,54 +124,152 @@ INSTAGRAM_ACCOUNTS = [
     # Add more accounts as needed
 ]
 
-def fetch_and_store_instagram_memes_batch():
-    """
-    Fetch posts from a random Instagram account and save to Supabase, skipping already-saved posts.
-    Optimized for non-blocking operation with reduced limits.
-    """
+# Global cap on accounts scraped at once, shared by every batch running in this process
+_account_slots = threading.BoundedSemaphore(max(1, INSTAGRAM_FETCH_CONCURRENCY))
+# Last scrape time per account, used to pace how often each account is hit
+_account_last_fetched: Dict[str, float] = {}
+_account_lock = threading.Lock()
+
+class _CycleBudget:
+    """Posts and wall-clock budget shared by the accounts of one batch cycle"""
+
+    def __init__(self, max_posts: int, max_seconds: float):
+        self.remaining = max_posts
+        self.deadline = time.monotonic() + max_seconds
+        self._lock = threading.Lock()
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0 or self.expired():
+                return False
+            self.remaining -= 1
+            return True
+
+    def refund(self):
+        with self._lock:
+            self.remaining += 1
+
+def _pick_accounts(count: int) -> List[str]:
+    """Accounts due for a scrape, least recently scraped first, reserved for this cycle"""
+    now = time.time()
+    with _account_lock:
+        due = [
+            account for account in INSTAGRAM_ACCOUNTS
+            if now - _account_last_fetched.get(account, 0) >= INSTAGRAM_ACCOUNT_MIN_INTERVAL_SECONDS
+        ]
+        random.shuffle(due)
+        due.sort(key=lambda account: _account_last_fetched.get(account, 0))
+        picked = due[:count]
+        # Reserve them now so an overlapping batch does not pick the same accounts
+        for account in picked:
+            _account_last_fetched[account] = now
+    return picked
+
+def _existing_post_urls(post_urls: List[str]) -> set:
+    """Post URLs already stored, looked up in one query"""
+    if not post_urls:
+        return set()
+    existing = get_supabase().table("memes").select("reddit_post_url").in_("reddit_post_url", post_urls).execute()
+    return {row["reddit_post_url"] for row in existing.data or []}
+
+def _transfer_post(media, url: str, resource_type: str, budget: _CycleBudget):
+    if not budget.take():
+        return None
     try:
-        accounts = INSTAGRAM_ACCOUNTS[:]
-        random.shuffle(accounts)
-        
-        for account in accounts:
+        upload_result = upload_from_url(url, resource_type=resource_type, **upload_options(resource_type=resource_type))
+    except Exception:
+        budget.refund()
+        raise
+    return {
+        "cloudinary_url": upload_result["secure_url"],
+        "caption": media.caption_text,
+        "instagram_post_url": f"https://instagram.com/p/{media.code}/",
+        "metadata": metadata_from_upload(upload_result)
+    }
+
+def _ingest_account(account: str, budget: _CycleBudget) -> int:
+    """Scrape one account, upload its unseen posts in parallel and store them. Returns new memes saved."""
+    with _account_slots:
+        if budget.expired():
+            return 0
+        medias = _fetch_account_medias(account, INSTAGRAM_POSTS_PER_ACCOUNT)
+    # Skip posts we already have before spending an upload on them
+    candidates = []
+    for media in medias:
+        url, resource_type = _media_source(media)
+        if url:
+            candidates.append((media, url, resource_type))
+    existing = _existing_post_urls([f"https://instagram.com/p/{media.code}/" for media, _, _ in candidates])
+    candidates = [c for c in candidates if f"https://instagram.com/p/{c[0].code}/" not in existing]
+
+    memes = []
+    with ThreadPoolExecutor(
+        max_workers=max(1, INSTAGRAM_UPLOAD_CONCURRENCY), thread_name_prefix="instagram_upload"
+    ) as uploads:
+        futures = [
+            uploads.submit(_transfer_post, media, url, resource_type, budget)
+            for media, url, resource_type in candidates
+        ]
+        for future in futures:
             try:
-                # Reduced max_posts for faster processing
-                memes = scrape_and_upload_instagram_memes_instagrapi(account, max_posts=10)
-                new_count = 0
-                
-                for meme in memes:
-                    # Check by Instagram post URL to avoid duplicates
-                    existing = get_supabase().table("memes").select("id").eq("reddit_post_url", meme["instagram_post_url"]).execute()
-                    if not existing.data:
-                        try:
-                            get_supabase().table("memes").insert({
-                                "title": meme["caption"] or "",
-                                "cloudinary_url": meme["cloudinary_url"],
-                                "reddit_post_url": meme["instagram_post_url"],
-                                "category": "instagram",
-                                "subreddit": "instagram",  # Ensure required field
-                                "timestamp": datetime.utcnow().isoformat(),
-                                "uploader_id": None,
-                                "uploader_username": None
-                            }).execute()
-                            new_count += 1
-                            
-                            # Limit total memes per batch for faster processing
-                            if new_count >= 10:
-                                break
-                                
-                        except Exception as insert_e:
-                            print(f"[Instagram Batch] Insert error: {insert_e} | Data: {meme}")
-                            
-                print(f"[Instagram Batch] Account: {account}, New memes saved: {new_count}")
-                break  # Only fetch from one account per run
-                
+                meme = future.result()
             except Exception as e:
-                print(f"[Instagram Batch] Error with account {account}: {e}")
+                print(f"[Instagram Batch] Upload error for {account}: {e}")
                 continue
-                
-        print(f"[Instagram Batch] Batch run complete at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        
+            if meme:
+                memes.append(meme)
+
+    new_count = 0
+    for meme in memes:
+        try:
+            resp = get_supabase().table("memes").insert({
+                "title": meme["caption"] or "",
+                "cloudinary_url": meme["cloudinary_url"],
+                "reddit_post_url": meme["instagram_post_url"],
+                "category": "instagram",
+                "subreddit": "instagram",  # Ensure required field
+                "timestamp": datetime.utcnow().isoformat(),
+                "uploader_id": None,
+                "uploader_username": None,
+                **meme.get("metadata", {})
+            }).execute()
+            notify_memes_inserted(resp.data)
+            new_count += 1
+        except Exception as insert_e:
+            print(f"[Instagram Batch] Insert error: {insert_e} | Data: {meme}")
+    return new_count
+
+def fetch_and_store_instagram_memes_batch() -> int:
+    """
+    Fetch new posts from several Instagram accounts concurrently and save them to Supabase.
+    Accounts are paced (each is scraped at most once per INSTAGRAM_ACCOUNT_MIN_INTERVAL_SECONDS),
+    scraped under a process-wide concurrency cap, and the cycle stops uploading once its
+    post or time budget is spent. Returns the number of new memes saved.
+    """
+    try:
+        accounts = _pick_accounts(INSTAGRAM_ACCOUNTS_PER_CYCLE)
+        if not accounts:
+            print("[Instagram Batch] No account due for a scrape this cycle")
+            return 0
+        budget = _CycleBudget(INSTAGRAM_MAX_POSTS_PER_CYCLE, INSTAGRAM_CYCLE_TIME_BUDGET_SECONDS)
+        total_new = 0
+        with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix="instagram_account") as pool:
+            futures = {pool.submit(_ingest_account, account, budget): account for account in accounts}
+            for future in as_completed(futures):
+                account = futures[future]
+                try:
+                    new_count = future.result()
+                    total_new += new_count
+                    print(f"[Instagram Batch] Account: {account}, New memes saved: {new_count}")
+                except Exception as e:
+                    print(f"[Instagram Batch] Error with account {account}: {e}")
+
+        print(f"[Instagram Batch] Batch run complete at {time.strftime('%Y-%m-%d %H:%M:%S')}, {total_new} new memes from {len(accounts)} accounts")
+        return total_new
+
     except Exception as e:
         print(f"[Instagram Batch] Critical error: {e}")
-        raise 
\ No newline at end of file
+        raise
@@ -0,0 +1,147 @@
+import os
+import time
+import queue
+import threading
+import logging
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+from app.config.scheduler_config import INSTAGRAM_SESSION_POOL_SIZE
+
+if TYPE_CHECKING:
+    from instagrapi import Client
+
+logger = logging.getLogger(__name__)
+
+
+class InstagramSessionManager:
+    """
+    Pool of logged-in instagrapi clients shared across scrapes.
+    Only the first client ever calls login(); the others are cloned from its
+    settings, so the pool costs one Instagram session. When a client hits
+    ClientLoginRequired it re-logs in once, bumps the settings generation and
+    every other pooled client picks the new session up on its next checkout
+    instead of logging in again. Settings writes are serialized and atomic.
+    """
+
+    def __init__(self, username: Optional[str], password: Optional[str],
+                 settings_path: str = "instagrapi_settings.json", pool_size: int = INSTAGRAM_SESSION_POOL_SIZE):
+        self.username = username
+        self.password = password
+        self.settings_path = Path(settings_path)
+        self.pool_size = max(1, pool_size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        self._settings: Optional[Dict] = None
+        self._generation = 0
+        self._session_started_at: Optional[float] = None
+        self.logins = 0
+        self.relogins = 0
+
+    def _new_client(self) -> "Client":
+        # instagrapi is heavy to import; only scrapes need it
+        from instagrapi import Client
+        cl = Client()
+        cl.request_timeout = 20  # Increase timeout to 20 seconds for downloads
+        with self._login_lock:
+            if self._settings is None:
+                if self.settings_path.exists():
+                    cl.load_settings(self.settings_path)
+                # Reuses the stored session when the settings already hold one
+                cl.login(self.username, self.password)
+                self.logins += 1
+                self._settings = cl.get_settings()
+                self._session_started_at = time.time()
+                self._save_settings(cl)
+            else:
+                # Clone the pooled session; credentials are only kept for relogin()
+                cl.set_settings(self._settings)
+                cl.username = self.username
+                cl.password = self.password
+        cl._memee_generation = self._generation
+        return cl
+
+    def _save_settings(self, cl: "Client"):
+        """Write settings atomically; callers hold _login_lock so writes never interleave."""
+        tmp_path = self.settings_path.with_name(f"{self.settings_path.name}.tmp")
+        try:
+            cl.dump_settings(tmp_path)
+            os.replace(tmp_path, self.settings_path)
+        except Exception as e:
+            logger.warning(f"[Instagram Sessions] Could not save settings: {e}")
+
+    def _refresh_if_stale(self, cl: "Client"):
+        if getattr(cl, "_memee_generation", -1) < self._generation:
+            with self._login_lock:
+                cl.set_settings(self._settings)
+                cl._memee_generation = self._generation
+
+    def _relogin(self, cl: "Client"):
+        with self._login_lock:
+            if getattr(cl, "_memee_generation", -1) < self._generation:
+                # Another thread already re-logged in; adopt its session
+                cl.set_settings(self._settings)
+            else:
+                logger.info("[Instagram Sessions] Session expired, logging in again")
+                cl.relogin()
+                self.relogins += 1
+                self._generation += 1
+                self._settings = cl.get_settings()
+                self._session_started_at = time.time()
+                self._save_settings(cl)
+            cl._memee_generation = self._generation
+
+    @contextmanager
+    def client(self):
+        """Check a logged-in client out of the pool for the duration of the block."""
+        cl = None
+        with self._lock:
+            if self._idle.empty() and self._created < self.pool_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        try:
+            cl = self._new_client() if create else self._idle.get()
+        except Exception:
+            if create:
+                with self._lock:
+                    self._created -= 1
+            raise
+        with self._lock:
+            self._in_use += 1
+        try:
+            self._refresh_if_stale(cl)
+            yield cl
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(cl)
+
+    def run(self, fn: Callable[["Client"], object]):
+        """Call fn(client), re-logging in and retrying once if the session has expired."""
+        from instagrapi.exceptions import ClientLoginRequired, LoginRequired
+        with self.client() as cl:
+            try:
+                return fn(cl)
+            except (ClientLoginRequired, LoginRequired):
+                self._relogin(cl)
+                return fn(cl)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "clients": self._created,
+                "in_use": self._in_use,
+                "logins": self.logins,
+                "relogins": self.relogins,
+                "session_age_seconds": round(time.time() - self._session_started_at, 1) if self._session_started_at else None,
+            }
+
+
+# Global session pool for the configured Instagram account
+instagram_sessions = InstagramSessionManager(os.getenv('INSTA_USERNAME'), os.getenv('INSTA_PASSWORD'))
@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+import importlib
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Heavy third-party clients are imported on first use instead of at app import, so a
+# worker that only serves feeds starts without paying for them. The scheduler leader
+# warms them in the background; /health/ready reports when that has finished.
+
+_cloudinary_lock = threading.Lock()
+_cloudinary_configured = False
+
+def cloudinary_uploader():
+    """cloudinary.uploader, imported and configured from the environment on first use"""
+    global _cloudinary_configured
+    if not _cloudinary_configured:
+        with _cloudinary_lock:
+            if not _cloudinary_configured:
+                import cloudinary
+                cloudinary.config(
+                    cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
+                    api_key=os.getenv('CLOUDINARY_API_KEY'),
+                    api_secret=os.getenv('CLOUDINARY_API_SECRET')
+                )
+                _cloudinary_configured = True
+    import cloudinary.uploader
+    return cloudinary.uploader
+
+def _import(*modules: str) -> Callable[[], object]:
+    return lambda: [importlib.import_module(name) for name in modules]
+
+# Integration name -> loader that imports (and configures) it
+INTEGRATIONS: Dict[str, Callable[[], object]] = {
+    "cloudinary": cloudinary_uploader,
+    "reddit": _import("praw", "prawcore"),
+    "instagram": _import("instagrapi", "instaloader"),
+    "gemini": _import("google.generativeai"),
+    "passwords": _import("passlib.context"),
+    "scheduler_jobstore": _import("apscheduler.jobstores.sqlalchemy"),
+}
+
+_status_lock = threading.Lock()
+_status: Dict[str, Dict] = {name: {"warmed": False} for name in INTEGRATIONS}
+_warm_started_at = None
+_warm_finished_at = None
+_warm_thread = None
+
+def warm_integrations():
+    """Import every integration now; failures are recorded, never raised"""
+    global _warm_started_at, _warm_finished_at
+    _warm_started_at = time.time()
+    for name, loader in INTEGRATIONS.items():
+        started = time.perf_counter()
+        try:
+            loader()
+            result = {"warmed": True}
+        except Exception as e:
+            logger.warning(f"[Integrations] Could not warm {name}: {e}")
+            result = {"warmed": False, "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        with _status_lock:
+            _status[name] = result
+    _warm_finished_at = time.time()
+    logger.info(f"[Integrations] Warmed in {_warm_finished_at - _warm_started_at:.2f}s")
+
+def start_warming() -> threading.Thread:
+    """Warm integrations in a background thread so requests are served meanwhile; only once per process"""
+    global _warm_thread
+    with _status_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=warm_integrations, name="integration_warmup", daemon=True)
+            _warm_thread.start()
+        return _warm_thread
+
+def integrations_status() -> Dict:
+    with _status_lock:
+        integrations = {name: dict(status) for name, status in _status.items()}
+    return {
+        "warmed": _warm_finished_at is not None and all(s["warmed"] for s in integrations.values()),
+        "warm_started_at": _warm_started_at,
+        "warm_finished_at": _warm_finished_at,
+        "integrations": integrations,
+    }
@@ -0,0 +1,211 @@
+import os
+import json
+import socket
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def process_identity() -> Dict:
+    """Who this process is, as reported in /scheduler/status."""
+    return {"hostname": socket.gethostname(), "pid": os.getpid()}
+
+
+class LeaderLock:
+    """
+    Cluster-wide lock deciding which process owns the scheduled jobs.
+    Implementations must be non-blocking: acquire() returns immediately with
+    whether this process is (still) the leader.
+    """
+    backend = "none"
+
+    def __init__(self):
+        self.acquired_at: Optional[str] = None
+
+    @property
+    def is_held(self) -> bool:
+        return self.acquired_at is not None
+
+    async def acquire(self) -> bool:
+        raise NotImplementedError
+
+    async def release(self):
+        raise NotImplementedError
+
+    async def owner(self) -> Optional[Dict]:
+        """The current leader as far as the lock backend knows, or None."""
+        raise NotImplementedError
+
+    def _identity(self) -> Dict:
+        return {**process_identity(), "acquired_at": self.acquired_at}
+
+
+class NoLeaderLock(LeaderLock):
+    """Every process is the leader; for single-worker deployments."""
+
+    async def acquire(self) -> bool:
+        if not self.acquired_at:
+            self.acquired_at = datetime.utcnow().isoformat()
+        return True
+
+    async def release(self):
+        self.acquired_at = None
+
+    async def owner(self) -> Optional[Dict]:
+        return self._identity() if self.is_held else None
+
+
+class FileLeaderLock(LeaderLock):
+    """flock()-based lock; protects workers on one host (e.g. several uvicorn workers)."""
+    backend = "file"
+
+    def __init__(self, path: str):
+        super().__init__()
+        if fcntl is None:
+            raise RuntimeError("File leader lock requires fcntl (POSIX only).")
+        self.path = path
+        self._fd = None
+
+    async def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        self.acquired_at = datetime.utcnow().isoformat()
+        os.ftruncate(fd, 0)
+        os.write(fd, json.dumps(self._identity()).encode())
+        os.fsync(fd)
+        return True
+
+    async def release(self):
+        if self._fd is None:
+            return
+        try:
+            os.ftruncate(self._fd, 0)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self.acquired_at = None
+
+    async def owner(self) -> Optional[Dict]:
+        try:
+            with open(self.path) as f:
+                content = f.read().strip()
+            return json.loads(content) if content else None
+        except (OSError, ValueError):
+            return None
+
+
+class PostgresAdvisoryLeaderLock(LeaderLock):
+    """
+    Session-level pg_try_advisory_lock held on a dedicated connection; protects
+    workers across hosts. The lock is released by Postgres if the process dies.
+    """
+    backend = "postgres"
+
+    def __init__(self, dsn: str, key: int):
+        super().__init__()
+        self.dsn = dsn
+        self.key = key
+        self._conn = None
+
+    def _application_name(self) -> str:
+        identity = process_identity()
+        return f"memee-scheduler:{identity['hostname']}:{identity['pid']}"
+
+    async def acquire(self) -> bool:
+        import asyncpg
+
+        if self._conn is not None:
+            try:
+                # Still connected means we still hold the session lock
+                await self._conn.fetchval("SELECT 1")
+                return True
+            except Exception as e:
+                logger.warning(f"[Leader Lock] Lost advisory lock connection: {e}")
+                await self.release()
+        conn = await asyncpg.connect(self.dsn, server_settings={"application_name": self._application_name()})
+        if await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.key):
+            self._conn = conn
+            self.acquired_at = datetime.utcnow().isoformat()
+            return True
+        await conn.close()
+        return False
+
+    async def release(self):
+        if self._conn is None:
+            return
+        try:
+            await self._conn.execute("SELECT pg_advisory_unlock($1)", self.key)
+            await self._conn.close()
+        except Exception:
+            pass
+        finally:
+            self._conn = None
+            self.acquired_at = None
+
+    async def owner(self) -> Optional[Dict]:
+        if self.is_held:
+            return self._identity()
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            row = await conn.fetchrow(
+                "SELECT a.application_name, a.backend_start FROM pg_locks l "
+                "JOIN pg_stat_activity a ON a.pid = l.pid "
+                "WHERE l.locktype = 'advisory' AND l.granted "
+                "AND ((l.classid::bigint << 32) | l.objid::bigint) = $1",
+                self.key,
+            )
+        finally:
+            await conn.close()
+        if not row:
+            return None
+        _, hostname, pid = (row["application_name"].split(":") + ["", ""])[:3]
+        return {"hostname": hostname, "pid": int(pid) if pid.isdigit() else pid, "acquired_at": None}
+
+
+# Backend name -> factory; register additional backends with register_leader_lock_backend()
+LEADER_LOCK_BACKENDS: Dict[str, Callable[[], LeaderLock]] = {}
+
+
+def register_leader_lock_backend(name: str, factory: Callable[[], LeaderLock]):
+    LEADER_LOCK_BACKENDS[name] = factory
+
+
+def create_leader_lock(backend: str) -> LeaderLock:
+    factory = LEADER_LOCK_BACKENDS.get(backend)
+    if factory is None:
+        raise ValueError(f"Unknown scheduler leader lock backend: {backend}")
+    return factory()
+
+
+def _file_lock_factory() -> LeaderLock:
+    from app.config.scheduler_config import SCHEDULER_LOCK_FILE
+    return FileLeaderLock(SCHEDULER_LOCK_FILE)
+
+
+def _postgres_lock_factory() -> LeaderLock:
+    from app.config.scheduler_config import SCHEDULER_LOCK_DATABASE_URL, SCHEDULER_LOCK_KEY
+    if not SCHEDULER_LOCK_DATABASE_URL:
+        raise RuntimeError("SCHEDULER_LOCK_DATABASE_URL must be set for the postgres leader lock.")
+    return PostgresAdvisoryLeaderLock(SCHEDULER_LOCK_DATABASE_URL, SCHEDULER_LOCK_KEY)
+
+
+register_leader_lock_backend("none", NoLeaderLock)
+register_leader_lock_backend("file", _file_lock_factory)
+register_leader_lock_backend("postgres", _postgres_lock_factory)
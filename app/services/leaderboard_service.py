@@ -0,0 +1,265 @@
+import os
+import glob
+import json
+import time
+import heapq
+import socket
+import tempfile
+import threading
+import logging
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+# Window name -> (window length in seconds, number of ring buckets). A window slides
+# one bucket at a time, so "hour" is accurate to the minute and "week" to 6 hours.
+LEADERBOARD_WINDOWS = {
+    "hour": (3600, 60),
+    "day": (86400, 24),
+    "week": (7 * 86400, 28),
+}
+LEADERBOARD_LIKE_WEIGHT = float(os.getenv("LEADERBOARD_LIKE_WEIGHT", "1"))
+LEADERBOARD_SAVE_WEIGHT = float(os.getenv("LEADERBOARD_SAVE_WEIGHT", "2"))
+# Each worker writes its counters to "<file>.<host>-<pid>" periodically and on shutdown,
+# reads it back on startup, and merges in the other workers' snapshots
+LEADERBOARD_SNAPSHOT_FILE = os.getenv("LEADERBOARD_SNAPSHOT_FILE", "leaderboard_snapshot.json")
+LEADERBOARD_SNAPSHOT_SECONDS = int(os.getenv("LEADERBOARD_SNAPSHOT_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class _Window:
+    """
+    Sliding-window counters as a ring of per-bucket counts plus running totals.
+    When the clock enters a new bucket, the bucket that falls out of the window is
+    subtracted from the totals and its slot reused, so reads never rescan events.
+    """
+    __slots__ = ("name", "bucket_seconds", "size", "slots", "totals", "head")
+
+    def __init__(self, name: str, length_seconds: int, size: int):
+        self.name = name
+        self.bucket_seconds = length_seconds // size
+        self.size = size
+        # Ring slot -> (bucket number, {meme_id: score}) or None
+        self.slots: List[Optional[Tuple[int, Dict[int, float]]]] = [None] * size
+        self.totals: Dict[int, float] = {}
+        self.head = 0
+
+    def advance(self, now: float):
+        bucket = int(now // self.bucket_seconds)
+        if bucket <= self.head:
+            return
+        for expired in range(max(self.head + 1, bucket - self.size + 1), bucket + 1):
+            # Reusing a slot drops the bucket it held (size buckets ago)
+            self._expire(expired % self.size)
+        self.head = bucket
+
+    def _expire(self, slot: int):
+        held = self.slots[slot]
+        if held is None:
+            return
+        for meme_id, score in held[1].items():
+            # Totals may go negative while an unlike outlives the like it undid
+            remaining = self.totals.get(meme_id, 0.0) - score
+            if abs(remaining) > 1e-9:
+                self.totals[meme_id] = remaining
+            else:
+                self.totals.pop(meme_id, None)
+        self.slots[slot] = None
+
+    def add(self, meme_id: int, score: float, now: float):
+        self.advance(now)
+        bucket = int(now // self.bucket_seconds)
+        if bucket < self.head - self.size + 1:
+            return  # Older than the window
+        slot = bucket % self.size
+        held = self.slots[slot]
+        if held is None or held[0] != bucket:
+            held = self.slots[slot] = (bucket, {})
+        held[1][meme_id] = held[1].get(meme_id, 0.0) + score
+        self.totals[meme_id] = self.totals.get(meme_id, 0.0) + score
+
+    def compact(self):
+        """Drop counters an unlike brought back to zero."""
+        for _, counts in filter(None, self.slots):
+            for meme_id in [m for m, s in counts.items() if abs(s) < 1e-9]:
+                del counts[meme_id]
+        for meme_id in [m for m, s in self.totals.items() if abs(s) < 1e-9]:
+            del self.totals[meme_id]
+
+    def top(self, count: int, others: Optional[Dict[int, float]] = None) -> List[Tuple[int, float]]:
+        totals = self.totals
+        if others:
+            totals = dict(others)
+            for meme_id, score in self.totals.items():
+                totals[meme_id] = totals.get(meme_id, 0.0) + score
+        return heapq.nlargest(count, ((m, s) for m, s in totals.items() if s > 0), key=itemgetter(1))
+
+    def to_dict(self) -> Dict:
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": [[bucket, {str(m): s for m, s in counts.items()}] for bucket, counts in filter(None, self.slots)],
+        }
+
+    def load(self, data: Dict, now: float):
+        if data.get("bucket_seconds") != self.bucket_seconds:
+            return  # Window layout changed; start this window empty
+        self.head = int(now // self.bucket_seconds)
+        for bucket, counts in data.get("buckets", []):
+            if bucket <= self.head - self.size or bucket > self.head:
+                continue
+            slot_counts = {int(m): float(s) for m, s in counts.items()}
+            self.slots[bucket % self.size] = (bucket, slot_counts)
+            for meme_id, score in slot_counts.items():
+                self.totals[meme_id] = self.totals.get(meme_id, 0.0) + score
+        self.compact()
+
+
+class Leaderboards:
+    """
+    "Top this hour / today / this week" counters, fed by the likes and saves this
+    worker writes. Each worker snapshots its own counters next to
+    LEADERBOARD_SNAPSHOT_FILE, so a restart keeps the boards, and adds the other
+    workers' latest snapshots (at most LEADERBOARD_SNAPSHOT_SECONDS old) when ranking.
+    """
+
+    def __init__(self, path: str = LEADERBOARD_SNAPSHOT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._windows = {name: _Window(name, length, size) for name, (length, size) in LEADERBOARD_WINDOWS.items()}
+        # Window name -> summed totals of the other workers' snapshots
+        self._others: Dict[str, Dict[int, float]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loaded = False
+
+    @property
+    def own_path(self) -> str:
+        # Resolved per call: the instance is created before a preloading server forks workers
+        return f"{self.path}.{socket.gethostname()}-{os.getpid()}"
+
+    def _read(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[Leaderboards] Could not load {path}: {e}")
+            return None
+
+    def _load(self):
+        snapshot = self._read(self.own_path)
+        if snapshot is None:
+            return
+        now = time.time()
+        with self._lock:
+            for name, data in snapshot.get("windows", {}).items():
+                if name in self._windows:
+                    self._windows[name].load(data, now)
+
+    def load_others(self):
+        """Re-read the other workers' snapshots; ones older than the longest window are deleted."""
+        now = time.time()
+        max_age = max(length for length, _ in LEADERBOARD_WINDOWS.values())
+        own_path = self.own_path
+        # The single snapshot file of earlier versions counts as one more worker until it ages out
+        paths = [self.path] + [p for p in glob.glob(f"{glob.escape(self.path)}.*") if not p.endswith(".tmp")]
+        others: Dict[str, Dict[int, float]] = {name: {} for name in self._windows}
+        for path in paths:
+            if path == own_path:
+                continue
+            snapshot = self._read(path)
+            if snapshot is None:
+                continue
+            if now - snapshot.get("saved_at", 0) > max_age:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            for name, (length, size) in LEADERBOARD_WINDOWS.items():
+                window = _Window(name, length, size)
+                window.load(snapshot.get("windows", {}).get(name, {}), now)
+                for meme_id, score in window.totals.items():
+                    others[name][meme_id] = others[name].get(meme_id, 0.0) + score
+        with self._lock:
+            self._others = others
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"saved_at": time.time(),
+                               "windows": {name: w.to_dict() for name, w in self._windows.items()}})
+        path = self.own_path
+        tmp_path = None
+        try:
+            # A unique temp file per write; the rename makes the snapshot appear whole
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                            prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"[Leaderboards] Could not save {path}: {e}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def record(self, meme_id: int, kind: str, delta: int):
+        """Count `delta` likes or saves of a meme happening now (negative for unlike/unsave)."""
+        score = (LEADERBOARD_LIKE_WEIGHT if kind == "like" else LEADERBOARD_SAVE_WEIGHT) * delta
+        if not score:
+            return
+        now = time.time()
+        with self._lock:
+            for window in self._windows.values():
+                window.add(int(meme_id), score, now)
+
+    def top(self, window: str, count: int) -> List[Tuple[int, float]]:
+        """(meme_id, score) pairs of the `count` best memes in a window, best first."""
+        if window not in self._windows:
+            raise ValueError(f"Unknown leaderboard window '{window}'. Use one of: {', '.join(self._windows)}")
+        with self._lock:
+            board = self._windows[window]
+            board.advance(time.time())
+            return board.top(count, self._others.get(window))
+
+    def compact(self):
+        now = time.time()
+        with self._lock:
+            for window in self._windows.values():
+                window.advance(now)
+                window.compact()
+
+    def _run(self):
+        while not self._stop.wait(LEADERBOARD_SNAPSHOT_SECONDS):
+            self.compact()
+            self.save()
+            self.load_others()
+
+    def start(self):
+        """Load the snapshots, then compact, snapshot and merge every LEADERBOARD_SNAPSHOT_SECONDS in a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if not self._loaded:
+            self._load()
+            self._loaded = True
+        self.load_others()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leaderboard_snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the snapshot thread and write a final snapshot."""
+        self._stop.set()
+        self.compact()
+        self.save()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {name: {"memes": len(w.totals), "buckets": sum(1 for s in w.slots if s)} for name, w in self._windows.items()}
+
+
+# Global leaderboards instance
+leaderboards = Leaderboards()
@@ -0,0 +1,161 @@
+import io
+import os
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import requests
+from app.services.supabase_service import get_supabase
+from app.services.media_urls import parse_cloudinary_url
+from app.config.scheduler_config import MEDIA_BACKFILL_RETRY_HOURS
+
+# Layout metadata stored on each meme row. The columns are added by
+# migrations/001_media_metadata.sql; until it is applied, set this to false so
+# inserts leave them out.
+MEDIA_METADATA_ENABLED = os.getenv("MEDIA_METADATA_ENABLED", "true").lower() == "true"
+MEDIA_METADATA_FIELDS = ("width", "height", "duration", "bytes", "dominant_color")
+
+# How much of a file is fetched to read dimensions from its header
+MEDIA_PROBE_BYTES = int(os.getenv("MEDIA_PROBE_BYTES", str(64 * 1024)))
+MEDIA_PROBE_TIMEOUT_SECONDS = int(os.getenv("MEDIA_PROBE_TIMEOUT_SECONDS", "10"))
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".webm")
+
+# Cloudinary's `predominant.google` palette reports color names; stored colors are hex
+_GOOGLE_PALETTE = {
+    "black": "#000000", "blue": "#0000FF", "brown": "#A52A2A", "gray": "#808080",
+    "green": "#008000", "orange": "#FFA500", "pink": "#FFC0CB", "purple": "#800080",
+    "red": "#FF0000", "teal": "#008080", "white": "#FFFFFF", "yellow": "#FFFF00",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _hex_color(value) -> Optional[str]:
+    """'#RRGGBB' for a Cloudinary hex color or Google palette name, else None."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.lower() in _GOOGLE_PALETTE:
+        return _GOOGLE_PALETTE[value.lower()]
+    digits = value.lstrip("#")
+    if len(digits) == 3:
+        digits = "".join(c * 2 for c in digits)
+    if len(digits) != 6:
+        return None
+    try:
+        int(digits, 16)
+    except ValueError:
+        return None
+    return f"#{digits.upper()}"
+
+
+def upload_options(source: str = "", resource_type: str = "auto") -> Dict:
+    """Extra Cloudinary upload options so the response carries the metadata we store."""
+    if resource_type == "video" or source.lower().split("?")[0].endswith(VIDEO_EXTENSIONS):
+        return {}
+    # Predominant colors are only computed for images
+    return {"colors": True}
+
+
+def metadata_from_upload(upload_result: Dict) -> Dict:
+    """Pick width, height, duration, bytes and dominant color out of a Cloudinary upload/resource response."""
+    if not MEDIA_METADATA_ENABLED:
+        return {}
+    metadata = {
+        "width": upload_result.get("width"),
+        "height": upload_result.get("height"),
+        "duration": upload_result.get("duration"),
+        "bytes": upload_result.get("bytes"),
+        "dominant_color": None,
+    }
+    colors = upload_result.get("colors") or (upload_result.get("predominant") or {}).get("google")
+    if colors:
+        metadata["dominant_color"] = _hex_color(colors[0][0])
+    if metadata["width"] is None or metadata["height"] is None:
+        if upload_result.get("resource_type", "image") == "image" and upload_result.get("secure_url"):
+            probed = probe_image(upload_result["secure_url"])
+            metadata = {**probed, **{k: v for k, v in metadata.items() if v is not None}}
+    return {k: v for k, v in metadata.items() if v is not None}
+
+
+def probe_image(url: str, session=None) -> Dict:
+    """
+    Width, height and size of an image from its first MEDIA_PROBE_BYTES only:
+    Pillow reads dimensions from the header without decoding pixels.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+    http = session or requests
+    try:
+        with http.get(url, headers={"Range": f"bytes=0-{MEDIA_PROBE_BYTES - 1}"}, stream=True,
+                      timeout=MEDIA_PROBE_TIMEOUT_SECONDS) as response:
+            response.raise_for_status()
+            head = response.raw.read(MEDIA_PROBE_BYTES, decode_content=True)
+            total = response.headers.get("Content-Range", "").rpartition("/")[2] or response.headers.get("Content-Length")
+        with Image.open(io.BytesIO(head)) as image:
+            metadata = {"width": image.width, "height": image.height}
+        if total and total.isdigit():
+            metadata["bytes"] = int(total)
+        return metadata
+    except Exception as e:
+        logger.debug(f"[Media Metadata] Could not probe {url}: {e}")
+        return {}
+
+
+def _lookup_metadata(cloudinary_url: str) -> Dict:
+    parsed = parse_cloudinary_url(cloudinary_url)
+    if parsed is not None:
+        _, resource_type, _, public_id, _ = parsed
+        try:
+            import cloudinary.api
+            from app.services.integrations import cloudinary_uploader
+            cloudinary_uploader()  # Ensures Cloudinary is configured
+            resource = cloudinary.api.resource(public_id, resource_type=resource_type, colors=resource_type == "image")
+            return metadata_from_upload(resource)
+        except Exception as e:
+            logger.debug(f"[Media Metadata] Cloudinary lookup failed for {public_id}: {e}")
+    if cloudinary_url.lower().split("?")[0].endswith(VIDEO_EXTENSIONS):
+        return {}
+    return probe_image(cloudinary_url)
+
+
+def backfill_media_metadata(batch_size: int, concurrency: int) -> Dict:
+    """
+    Fill in layout metadata for up to batch_size memes that have none yet,
+    looking them up with at most `concurrency` requests in flight. Rows that
+    cannot be measured keep a NULL width and are retried after MEDIA_BACKFILL_RETRY_HOURS.
+    """
+    if not MEDIA_METADATA_ENABLED:
+        return {"examined": 0, "updated": 0, "not_measured": 0}
+    retry_before = (datetime.utcnow() - timedelta(hours=MEDIA_BACKFILL_RETRY_HOURS)).isoformat()
+    try:
+        rows = (
+            get_supabase().table("memes").select("id, cloudinary_url").is_("width", "null")
+            .or_(f"metadata_checked_at.is.null,metadata_checked_at.lt.{retry_before}")
+            .order("id", desc=True).limit(batch_size).execute().data or []
+        )
+    except Exception as e:
+        raise RuntimeError(f"Failed to load memes for metadata backfill: {e}")
+
+    def backfill_row(row: Dict) -> bool:
+        metadata = _lookup_metadata(row.get("cloudinary_url") or "")
+        measured = bool(metadata.get("width"))
+        if not measured:
+            metadata.pop("width", None)
+        # Checked now: an unmeasured row is not picked up again until the retry interval passes
+        metadata["metadata_checked_at"] = datetime.utcnow().isoformat()
+        try:
+            get_supabase().table("memes").update(metadata).eq("id", row["id"]).execute()
+            return measured
+        except Exception as e:
+            logger.warning(f"[Media Metadata] Could not update meme {row['id']}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="media_backfill") as pool:
+        results: List[bool] = list(pool.map(backfill_row, rows))
+    summary = {"examined": len(rows), "updated": sum(results), "not_measured": len(rows) - sum(results)}
+    logger.info(f"[Media Metadata] Backfill: {summary}")
+    return summary
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import threading
+from typing import Dict
+import requests
+from app.services.integrations import cloudinary_uploader
+
+# Media up to this size stays in memory; larger files spill to MEDIA_SPOOL_DIR
+MEDIA_SPOOL_MAX_BYTES = int(os.getenv("MEDIA_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+MEDIA_SPOOL_DIR = os.getenv("MEDIA_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "memee_media"))
+# Refuse anything bigger than this outright
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(200 * 1024 * 1024)))
+MEDIA_DOWNLOAD_TIMEOUT_SECONDS = int(os.getenv("MEDIA_DOWNLOAD_TIMEOUT_SECONDS", "20"))
+# Chunk size for Cloudinary's chunked upload of spilled files
+MEDIA_UPLOAD_CHUNK_BYTES = int(os.getenv("MEDIA_UPLOAD_CHUNK_BYTES", str(6 * 1024 * 1024)))
+
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+_spool_dir_lock = threading.Lock()
+_spool_dir_ready = False
+
+
+def _spool_dir() -> str:
+    """MEDIA_SPOOL_DIR, created on first use and reused by every transfer."""
+    global _spool_dir_ready
+    if not _spool_dir_ready:
+        with _spool_dir_lock:
+            if not _spool_dir_ready:
+                os.makedirs(MEDIA_SPOOL_DIR, exist_ok=True)
+                _spool_dir_ready = True
+    return MEDIA_SPOOL_DIR
+
+
+def upload_from_url(url: str, resource_type: str = "auto", session=None, **options) -> Dict:
+    """
+    Stream `url` straight into a Cloudinary upload; returns the Cloudinary upload result.
+    Bytes are spooled in memory and only spill to disk past MEDIA_SPOOL_MAX_BYTES, into
+    an unnamed temporary file that is gone once closed, so concurrent transfers never
+    share filenames and nothing is left to clean up.
+    """
+    http = session or requests
+    filename = url.split("?")[0].rstrip("/").split("/")[-1] or "media"
+    with http.get(url, stream=True, timeout=MEDIA_DOWNLOAD_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        declared = int(response.headers.get("Content-Length") or 0)
+        if declared > MEDIA_MAX_BYTES:
+            raise RuntimeError(f"Media too large ({declared} bytes): {url}")
+        with tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_MAX_BYTES, dir=_spool_dir()) as buffer:
+            size = 0
+            for chunk in response.iter_content(_STREAM_CHUNK_BYTES):
+                size += len(chunk)
+                if size > MEDIA_MAX_BYTES:
+                    raise RuntimeError(f"Media exceeded {MEDIA_MAX_BYTES} bytes: {url}")
+                buffer.write(chunk)
+            buffer.seek(0)
+            if size > MEDIA_SPOOL_MAX_BYTES:
+                # Chunked upload reads the spilled file piecewise instead of all at once
+                return cloudinary_uploader().upload_large(
+                    buffer, resource_type=resource_type, chunk_size=MEDIA_UPLOAD_CHUNK_BYTES,
+                    filename=filename, **options
+                )
+            return cloudinary_uploader().upload(buffer, resource_type=resource_type, filename=filename, **options)
@@ -0,0 +1,135 @@
+import os
+import math
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+# Widths we derive renditions for; requests are rounded up to the next bucket so
+# Cloudinary only ever generates (and caches) this handful of variants per meme
+MEDIA_WIDTH_BUCKETS = sorted({int(w) for w in os.getenv("MEDIA_WIDTH_BUCKETS", "320,480,640,828,1080,1440").split(",") if w.strip()})
+# Used when the client sends neither client hints nor a size
+MEDIA_DEFAULT_WIDTH = int(os.getenv("MEDIA_DEFAULT_WIDTH", "640"))
+MEDIA_URL_CACHE_SIZE = int(os.getenv("MEDIA_URL_CACHE_SIZE", "20000"))
+
+# Named sizes accepted by the `size` query parameter (CSS pixels)
+SIZE_PRESETS = {"thumb": 160, "small": 320, "medium": 480, "large": 828, "full": 1440}
+
+MAX_DPR = 3.0
+# Larger Viewport-Width hints are clamped here (they all map to the top bucket anyway)
+MAX_VIEWPORT_WIDTH = 10000
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def parse_cloudinary_url(url: str) -> Optional[Tuple[str, str, str, str, str]]:
+    """
+    Split a Cloudinary delivery URL into (base, resource_type, version, public_id, extension).
+    Returns None for anything that is not a Cloudinary upload URL.
+    """
+    if not url or "res.cloudinary.com/" not in url:
+        return None
+    head, sep, tail = url.split("?")[0].partition("/upload/")
+    if not sep:
+        return None
+    base, _, resource_type = head.rpartition("/")
+    if resource_type not in ("image", "video"):
+        return None
+    segments = tail.split("/")
+    # Skip any transformation segments before the version, e.g. .../upload/w_500/v123/id.jpg
+    version = ""
+    for index, segment in enumerate(segments):
+        if segment[:1] == "v" and segment[1:].isdigit():
+            version = segment
+            segments = segments[index + 1:]
+            break
+    path = "/".join(segments)
+    public_id, dot, extension = path.rpartition(".")
+    if not dot or "/" in extension:
+        public_id, extension = path, ""
+    if not public_id:
+        return None
+    return base, resource_type, version, public_id, extension
+
+
+def width_for_hints(size: Optional[str] = None, dpr: Optional[str] = None, viewport_width: Optional[str] = None) -> int:
+    """
+    Pick the rendition width (device pixels) from a `size` parameter or the DPR and
+    Viewport-Width client hints, rounded up to a width bucket.
+    """
+    ratio = 1.0
+    if dpr:
+        try:
+            ratio = float(dpr)
+        except ValueError:
+            pass
+        # Headers are client input: "nan" or "inf" parse as floats
+        ratio = min(max(ratio, 1.0), MAX_DPR) if math.isfinite(ratio) else 1.0
+    css_width = None
+    if size:
+        size = size.strip().lower()
+        css_width = SIZE_PRESETS.get(size) or (int(size) if size.isdigit() else None)
+    if css_width is None and viewport_width:
+        try:
+            hinted = float(viewport_width)
+        except ValueError:
+            hinted = math.nan
+        css_width = int(min(hinted, MAX_VIEWPORT_WIDTH)) if math.isfinite(hinted) and hinted > 0 else None
+    if css_width is None:
+        return bucket_width(MEDIA_DEFAULT_WIDTH)
+    return bucket_width(css_width * ratio)
+
+
+def bucket_width(width: float) -> int:
+    for bucket in MEDIA_WIDTH_BUCKETS:
+        if bucket >= width:
+            return bucket
+    return MEDIA_WIDTH_BUCKETS[-1]
+
+
+def _delivery_url(base: str, resource_type: str, transformation: str, version: str, public_id: str, extension: str) -> str:
+    parts = [base, resource_type, "upload", transformation]
+    if version:
+        parts.append(version)
+    return "/".join(parts) + f"/{public_id}" + (f".{extension}" if extension else "")
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def responsive_media(url: str, width: int, srcset: bool = False) -> Optional[Dict]:
+    """
+    Derived delivery URLs for one stored meme at one width bucket, plus a `srcset` of
+    every bucket for images when asked. Pure string work, no Cloudinary API calls;
+    Cloudinary renders each variant on first request.
+    """
+    parsed = parse_cloudinary_url(url)
+    if parsed is None:
+        return None
+    base, resource_type, version, public_id, extension = parsed
+    if resource_type == "video":
+        return {
+            "type": "video",
+            "width": width,
+            "url": _delivery_url(base, "video", f"vc_auto,q_auto,c_limit,w_{width}", version, public_id, extension or "mp4"),
+            "poster": _delivery_url(base, "video", f"so_0,f_auto,q_auto,c_limit,w_{width}", version, public_id, "jpg"),
+        }
+    media = {
+        "type": "image",
+        "width": width,
+        "url": _delivery_url(base, "image", f"f_auto,q_auto,c_limit,w_{width}", version, public_id, extension),
+    }
+    if srcset:
+        media["srcset"] = ", ".join(
+            f"{_delivery_url(base, 'image', f'f_auto,q_auto,c_limit,w_{bucket}', version, public_id, extension)} {bucket}w"
+            for bucket in MEDIA_WIDTH_BUCKETS
+        )
+    return media
+
+
+def attach_media(memes: Iterable, width: int, srcset: bool = False):
+    """
+    Set `media` on each meme (dict or Meme model) from its cloudinary_url. List
+    endpoints send only the chosen rendition; a srcset of every bucket would add
+    roughly a kilobyte per meme.
+    """
+    for meme in memes:
+        if isinstance(meme, dict):
+            meme["media"] = responsive_media(str(meme.get("cloudinary_url") or ""), width, srcset)
+        else:
+            meme.media = responsive_media(str(meme.cloudinary_url or ""), width, srcset)
@@ -0,0 +1,504 @@
+import os
+import sys
+import time
+import random as pyrandom
+import threading
+import logging
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from app.models.meme import Meme
+from app.config.scheduler_config import MEME_CATEGORIES, INGESTION_CATEGORIES
+
+# Newest memes kept in memory per category; pages beyond this window go to the database
+MEME_CATALOG_WINDOW = int(os.getenv("MEME_CATALOG_WINDOW", "2000"))
+MEME_CATALOG_ENABLED = os.getenv("MEME_CATALOG_ENABLED", "true").lower() == "true"
+# Incremental sync picks up rows inserted by other processes and refreshes counters
+MEME_CATALOG_SYNC_SECONDS = int(os.getenv("MEME_CATALOG_SYNC_SECONDS", "60"))
+# Counters of the newest this-many memes per window are refreshed each sync; 0 refreshes
+# the whole window, so every cached count is at most one sync behind other workers
+MEME_CATALOG_COUNT_REFRESH = int(os.getenv("MEME_CATALOG_COUNT_REFRESH", "0"))
+# Every Nth sync reloads the whole window, catching edits and deletes made elsewhere
+MEME_CATALOG_FULL_SYNC_EVERY = int(os.getenv("MEME_CATALOG_FULL_SYNC_EVERY", "10"))
+# After a load, sync also re-reads this many of the newest ids, in case rows with
+# lower ids were still being committed by another process
+MEME_CATALOG_SYNC_OVERLAP = int(os.getenv("MEME_CATALOG_SYNC_OVERLAP", "50"))
+
+# PostgREST `in` filters are sent in the URL, so id lists are chunked
+_ID_CHUNK = 200
+
+logger = logging.getLogger(__name__)
+
+
+class MemeRecord:
+    """The non-numeric columns of one cached meme; repeated strings are interned."""
+    __slots__ = ("title", "cloudinary_url", "reddit_post_url", "subreddit", "uploader_username",
+                 "uploader_id", "width", "height", "duration", "bytes", "dominant_color")
+
+    def __init__(self, row: Dict):
+        self.title = row.get("title") or ""
+        self.cloudinary_url = row.get("cloudinary_url")
+        self.reddit_post_url = row.get("reddit_post_url")
+        self.subreddit = _intern(row.get("subreddit"))
+        self.uploader_username = _intern(row.get("uploader_username"))
+        self.uploader_id = _intern(row.get("uploader_id"))
+        self.width = row.get("width")
+        self.height = row.get("height")
+        self.duration = row.get("duration")
+        self.bytes = row.get("bytes")
+        self.dominant_color = _intern(row.get("dominant_color"))
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _epoch(value) -> float:
+    if value is None:
+        return 0.0
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _iso(epoch: float) -> str:
+    # Same naive-UTC form the ingest paths write
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class CategoryWindow:
+    """
+    The newest memes of one category as parallel columns ordered by ascending id:
+    typed arrays for ids, timestamps and counters, plus one slotted record per meme.
+    """
+    __slots__ = ("category", "ids", "timestamps", "like_counts", "save_counts", "records", "complete", "loaded_at",
+                 "sync_floor", "sync_seen")
+
+    def __init__(self, category: str):
+        self.category = sys.intern(category)
+        self.ids = array("q")
+        self.timestamps = array("d")
+        self.like_counts = array("l")
+        self.save_counts = array("l")
+        self.records: List[MemeRecord] = []
+        # True when the window holds every meme of the category, not just the newest ones
+        self.complete = False
+        self.loaded_at = 0.0
+        # Sync reads ids above sync_floor. The floor trails the newest id sync has seen
+        # (sync_seen) by one sync, so a row committed late with a lower id than one
+        # already seen, or than one inserted by this process, is still picked up.
+        self.sync_floor = 0
+        self.sync_seen = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_of(self, meme_id: int) -> int:
+        index = bisect_left(self.ids, meme_id)
+        return index if index < len(self.ids) and self.ids[index] == meme_id else -1
+
+    def upsert(self, row: Dict, like_count: Optional[int] = None, save_count: Optional[int] = None) -> Optional[int]:
+        """Insert or replace a row; returns the id of the oldest meme if it was evicted to make room."""
+        meme_id = int(row["id"])
+        index = self.index_of(meme_id)
+        if index >= 0:
+            self.timestamps[index] = _epoch(row.get("timestamp"))
+            self.records[index] = MemeRecord(row)
+            if like_count is not None:
+                self.like_counts[index] = like_count
+            if save_count is not None:
+                self.save_counts[index] = save_count
+            return None
+        index = bisect_left(self.ids, meme_id)
+        if index == 0 and len(self.ids) >= MEME_CATALOG_WINDOW:
+            self.complete = False
+            return None  # Older than everything in a full window
+        self.ids.insert(index, meme_id)
+        self.timestamps.insert(index, _epoch(row.get("timestamp")))
+        self.like_counts.insert(index, like_count or 0)
+        self.save_counts.insert(index, save_count or 0)
+        self.records.insert(index, MemeRecord(row))
+        if len(self.ids) > MEME_CATALOG_WINDOW:
+            evicted = self.ids[0]
+            self.remove_at(0)
+            self.complete = False
+            return evicted
+        return None
+
+    def remove_at(self, index: int):
+        del self.ids[index]
+        del self.timestamps[index]
+        del self.like_counts[index]
+        del self.save_counts[index]
+        del self.records[index]
+
+    def row(self, index: int) -> Dict:
+        record = self.records[index]
+        return {
+            "id": self.ids[index],
+            "title": record.title,
+            "cloudinary_url": record.cloudinary_url,
+            "reddit_post_url": record.reddit_post_url,
+            "category": self.category,
+            "subreddit": record.subreddit,
+            "timestamp": _iso(self.timestamps[index]),
+            "like_count": self.like_counts[index],
+            "save_count": self.save_counts[index],
+            "uploader_username": record.uploader_username,
+            "uploader_id": record.uploader_id,
+            "width": record.width,
+            "height": record.height,
+            "duration": record.duration,
+            "bytes": record.bytes,
+            "dominant_color": record.dominant_color,
+        }
+
+    def nbytes(self) -> int:
+        total = sum(column.buffer_info()[1] * column.itemsize for column in
+                    (self.ids, self.timestamps, self.like_counts, self.save_counts))
+        total += sys.getsizeof(self.records)
+        for record in self.records:
+            total += sys.getsizeof(record)
+            # Interned strings are shared; count only the per-meme ones
+            for value in (record.title, record.cloudinary_url, record.reddit_post_url):
+                if value is not None:
+                    total += sys.getsizeof(value)
+        return total
+
+
+class _AnnounceCursor:
+    """
+    Sync position for a category that has no window: its new rows are only announced
+    to the push hub. Ids above the floor that were already announced (or inserted by
+    this process) are remembered so the overlapping reads don't repeat them.
+    """
+    __slots__ = ("sync_floor", "sync_seen", "announced")
+
+    def __init__(self):
+        self.sync_floor = 0
+        self.sync_seen = 0
+        self.announced = set()
+
+
+class MemeCatalog:
+    """
+    In-process hot set: the newest MEME_CATALOG_WINDOW memes of each category,
+    with like/save counters, serving category pages and id lookups without
+    database I/O. Kept current by hooks on our own writes and a periodic sync
+    for writes made by other processes (e.g. the scheduler leader).
+    """
+
+    def __init__(self, categories: Iterable[str] = MEME_CATEGORIES, announce_categories: Iterable[str] = INGESTION_CATEGORIES):
+        self._lock = threading.RLock()
+        self._windows: Dict[str, CategoryWindow] = {}
+        self._category_of: Dict[int, str] = {}
+        # Only these categories are windowed; pages of any other name go to the database
+        self._load_locks: Dict[str, threading.Lock] = {category: threading.Lock() for category in categories}
+        # New rows of these are announced even when they have no window (e.g. "instagram")
+        self._announce_categories = list(announce_categories)
+        self._cursors: Dict[str, _AnnounceCursor] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._syncs = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Loading and sync
+
+    def _fetch_counts(self, meme_ids: List[int]) -> Dict[str, Dict[int, int]]:
+        from app.services.supabase_service import get_meme_counts_batch
+        like_counts, save_counts = {}, {}
+        for start in range(0, len(meme_ids), _ID_CHUNK):
+            counts = get_meme_counts_batch(meme_ids[start:start + _ID_CHUNK])
+            like_counts.update(counts["like_counts"])
+            save_counts.update(counts["save_counts"])
+        return {"like_counts": like_counts, "save_counts": save_counts}
+
+    def load_category(self, category: str) -> CategoryWindow:
+        """(Re)load the newest window of a category from the database."""
+        from app.services.supabase_service import get_supabase
+        resp = (
+            get_supabase().table("memes").select("*").eq("category", category)
+            .order("id", desc=True).range(0, MEME_CATALOG_WINDOW - 1).execute()
+        )
+        rows = resp.data or []
+        counts = self._fetch_counts([row["id"] for row in rows])
+        window = CategoryWindow(category)
+        for row in reversed(rows):
+            window.upsert(row, counts["like_counts"].get(row["id"], 0), counts["save_counts"].get(row["id"], 0))
+        window.complete = len(rows) < MEME_CATALOG_WINDOW
+        window.loaded_at = time.time()
+        if rows:
+            window.sync_seen = rows[0]["id"]
+            window.sync_floor = rows[min(len(rows), MEME_CATALOG_SYNC_OVERLAP) - 1]["id"] - 1
+        with self._lock:
+            old = self._windows.get(category)
+            if old is not None:
+                for meme_id in old.ids:
+                    self._category_of.pop(meme_id, None)
+            self._windows[category] = window
+            for meme_id in window.ids:
+                self._category_of[meme_id] = category
+        return window
+
+    def _window(self, category: str) -> Optional[CategoryWindow]:
+        window = self._windows.get(category)
+        if window is not None:
+            return window
+        lock = self._load_locks.get(category)
+        if lock is None:
+            return None  # Not a configured category
+        with lock:
+            window = self._windows.get(category)
+            if window is None:
+                try:
+                    window = self.load_category(category)
+                except Exception as e:
+                    logger.warning(f"[Meme Catalog] Could not load category '{category}': {e}")
+                    return None
+        return window
+
+    def sync(self):
+        """
+        Pick up rows inserted elsewhere, announce them to the push hub and refresh
+        the cached counters (of the whole window by default).
+        """
+        from app.services.push_hub import push_hub
+        self._syncs += 1
+        full = MEME_CATALOG_FULL_SYNC_EVERY > 0 and self._syncs % MEME_CATALOG_FULL_SYNC_EVERY == 0
+        for category in list(dict.fromkeys(list(self._windows) + self._announce_categories)):
+            try:
+                window = self._windows.get(category)
+                if window is None:
+                    self._sync_announcements(category)
+                    continue
+                if full:
+                    with self._lock:
+                        floor, known = window.sync_floor, set(window.ids)
+                    window = self.load_category(category)
+                    with self._lock:
+                        # Rows above the old floor the old window lacked; rows below it
+                        # only moved into the window because newer ones were deleted
+                        unseen = [window.row(index) for index, meme_id in enumerate(window.ids)
+                                  if meme_id > floor and meme_id not in known]
+                    if unseen:
+                        push_hub.publish_memes(unseen)
+                    continue
+                rows = self._rows_above(category, window.sync_floor)
+                with self._lock:
+                    unseen = [row for row in rows if window.index_of(int(row["id"])) < 0]
+                self.on_insert(unseen)
+                if unseen:
+                    # Written by another process (e.g. the scheduler leader): announce them here too
+                    push_hub.publish_memes(unseen)
+                window.sync_floor = window.sync_seen
+                window.sync_seen = max([window.sync_seen] + [row["id"] for row in rows])
+                with self._lock:
+                    recent = list(window.ids[-MEME_CATALOG_COUNT_REFRESH:] if MEME_CATALOG_COUNT_REFRESH > 0 else window.ids)
+                # Fetched in id chunks, outside the lock
+                counts = self._fetch_counts(recent)
+                with self._lock:
+                    for meme_id in recent:
+                        index = window.index_of(meme_id)
+                        if index >= 0:
+                            window.like_counts[index] = counts["like_counts"].get(meme_id, 0)
+                            window.save_counts[index] = counts["save_counts"].get(meme_id, 0)
+            except Exception as e:
+                logger.warning(f"[Meme Catalog] Sync failed for '{category}': {e}")
+
+    def _rows_above(self, category: str, floor: int, limit: int = MEME_CATALOG_WINDOW) -> List[Dict]:
+        from app.services.supabase_service import get_supabase
+        # Not from the newest cached id: local inserts may be ahead of rows other
+        # processes are still committing
+        return (
+            get_supabase().table("memes").select("*").eq("category", category).gt("id", floor)
+            .order("id", desc=True).range(0, limit - 1).execute().data or []
+        )
+
+    def _sync_announcements(self, category: str):
+        """Announce new rows of a category without a window; the first call only sets the cursor."""
+        from app.services.push_hub import push_hub
+        with self._lock:
+            cursor = self._cursors.get(category)
+        if cursor is None:
+            rows = self._rows_above(category, 0, max(MEME_CATALOG_SYNC_OVERLAP, 1))
+            cursor = _AnnounceCursor()
+            if rows:
+                cursor.sync_seen = rows[0]["id"]
+                cursor.sync_floor = rows[-1]["id"] - 1
+                cursor.announced.update(row["id"] for row in rows)
+            with self._lock:
+                self._cursors[category] = cursor
+            return
+        rows = self._rows_above(category, cursor.sync_floor)
+        with self._lock:
+            unseen = [row for row in rows if row["id"] not in cursor.announced]
+            cursor.announced.update(row["id"] for row in unseen)
+            cursor.sync_floor = cursor.sync_seen
+            cursor.sync_seen = max([cursor.sync_seen] + [row["id"] for row in rows])
+            cursor.announced = {meme_id for meme_id in cursor.announced if meme_id > cursor.sync_floor}
+        if unseen:
+            push_hub.publish_memes(unseen)
+
+    def _sync_loop(self, categories: Iterable[str]):
+        for category in categories:
+            if self._stop.is_set():
+                return
+            self._window(category)
+        while not self._stop.wait(MEME_CATALOG_SYNC_SECONDS):
+            self.sync()
+
+    def start_sync(self, categories: Iterable[str] = ()):
+        """Preload `categories` and keep the catalog in sync from a background thread."""
+        if not MEME_CATALOG_ENABLED or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sync_loop, args=(list(categories),), name="meme_catalog_sync", daemon=True)
+        self._thread.start()
+
+    def stop_sync(self):
+        self._stop.set()
+
+    # Write hooks
+
+    def on_insert(self, rows):
+        """Add newly inserted meme rows (a row dict or a list of them)."""
+        if not MEME_CATALOG_ENABLED or not rows:
+            return
+        for row in ([rows] if isinstance(rows, dict) else rows):
+            if not row.get("id") or not row.get("category"):
+                continue
+            with self._lock:
+                window = self._windows.get(row["category"])
+                if window is None:
+                    cursor = self._cursors.get(row["category"])
+                    if cursor is not None:
+                        cursor.announced.add(int(row["id"]))  # Announced by the caller already
+                    continue  # Loaded with this row on first use
+                evicted = window.upsert(row)
+                if evicted is not None:
+                    self._category_of.pop(evicted, None)
+                if window.index_of(int(row["id"])) >= 0:
+                    self._category_of[int(row["id"])] = window.category
+
+    def on_update(self, row: Dict):
+        """Apply an edited row; a category change moves it between windows."""
+        if not MEME_CATALOG_ENABLED or not row or not row.get("id"):
+            return
+        meme_id = int(row["id"])
+        with self._lock:
+            old_category = self._category_of.get(meme_id)
+            like_count = save_count = None
+            if old_category is not None:
+                window = self._windows[old_category]
+                index = window.index_of(meme_id)
+                if index >= 0:
+                    like_count, save_count = window.like_counts[index], window.save_counts[index]
+                    if old_category != row.get("category"):
+                        window.remove_at(index)
+                        self._category_of.pop(meme_id, None)
+            window = self._windows.get(row.get("category"))
+            if window is not None:
+                evicted = window.upsert(row, like_count, save_count)
+                if evicted is not None:
+                    self._category_of.pop(evicted, None)
+                if window.index_of(meme_id) >= 0:
+                    self._category_of[meme_id] = window.category
+
+    def on_delete(self, meme_id: int):
+        with self._lock:
+            category = self._category_of.pop(int(meme_id), None)
+            if category is None:
+                return
+            window = self._windows[category]
+            index = window.index_of(int(meme_id))
+            if index >= 0:
+                window.remove_at(index)
+
+    def on_engagement(self, meme_id: int, kind: str, delta: int):
+        """Adjust a cached like ("like") or save ("save") counter."""
+        with self._lock:
+            category = self._category_of.get(int(meme_id))
+            if category is None:
+                return
+            window = self._windows[category]
+            index = window.index_of(int(meme_id))
+            if index < 0:
+                return
+            column = window.like_counts if kind == "like" else window.save_counts
+            column[index] = max(0, column[index] + delta)
+
+    # Reads
+
+    def category_page(self, category: str, page: int, page_size: int, after: Optional[str] = None,
+                      random: bool = False, exclude_ids: Optional[list] = None) -> Optional[List[Meme]]:
+        """
+        Same page get_memes_by_category would return, with counts filled in, or None
+        when the window cannot answer it (catalog disabled, load failed, or the page
+        reaches past the cached window).
+        """
+        if not MEME_CATALOG_ENABLED:
+            return None
+        window = self._window(category)
+        if window is None:
+            self.misses += 1
+            return None
+        start = (page - 1) * page_size
+        end = start + page_size - 1
+        # Newest rows up to the end of the page (three pages' worth when some are excluded)
+        fetch_size = start + ((end - start + 1) * 3 if exclude_ids else (end - start + 1))
+        after_epoch = _epoch(after) if after else None
+        with self._lock:
+            pool = []
+            for index in range(len(window) - 1, -1, -1):
+                if after_epoch is not None and window.timestamps[index] <= after_epoch:
+                    continue
+                pool.append(index)
+                if len(pool) >= fetch_size:
+                    break
+            if len(pool) < fetch_size and not window.complete:
+                self.misses += 1
+                return None
+            memes = [Meme.from_row(window.row(index)) for index in pool]
+        self.hits += 1
+        if exclude_ids:
+            excluded = set(exclude_ids)
+            memes = [m for m in memes if m.id not in excluded]
+        if random:
+            pyrandom.shuffle(memes)
+        return memes[start:end + 1]
+
+    def get(self, meme_id: int) -> Optional[Dict]:
+        """A cached meme row with counts, or None if it is not in the hot set."""
+        with self._lock:
+            category = self._category_of.get(int(meme_id))
+            if category is None:
+                return None
+            window = self._windows[category]
+            index = window.index_of(int(meme_id))
+            return window.row(index) if index >= 0 else None
+
+    def memory_report(self) -> Dict:
+        """Approximate bytes held per category, and extrapolated per 100k memes."""
+        with self._lock:
+            categories = {name: {"memes": len(w), "bytes": w.nbytes(), "complete": w.complete}
+                          for name, w in self._windows.items()}
+        memes = sum(c["memes"] for c in categories.values())
+        total = sum(c["bytes"] for c in categories.values())
+        return {
+            "memes": memes,
+            "bytes": total,
+            "bytes_per_100k_memes": round(total / memes * 100_000) if memes else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "categories": categories,
+        }
+
+
+# Global catalog instance
+meme_catalog = MemeCatalog()
@@ -0,0 +1,195 @@
+import os
+import asyncio
+import threading
+import logging
+from collections import deque
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+import orjson
+
+# Events a slow connection may have waiting before it is told to resync instead
+PUSH_MAX_PENDING = int(os.getenv("PUSH_MAX_PENDING", "100"))
+# Bursts arriving within this window go out as one write (count deltas per meme collapse to the latest)
+PUSH_DEBOUNCE_SECONDS = float(os.getenv("PUSH_DEBOUNCE_SECONDS", "1"))
+# Comment line sent on idle connections so proxies keep them open
+PUSH_HEARTBEAT_SECONDS = float(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+PUSH_MAX_CONNECTIONS = int(os.getenv("PUSH_MAX_CONNECTIONS", "5000"))
+
+# Fields of a new meme sent in a `meme` event
+MEME_EVENT_FIELDS = ("id", "title", "category", "subreddit", "cloudinary_url", "timestamp",
+                     "width", "height", "duration", "dominant_color", "uploader_username")
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    One connected client. Publishers (any thread) append to bounded pending state;
+    the connection's stream drains it on the event loop. A client that reads too
+    slowly overflows PUSH_MAX_PENDING and gets a single `resync` event instead of
+    an ever-growing backlog.
+    """
+
+    def __init__(self, categories: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.categories = frozenset(categories)
+        self.loop = loop
+        self.wake = asyncio.Event()
+        self._lock = threading.Lock()
+        self._memes: deque = deque()
+        # meme_id -> latest counts; bursts of likes on one meme collapse into one update
+        self._counts: Dict[int, Dict] = {}
+        self._overflowed = False
+        self._notified = False
+
+    def wants(self, category: Optional[str]) -> bool:
+        return not self.categories or category in self.categories
+
+    def offer_meme(self, payload: Dict):
+        with self._lock:
+            if len(self._memes) + len(self._counts) >= PUSH_MAX_PENDING:
+                self._overflowed = True
+            else:
+                self._memes.append(payload)
+            self._notify()
+
+    def offer_counts(self, meme_id: int, payload: Dict):
+        with self._lock:
+            if meme_id not in self._counts and len(self._memes) + len(self._counts) >= PUSH_MAX_PENDING:
+                self._overflowed = True
+            else:
+                self._counts[meme_id] = payload
+            self._notify()
+
+    def _notify(self):
+        # Wake the stream once per drain, not once per event
+        if self._notified:
+            return
+        self._notified = True
+        try:
+            self.loop.call_soon_threadsafe(self.wake.set)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+    def drain(self):
+        with self._lock:
+            memes, self._memes = list(self._memes), deque()
+            counts, self._counts = list(self._counts.values()), {}
+            overflowed, self._overflowed = self._overflowed, False
+            self._notified = False
+        return memes, counts, overflowed
+
+
+def _event(name: str, data) -> str:
+    return f"event: {name}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+class PushHub:
+    """
+    Server-sent event fan-out of new memes (from ingestion, uploads and catalog sync)
+    and like/save count changes, per subscribed category.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: List[Subscription] = []
+        self.published = 0
+        self.overflows = 0
+
+    def is_full(self) -> bool:
+        with self._lock:
+            return len(self._subscriptions) >= PUSH_MAX_CONNECTIONS
+
+    def subscribe(self, categories: Iterable[str]) -> Subscription:
+        subscription = Subscription(categories, asyncio.get_running_loop())
+        with self._lock:
+            if len(self._subscriptions) >= PUSH_MAX_CONNECTIONS:
+                raise RuntimeError("Too many open streams")
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish_memes(self, rows):
+        """Announce newly inserted memes (a row dict or a list of them)."""
+        rows = [rows] if isinstance(rows, dict) else list(rows or [])
+        if not rows or not self._subscriptions:
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for row in rows:
+            payload = {field: row.get(field) for field in MEME_EVENT_FIELDS}
+            for subscription in subscriptions:
+                if subscription.wants(row.get("category")):
+                    subscription.offer_meme(payload)
+            self.published += 1
+
+    def publish_counts(self, meme: Dict):
+        """Announce the current like/save counts of a meme."""
+        if not self._subscriptions:
+            return
+        payload = {"id": meme["id"], "like_count": meme.get("like_count", 0), "save_count": meme.get("save_count", 0)}
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(meme.get("category")):
+                subscription.offer_counts(meme["id"], payload)
+        self.published += 1
+
+    async def stream(self, categories: Iterable[str], is_disconnected) -> AsyncIterator[str]:
+        """
+        SSE text for the given categories until the client disconnects. The subscription
+        is made here rather than by the route: a generator that is never started (client
+        gone before the first chunk) never reaches `finally`, and would leak it.
+        """
+        try:
+            subscription = self.subscribe(categories)
+        except RuntimeError as e:
+            # Filled up between the route's check and the first chunk
+            yield _event("error", {"detail": str(e)})
+            return
+        try:
+            yield "retry: 5000\n\n"
+            while not await is_disconnected():
+                try:
+                    await asyncio.wait_for(subscription.wake.wait(), PUSH_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                subscription.wake.clear()
+                # Let the rest of a burst arrive so it goes out in one write
+                await asyncio.sleep(PUSH_DEBOUNCE_SECONDS)
+                memes, counts, overflowed = subscription.drain()
+                chunk = []
+                if overflowed:
+                    self.overflows += 1
+                    # Updates were dropped: the client should refetch what it shows
+                    chunk.append(_event("resync", {"reason": "overflow"}))
+                chunk.extend(_event("meme", meme) for meme in memes)
+                if counts:
+                    chunk.append(_event("counts", counts))
+                if chunk:
+                    # Awaiting the send is the backpressure: while a slow client blocks
+                    # here, its pending state fills up to PUSH_MAX_PENDING and no further
+                    yield "".join(chunk)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        by_category: Dict[str, int] = {}
+        for subscription in subscriptions:
+            for category in subscription.categories or ("*",):
+                by_category[category] = by_category.get(category, 0) + 1
+        return {
+            "connections": len(subscriptions),
+            "by_category": by_category,
+            "events_published": self.published,
+            "overflows": self.overflows,
+        }
+
+
+# Global push hub instance
+push_hub = PushHub()
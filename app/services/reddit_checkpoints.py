@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import deque
+from typing import List, Dict, Optional
+from app.config.scheduler_config import (
+    REDDIT_CHECKPOINT_FILE, REDDIT_RECENT_ID_WINDOW, REDDIT_CHECKPOINT_STALE_HOURS,
+    REDDIT_MAX_UPLOAD_ATTEMPTS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RedditCheckpoints:
+    """
+    Per-subreddit high-water marks for incremental Reddit ingestion.
+    For each subreddit we keep the newest post seen (fullname and created_utc)
+    and a window of recently examined post ids. `new` listings are read with
+    `before=<newest fullname>` so Reddit only returns unseen posts; `hot`
+    listings are filtered against the recent-id window. Either way, posts we
+    already examined are skipped without a database lookup.
+    """
+
+    def __init__(self, path: str = REDDIT_CHECKPOINT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._checkpoints: Dict[str, Dict] = {}
+        self._recent: Dict[str, deque] = {}
+        self._metrics = {"candidates": 0, "skipped_without_io": 0, "examined": 0, "empty_incremental_listings": 0}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"[Reddit Checkpoints] Could not load {self.path}, starting fresh: {e}")
+            return
+        for name, checkpoint in data.items():
+            self._recent[name] = deque(checkpoint.pop("recent_ids", []), maxlen=REDDIT_RECENT_ID_WINDOW)
+            self._checkpoints[name] = checkpoint
+
+    def save(self):
+        with self._lock:
+            data = {
+                name: {**checkpoint, "recent_ids": list(self._recent.get(name, ()))}
+                for name, checkpoint in self._checkpoints.items()
+            }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"[Reddit Checkpoints] Could not save {self.path}: {e}")
+
+    def before_fullname(self, subreddit: str) -> Optional[str]:
+        """Fullname to pass as `before=` so a `new` listing only returns newer posts."""
+        return self._checkpoints.get(subreddit, {}).get("newest_fullname")
+
+    def is_stale(self, subreddit: str) -> bool:
+        """
+        True when nothing newer than the checkpoint has been seen for a long time.
+        If the anchor post was deleted, `before=` returns nothing forever, so callers
+        fall back to an unanchored listing.
+        """
+        updated_at = self._checkpoints.get(subreddit, {}).get("updated_at")
+        return updated_at is None or time.time() - updated_at > REDDIT_CHECKPOINT_STALE_HOURS * 3600
+
+    def record_empty_listing(self):
+        with self._lock:
+            self._metrics["empty_incremental_listings"] += 1
+
+    def filter_unseen(self, subreddit: str, submissions: List, chronological: bool = False) -> List:
+        """
+        Drop posts already examined in an earlier cycle; no I/O involved.
+        For chronological (`new`) listings anything at or below the high-water mark is dropped too.
+        """
+        with self._lock:
+            recent = set(self._recent.get(subreddit, ()))
+            newest_created = self._checkpoints.get(subreddit, {}).get("newest_created_utc")
+            unseen = [
+                s for s in submissions
+                if s.id not in recent
+                and not (chronological and newest_created is not None and s.created_utc <= newest_created)
+            ]
+            self._metrics["candidates"] += len(submissions)
+            self._metrics["skipped_without_io"] += len(submissions) - len(unseen)
+            checkpoint = self._checkpoints.setdefault(subreddit, {})
+            checkpoint["skipped_without_io"] = checkpoint.get("skipped_without_io", 0) + len(submissions) - len(unseen)
+        return unseen
+
+    def mark_seen(self, subreddit: str, submissions: List, pending: List = (), failed: List = ()):
+        """
+        Record fully examined posts and advance the high-water mark past them.
+        `pending` are unseen posts that were not examined (failed, or not reached this
+        cycle): the mark stays below the oldest of them so the next `new` listing
+        returns them again. `failed` posts count an attempt each, and after
+        REDDIT_MAX_UPLOAD_ATTEMPTS they are treated as examined.
+        """
+        with self._lock:
+            checkpoint = self._checkpoints.setdefault(subreddit, {})
+            attempts = checkpoint.setdefault("attempts", {})
+            given_up = []
+            for s in failed:
+                attempts[s.id] = attempts.get(s.id, 0) + 1
+                if attempts[s.id] >= REDDIT_MAX_UPLOAD_ATTEMPTS:
+                    logger.warning(f"[Reddit Checkpoints] Giving up on {s.fullname} in r/{subreddit} after {attempts[s.id]} failed attempts")
+                    given_up.append(s)
+            examined = list(submissions) + given_up
+            given_up_ids = {s.id for s in given_up}
+            held = [s.created_utc for s in pending if s.id not in given_up_ids]
+            hold = min(held) if held else None
+            recent = self._recent.setdefault(subreddit, deque(maxlen=REDDIT_RECENT_ID_WINDOW))
+            for s in examined:
+                recent.append(s.id)
+                attempts.pop(s.id, None)
+                if hold is not None and s.created_utc >= hold:
+                    continue  # A post below this one still needs another try
+                if s.created_utc > checkpoint.get("newest_created_utc", 0):
+                    checkpoint["newest_created_utc"] = s.created_utc
+                    checkpoint["newest_fullname"] = s.fullname
+                    checkpoint["updated_at"] = time.time()
+            self._metrics["examined"] += len(examined)
+
+    def metrics(self) -> Dict:
+        """Counters for /scheduler/status."""
+        with self._lock:
+            per_subreddit = {
+                name: {
+                    "newest_fullname": checkpoint.get("newest_fullname"),
+                    "newest_created_utc": checkpoint.get("newest_created_utc"),
+                    "skipped_without_io": checkpoint.get("skipped_without_io", 0),
+                }
+                for name, checkpoint in self._checkpoints.items()
+            }
+            return {**self._metrics, "subreddits": per_subreddit}
+
+
+# Global checkpoint store
+reddit_checkpoints = RedditCheckpoints()
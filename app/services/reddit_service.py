@@ -1,11 +1,20 @@
 import os
-import praw
-import cloudinary.uploader
-from app.services.supabase_service import insert_meme
+from app.services.supabase_service import insert_meme, get_supabase
 from datetime import datetime
-import prawcore
-import random
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
 from app.meme_subreddits import MEME_SUBREDDITS
+from app.services.subreddit_stats import subreddit_selector
+from app.services.reddit_checkpoints import reddit_checkpoints
+from app.services.token_bucket import TokenBucket
+from app.services.integrations import cloudinary_uploader
+from app.services.media_metadata import upload_options, metadata_from_upload
+from app.config.scheduler_config import (
+    REDDIT_REQUESTS_PER_MINUTE, REDDIT_REQUEST_BURST, REDDIT_FETCH_CONCURRENCY,
+    REDDIT_LISTING, REDDIT_LISTING_LIMIT
+)
 import logging
 
 # Reduce verbose logging
@@ -20,16 +29,6 @@ REDDIT_CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
 REDDIT_CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET")
 REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT")
 
-CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
-CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
-CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
-
-cloudinary.config(
-    cloud_name=CLOUDINARY_CLOUD_NAME,
-    api_key=CLOUDINARY_API_KEY,
-    api_secret=CLOUDINARY_API_SECRET
-)
-
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".mp4"}
 
 # Map categories to subreddits (updated with user-specified subreddits)
@@ -53,15 +52,182 @@ CATEGORY_SUBREDDITS = {
     ]
 }
 
-def fetch_and_store_memes(category: str, subreddit_name: str = None):
-    """Fetch and store memes from Reddit - optimized for non-blocking operation"""
-    try:
+# Long-lived Reddit clients. PRAW instances are not thread safe, so each fetch
+# thread keeps its own; they all draw from one shared rate-limit budget.
+_reddit_clients = threading.local()
+
+# Shared budget for Reddit API requests. Starts from the configured rate and is
+# re-tuned from the rate-limit headers Reddit returns with every response.
+reddit_rate_budget = TokenBucket(
+    rate=REDDIT_REQUESTS_PER_MINUTE / 60,
+    capacity=REDDIT_REQUEST_BURST
+)
+
+reddit_fetch_executor = ThreadPoolExecutor(max_workers=REDDIT_FETCH_CONCURRENCY, thread_name_prefix="reddit_fetch")
+
+def get_reddit():
+    """Reddit client for the current thread, created once and reused across fetches"""
+    reddit = getattr(_reddit_clients, "client", None)
+    if reddit is None:
+        import praw
         reddit = praw.Reddit(
             client_id=REDDIT_CLIENT_ID,
             client_secret=REDDIT_CLIENT_SECRET,
             user_agent=REDDIT_USER_AGENT
         )
+        _reddit_clients.client = reddit
+    return reddit
+
+def _update_rate_budget(reddit):
+    """Pace the remaining requests evenly over what is left of Reddit's rate-limit window"""
+    limits = reddit.auth.limits or {}
+    remaining = limits.get("remaining")
+    reset_timestamp = limits.get("reset_timestamp")
+    if remaining is None or reset_timestamp is None:
+        return
+    seconds_to_reset = max(reset_timestamp - time.time(), 1.0)
+    # When the window resets the budget refills and falls back to the configured pace
+    # until the next response reports fresh limits; with remaining == 0 that reset is
+    # the only thing that can unblock the fetch threads.
+    reddit_rate_budget.update(
+        rate=remaining / seconds_to_reset,
+        tokens=min(remaining, reddit_rate_budget.tokens),
+        reset_in=seconds_to_reset,
+        reset_rate=REDDIT_REQUESTS_PER_MINUTE / 60
+    )
+
+def _fetch_listing(subreddit_name: str, limit: int):
+    reddit_rate_budget.acquire()
+    reddit = get_reddit()
+    started = time.monotonic()
+    try:
+        subreddit = reddit.subreddit(subreddit_name)
+        if REDDIT_LISTING == "new":
+            before = reddit_checkpoints.before_fullname(subreddit_name)
+            submissions = list(subreddit.new(limit=limit, params={"before": before} if before else {}))
+            if before and not submissions:
+                reddit_checkpoints.record_empty_listing()
+                if reddit_checkpoints.is_stale(subreddit_name):
+                    # The anchor post may have been deleted; re-anchor from an unfiltered listing
+                    _update_rate_budget(reddit)
+                    reddit_rate_budget.acquire()
+                    submissions = list(subreddit.new(limit=limit))
+            # Oldest first, so the high-water mark only advances past posts we actually examined
+            submissions.reverse()
+        else:
+            submissions = list(subreddit.hot(limit=limit))
+    finally:
+        _update_rate_budget(reddit)
+    return submissions, time.monotonic() - started
+
+def fetch_subreddit_listings(subreddit_names: List[str], limit: int = REDDIT_LISTING_LIMIT) -> Dict[str, tuple]:
+    """
+    Fetch the listings of several subreddits concurrently within the shared rate budget.
+    Returns {subreddit: (submissions, latency_seconds)} or {subreddit: exception} on failure.
+    """
+    futures = {name: reddit_fetch_executor.submit(_fetch_listing, name, limit) for name in subreddit_names}
+    listings = {}
+    for name, future in futures.items():
+        try:
+            listings[name] = future.result()
+        except Exception as e:
+            listings[name] = e
+    return listings
+
+def store_submissions(category: str, subreddit_name: str, submissions, max_new: int = 30):
+    """
+    Upload new image/video submissions to Cloudinary and insert them.
+    Returns (stored count, submissions fully examined, submissions whose upload or
+    insert failed); failed ones are not counted as examined so they are retried on a
+    later cycle.
+    """
+    new_memes = 0
+    examined = []
+    failed = []
+    for submission in submissions:
+        if new_memes >= max_new:
+            break
+        url = submission.url
+        if not any(url.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+            examined.append(submission)
+            continue
+            
+        # Check for duplicate in DB before uploading to Cloudinary
+        reddit_post_url = f"https://reddit.com{submission.permalink}"
+        existing = get_supabase().table("memes").select("id").eq("reddit_post_url", reddit_post_url).execute()
+        if existing.data and len(existing.data) > 0:
+            examined.append(submission)
+            continue
+            
+        # Upload to Cloudinary with timeout
+        try:
+            upload_result = cloudinary_uploader().upload(url, resource_type="auto", timeout=10, **upload_options(url))
+            cloudinary_url = upload_result["secure_url"]
+        except Exception as e:
+            print(f"[fetch_and_store_memes] Cloudinary upload failed for {url}: {e}")
+            failed.append(submission)
+            continue
+            
+        # Store in Supabase
+        meme_data = {
+            "title": submission.title,
+            "cloudinary_url": cloudinary_url,
+            "reddit_post_url": reddit_post_url,
+            "subreddit": subreddit_name,
+            "category": category,
+            "timestamp": datetime.utcfromtimestamp(submission.created_utc).isoformat(),
+            **metadata_from_upload(upload_result)
+        }
         
+        try:
+            insert_meme(meme_data)
+            new_memes += 1
+            examined.append(submission)
+        except Exception as e:
+            print(f"[fetch_and_store_memes] Insert failed: {e}")
+            failed.append(submission)
+            continue
+    return new_memes, examined, failed
+
+def _is_missing_subreddit(error: Exception) -> bool:
+    import prawcore
+    return isinstance(error, prawcore.exceptions.Redirect) or '404' in str(error)
+
+def _store_listing(category: str, subreddit_name: str, listing, max_new: int) -> int:
+    """Store one fetched listing and feed the outcome back to the subreddit selector"""
+    if isinstance(listing, Exception):
+        banned = _is_missing_subreddit(listing)
+        if banned:
+            print(f"[fetch_and_store_memes] Subreddit '{subreddit_name}' does not exist or is banned. Skipping.")
+        else:
+            print(f"[fetch_and_store_memes] Error fetching subreddit '{subreddit_name}': {listing}")
+        subreddit_selector.record_fetch(subreddit_name, 0, 0, 0.0, error=True, banned=banned)
+        return 0
+    submissions, latency = listing
+    # Skip posts examined in earlier cycles before paying for a duplicate check
+    unseen = reddit_checkpoints.filter_unseen(subreddit_name, submissions, chronological=REDDIT_LISTING == "new")
+    try:
+        new_memes, examined, failed = store_submissions(category, subreddit_name, unseen, max_new)
+    except Exception as e:
+        print(f"[fetch_and_store_memes] Error processing subreddit '{subreddit_name}': {e}")
+        subreddit_selector.record_fetch(subreddit_name, REDDIT_LISTING_LIMIT, 0, latency, error=True)
+        return 0
+    # Failed posts and those not reached before max_new hold the high-water mark back
+    done = {s.id for s in examined}
+    reddit_checkpoints.mark_seen(subreddit_name, examined, [s for s in unseen if s.id not in done], failed)
+    # Yield is measured against the request's listing size, so incremental listings compare fairly
+    subreddit_selector.record_fetch(subreddit_name, REDDIT_LISTING_LIMIT, new_memes, latency)
+    if len(unseen) < len(submissions):
+        print(f"[fetch_and_store_memes] Skipped {len(submissions) - len(unseen)} already-seen posts in '{subreddit_name}'.")
+    if new_memes == 0:
+        print(f"[fetch_and_store_memes] No new memes found in subreddit '{subreddit_name}'.")
+    else:
+        print(f"[fetch_and_store_memes] Inserted {new_memes} new memes from subreddit '{subreddit_name}'.")
+    return new_memes
+
+def fetch_and_store_memes(category: str, subreddit_name: str = None):
+    """Fetch and store memes from Reddit - listings are fetched concurrently, best subreddits first"""
+    try:
         # Use MEME_SUBREDDITS for subreddit list if not provided
         if subreddit_name:
             subreddits = [subreddit_name]
@@ -69,94 +235,52 @@ def fetch_and_store_memes(category: str, subreddit_name: str = None):
             subreddits = MEME_SUBREDDITS
             print(f"[fetch_and_store_memes] Using MEME_SUBREDDITS: {subreddits}")
         
-        if not subreddits:
-            return
+        # Highest-yield subreddits first, with some exploration of the others
+        subreddits_to_try = subreddit_selector.rank(subreddits)
+        if not subreddits_to_try:
+            return 0
         
         inserted_count = 0
-        banned_subreddits = set()
-        max_retries = 20  # Reduced retry limit for faster operation
-        retries = 0
+        for i in range(0, len(subreddits_to_try), REDDIT_FETCH_CONCURRENCY):
+            batch = subreddits_to_try[i:i + REDDIT_FETCH_CONCURRENCY]
+            listings = fetch_subreddit_listings(batch)
+            for name in batch:
+                inserted_count += _store_listing(category, name, listings[name], 30 - inserted_count)
+                if inserted_count >= 30:  # Reduced limit for faster operation
+                    print(f"[fetch_and_store_memes] Inserted {inserted_count} new memes. Stopping fetch.")
+                    break
+            if inserted_count >= 30:
+                break
         
-        while inserted_count < 30 and retries < max_retries:  # Reduced limit for faster operation
-            # Shuffle and make a copy to avoid retrying the same subreddit in the same loop
-            subreddits_to_try = subreddits[:]
-            random.shuffle(subreddits_to_try)
-            
-            for subreddit_name in subreddits_to_try:
-                if subreddit_name in banned_subreddits:
-                    continue
-                    
-                try:
-                    subreddit = reddit.subreddit(subreddit_name)
-                    new_memes_this_sub = 0
-                    
-                    # Reduced limit for faster processing
-                    for submission in subreddit.hot(limit=25):
-                        url = submission.url
-                        if not any(url.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
-                            continue
-                            
-                        # Check for duplicate in DB before uploading to Cloudinary
-                        from app.services.supabase_service import supabase
-                        reddit_post_url = f"https://reddit.com{submission.permalink}"
-                        existing = supabase.table("memes").select("id").eq("reddit_post_url", reddit_post_url).execute()
-                        if existing.data and len(existing.data) > 0:
-                            continue
-                            
-                        # Upload to Cloudinary with timeout
-                        try:
-                            upload_result = cloudinary.uploader.upload(url, resource_type="auto", timeout=10)
-                            cloudinary_url = upload_result["secure_url"]
-                        except Exception as e:
-                            print(f"[fetch_and_store_memes] Cloudinary upload failed for {url}: {e}")
-                            continue
-                            
-                        # Store in Supabase
-                        meme_data = {
-                            "title": submission.title,
-                            "cloudinary_url": cloudinary_url,
-                            "reddit_post_url": reddit_post_url,
-                            "subreddit": subreddit_name,
-                            "category": category,
-                            "timestamp": datetime.utcfromtimestamp(submission.created_utc).isoformat()
-                        }
-                        
-                        try:
-                            from app.services.supabase_service import insert_meme
-                            insert_meme(meme_data)
-                            inserted_count += 1
-                            new_memes_this_sub += 1
-                            
-                            if inserted_count >= 30:  # Reduced limit
-                                print(f"[fetch_and_store_memes] Inserted {inserted_count} new memes. Stopping fetch.")
-                                return
-                                
-                        except Exception as e:
-                            print(f"[fetch_and_store_memes] Insert failed: {e}")
-                            continue
-                            
-                    if new_memes_this_sub == 0:
-                        print(f"[fetch_and_store_memes] No new memes found in subreddit '{subreddit_name}'. Moving to next subreddit.")
-                        continue
-                    else:
-                        print(f"[fetch_and_store_memes] Inserted {new_memes_this_sub} new memes from subreddit '{subreddit_name}'. Total so far: {inserted_count}")
-                        
-                except prawcore.exceptions.Redirect:
-                    print(f"[fetch_and_store_memes] Subreddit '{subreddit_name}' caused a redirect (does not exist or is banned). Skipping permanently.")
-                    banned_subreddits.add(subreddit_name)
-                    continue
-                except Exception as e:
-                    if '404' in str(e):
-                        print(f"[fetch_and_store_memes] Subreddit '{subreddit_name}' returned 404. Skipping permanently.")
-                        banned_subreddits.add(subreddit_name)
-                    else:
-                        print(f"[fetch_and_store_memes] Error processing subreddit '{subreddit_name}': {e}")
-                    continue
-                    
-            retries += 1
-            
+        subreddit_selector.save()
+        reddit_checkpoints.save()
         print(f"[fetch_and_store_memes] Finished fetching. Total unique memes inserted: {inserted_count}")
+        return inserted_count
         
     except Exception as e:
         print(f"[fetch_and_store_memes] Critical error: {e}")
-        raise 
\ No newline at end of file
+        raise
+
+def fetch_and_store_category_batch(assignments: List[tuple]) -> int:
+    """
+    Fetch several (category, subreddit) pairs in one go: all listings are pulled
+    concurrently under the shared rate budget, then stored one pair at a time.
+    A subreddit is stored (and its yield recorded) once per batch, under the first
+    category it is paired with.
+    """
+    try:
+        distinct = {}
+        for category, name in assignments:
+            distinct.setdefault(name, (category, name))
+        assignments = list(distinct.values())
+        listings = fetch_subreddit_listings([name for _, name in assignments])
+        inserted_count = 0
+        for category, subreddit_name in assignments:
+            inserted_count += _store_listing(category, subreddit_name, listings[subreddit_name], 30)
+        subreddit_selector.save()
+        reddit_checkpoints.save()
+        print(f"[fetch_and_store_memes] Batch finished. Total unique memes inserted: {inserted_count}")
+        return inserted_count
+    except Exception as e:
+        print(f"[fetch_and_store_memes] Critical error: {e}")
+        raise
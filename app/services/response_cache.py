@@ -0,0 +1,190 @@
+import os
+import time
+import threading
+import functools
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from app.services.single_flight import SingleFlight, call_key
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+# Keys kept per cached provider; the least recently used are dropped beyond this
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+# First pages of feeds (category pages, trending) may be this many seconds old,
+# and are served up to FEED_HEAD_STALE_SECONDS longer while being refreshed
+FEED_HEAD_CACHE_SECONDS = int(os.getenv("FEED_HEAD_CACHE_SECONDS", "5"))
+FEED_HEAD_STALE_SECONDS = int(os.getenv("FEED_HEAD_STALE_SECONDS", "30"))
+# Failed loads are remembered this long, so a failing backend is not retried by every request
+RESPONSE_CACHE_ERROR_SECONDS = int(os.getenv("RESPONSE_CACHE_ERROR_SECONDS", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+def cache_control(response, max_age: int = 0, stale_while_revalidate: int = 0):
+    """
+    Set Cache-Control on a response. Bodies carry the user's like/save flags, so
+    they are always private; max_age 0 asks clients to revalidate every time.
+    """
+    if max_age <= 0:
+        response.headers["Cache-Control"] = "private, no-cache"
+        return
+    value = f"private, max-age={max_age}"
+    if stale_while_revalidate > 0:
+        value += f", stale-while-revalidate={stale_while_revalidate}"
+    response.headers["Cache-Control"] = value
+
+
+class _Entry:
+    __slots__ = ("value", "error", "fresh_until", "stale_until", "refreshing")
+
+    def __init__(self, value, error: Optional[BaseException], fresh_until: float, stale_until: float):
+        self.value = value
+        self.error = error
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.refreshing = False
+
+
+class ResponseCache:
+    """
+    TTL cache for one data provider, with stale-while-revalidate: for `stale` seconds
+    after an entry expires it is still served while a background thread refreshes it,
+    so a key that keeps being read never makes a request wait on the backend. Misses
+    for the same key share one call. Errors are cached for `error_ttl` seconds so a
+    failing backend is not hammered by every request.
+    """
+
+    def __init__(self, fn: Callable, ttl: float, stale: float = 0, error_ttl: float = 0,
+                 copy: Optional[Callable[[Any], Any]] = None, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.fn = fn
+        self.name = fn.__qualname__
+        self.ttl = ttl
+        self.stale = stale
+        self.error_ttl = error_ttl
+        self.copy = copy
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, _Entry]" = OrderedDict()
+        self._flight = SingleFlight(self.name)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.refreshes = 0
+
+    def _load(self, key, args, kwargs) -> _Entry:
+        """Call the provider and store the result (or the error, briefly)."""
+        now = time.monotonic()
+        try:
+            value = self.fn(*args, **kwargs)
+        except Exception as e:
+            self.errors += 1
+            entry = _Entry(None, e, now + self.error_ttl, now + self.error_ttl)
+        else:
+            entry = _Entry(value, None, now + self.ttl, now + self.ttl + self.stale)
+        with self._lock:
+            previous = self._entries.get(key)
+            if entry.error is not None and previous is not None and previous.error is None and previous.stale_until > now:
+                # A failed refresh keeps serving the stale value until it runs out,
+                # retrying no more often than every error_ttl seconds
+                previous.fresh_until = min(now + self.error_ttl, previous.stale_until)
+                previous.refreshing = False
+                return previous
+            if entry.error is None or self.error_ttl > 0:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def _refresh(self, key, args, kwargs):
+        try:
+            entry = self._load(key, args, kwargs)
+            if entry.error is not None:
+                logger.warning(f"[Response Cache] Refreshing {self.name} failed: {entry.error}")
+        finally:
+            self.refreshes += 1
+
+    def _result(self, entry: _Entry):
+        if entry.error is not None:
+            raise entry.error
+        return self.copy(entry.value) if self.copy is not None else entry.value
+
+    def get(self, *args, **kwargs):
+        if not RESPONSE_CACHE_ENABLED:
+            return self.fn(*args, **kwargs)
+        try:
+            key = call_key(args, kwargs)
+        except TypeError:
+            return self.fn(*args, **kwargs)  # Unhashable arguments: not cacheable
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._result(entry)
+            if entry is not None and entry.error is None and now < entry.stale_until:
+                self.stale_hits += 1
+                if not entry.refreshing:
+                    entry.refreshing = True
+                    threading.Thread(target=self._refresh, args=(key, args, kwargs),
+                                     name="response_cache_refresh", daemon=True).start()
+                return self._result(entry)
+            self.misses += 1
+        entry, _ = self._flight.do(key, self._load, key, args, kwargs)
+        return self._result(entry)
+
+    def invalidate(self, *args, **kwargs):
+        """Drop the entry for these arguments, or every entry when called without any."""
+        with self._lock:
+            if not args and not kwargs:
+                self._entries.clear()
+            else:
+                self._entries.pop(call_key(args, kwargs), None)
+
+    def set_headers(self, response):
+        """Cache-Control matching this cache's freshness: clients may reuse what we would."""
+        cache_control(response, int(self.ttl), int(self.stale))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._entries)
+        served = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / served, 3) if served else None,
+            "errors": self.errors,
+            "background_refreshes": self.refreshes,
+        }
+
+
+_caches: Dict[str, ResponseCache] = {}
+
+
+def cached(ttl: float, stale: float = 0, error_ttl: float = 0, copy: Optional[Callable[[Any], Any]] = None):
+    """
+    Decorator for route data providers: results are cached per argument tuple for `ttl`
+    seconds and served stale for `stale` more while refreshed in the background;
+    exceptions are cached for `error_ttl` seconds. Results are shared across requests,
+    so a route that modifies what it gets must pass `copy`. The wrapper exposes the
+    ResponseCache as `.cache` (set_headers, invalidate, stats).
+    """
+    def decorator(fn):
+        cache = _caches[fn.__qualname__] = ResponseCache(fn, ttl, stale, error_ttl, copy)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return cache.get(*args, **kwargs)
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def response_cache_stats() -> Dict[str, Dict]:
+    """Per-provider entry, hit/stale/miss and refresh counters."""
+    return {name: cache.stats() for name, cache in _caches.items()}
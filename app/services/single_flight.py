@@ -0,0 +1,122 @@
+import os
+import threading
+import functools
+from typing import Any, Callable, Dict, Optional
+
+# A waiter gives up on the shared call after this long and runs the query itself
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "30"))
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls: the first caller for a key runs the
+    function, callers arriving while it is in flight wait and share its result
+    (or its exception). Nothing is cached once the call returns.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+
+    def do(self, key, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) for `key`, or join the identical call already running. Returns (result, shared)."""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+        if not leader:
+            if call.done.wait(SINGLE_FLIGHT_WAIT_SECONDS):
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            with self._lock:
+                self.executions += 1
+            return fn(*args, **kwargs), False
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls, executions, in_flight = self.calls, self.executions, len(self._calls)
+        return {
+            "calls": calls,
+            "backend_calls": executions,
+            "shared": calls - executions,
+            # Callers served per backend call; 1.0 means nothing was coalesced
+            "coalescing_ratio": round(calls / executions, 3) if executions else None,
+            "in_flight": in_flight,
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def call_key(args: tuple, kwargs: dict):
+    """Hashable key for a call's arguments (lists and dicts frozen); raises TypeError if unhashable."""
+    key = (_freeze(args), _freeze(kwargs))
+    hash(key)
+    return key
+
+
+def single_flight(copy: Optional[Callable[[Any], Any]] = None):
+    """
+    Decorator for data-access functions. Concurrent calls with equal arguments share
+    one backend call. Callers that mutate the result must pass `copy`, which is
+    applied to the result handed to each waiter so no two requests share objects.
+    """
+    def decorator(fn):
+        group = _groups.setdefault(fn.__qualname__, SingleFlight(fn.__qualname__))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not SINGLE_FLIGHT_ENABLED:
+                return fn(*args, **kwargs)
+            try:
+                key = call_key(args, kwargs)
+            except TypeError:
+                return fn(*args, **kwargs)  # Unhashable arguments: nothing to coalesce on
+            result, shared = group.do(key, fn, *args, **kwargs)
+            return copy(result) if shared and copy is not None else result
+
+        wrapper.single_flight = group
+        return wrapper
+    return decorator
+
+
+def single_flight_stats() -> Dict[str, Dict]:
+    """Per-function call, backend call and coalescing ratio counters."""
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,123 @@
+import os
+import json
+import math
+import random
+import time
+import threading
+import logging
+from typing import List, Dict, Optional
+from app.config.scheduler_config import (
+    SUBREDDIT_STATS_FILE, SUBREDDIT_STATS_DECAY, SUBREDDIT_EXPLORATION, SUBREDDIT_BAN_HOURS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SubredditSelector:
+    """
+    Per-subreddit ingestion statistics plus a UCB1 bandit over them.
+    The reward of a fetch is the share of the listing that turned into new memes
+    (0 on error). Averages are exponentially weighted so a subreddit that dries
+    up loses priority quickly, and the UCB bonus keeps rarely tried subreddits
+    in rotation. Stats are persisted to SUBREDDIT_STATS_FILE between runs.
+    """
+
+    def __init__(self, path: str = SUBREDDIT_STATS_FILE, decay: float = SUBREDDIT_STATS_DECAY,
+                 exploration: float = SUBREDDIT_EXPLORATION):
+        self.path = path
+        self.decay = decay
+        self.exploration = exploration
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"[Subreddit Stats] Could not load {self.path}, starting fresh: {e}")
+            return {}
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self._stats, indent=2, sort_keys=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"[Subreddit Stats] Could not save {self.path}: {e}")
+
+    def _ewma(self, old: Optional[float], value: float) -> float:
+        return value if old is None else (1 - self.decay) * old + self.decay * value
+
+    def record_fetch(self, subreddit: str, candidates: int, new_memes: int, latency: float,
+                     error: bool = False, banned: bool = False):
+        """Record the outcome of one listing fetch for a subreddit."""
+        reward = 0.0 if error else min(1.0, new_memes / candidates) if candidates else 0.0
+        with self._lock:
+            s = self._stats.setdefault(subreddit, {"fetches": 0, "errors": 0, "new_memes": 0})
+            s["fetches"] += 1
+            s["errors"] += int(error)
+            s["new_memes"] += new_memes
+            s["reward"] = self._ewma(s.get("reward"), reward)
+            s["error_rate"] = self._ewma(s.get("error_rate"), float(error))
+            s["latency_seconds"] = self._ewma(s.get("latency_seconds"), latency)
+            s["last_fetched_at"] = time.time()
+            if new_memes:
+                s["last_new_at"] = s["last_fetched_at"]
+            if banned:
+                s["banned_until"] = s["last_fetched_at"] + SUBREDDIT_BAN_HOURS * 3600
+            else:
+                s.pop("banned_until", None)
+
+    def _score(self, subreddit: str, total_fetches: int, now: float) -> float:
+        s = self._stats.get(subreddit)
+        if not s or not s.get("fetches"):
+            return math.inf  # Never tried: explore first
+        if s.get("banned_until", 0) > now:
+            return -math.inf
+        bonus = self.exploration * math.sqrt(math.log(max(total_fetches, 1)) / s["fetches"])
+        return s.get("reward", 0.0) + bonus
+
+    def rank(self, subreddits: List[str]) -> List[str]:
+        """Subreddits ordered by UCB score, best first; banned ones are dropped."""
+        now = time.time()
+        with self._lock:
+            total = sum(self._stats.get(name, {}).get("fetches", 0) for name in subreddits)
+            scored = [(self._score(name, total, now), name) for name in subreddits]
+        # Random tie-break so untried subreddits are explored in no fixed order
+        scored.sort(key=lambda item: (item[0], random.random()), reverse=True)
+        return [name for score, name in scored if score != -math.inf]
+
+    def select(self, subreddits: List[str], k: int) -> List[str]:
+        """Pick the k best subreddits to spend this cycle's fetch budget on."""
+        return self.rank(subreddits)[:k]
+
+    def snapshot(self) -> List[Dict]:
+        """Stats for /scheduler/status, best performing first."""
+        now = time.time()
+        with self._lock:
+            total = sum(s.get("fetches", 0) for s in self._stats.values())
+            rows = []
+            for name, s in self._stats.items():
+                score = self._score(name, total, now)
+                rows.append({
+                    "subreddit": name,
+                    "fetches": s.get("fetches", 0),
+                    "new_memes": s.get("new_memes", 0),
+                    "yield": round(s.get("reward", 0.0), 4),
+                    "error_rate": round(s.get("error_rate", 0.0), 4),
+                    "latency_seconds": round(s.get("latency_seconds", 0.0), 3),
+                    "score": round(score, 4) if math.isfinite(score) else None,
+                    "banned": s.get("banned_until", 0) > now,
+                })
+        rows.sort(key=lambda row: row["yield"], reverse=True)
+        return rows
+
+
+# Global selector instance
+subreddit_selector = SubredditSelector()
@@ -5,6 +5,7 @@ from supabase import create_client, Client
 from datetime import datetime
 import random as pyrandom
 import logging
+from app.services.single_flight import single_flight
 
 # Reduce verbose logging
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -12,6 +13,9 @@ logging.getLogger("urllib3").setLevel(logging.WARNING)
 logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("supabase").setLevel(logging.WARNING)
 
+# Most ids accepted by one batch lookup (ids travel in the query string)
+MEMES_BATCH_MAX_IDS = int(os.getenv("MEMES_BATCH_MAX_IDS", "100"))
+
 def get_supabase():
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -19,21 +23,26 @@ def get_supabase():
         raise RuntimeError("Supabase credentials are not set in environment variables.")
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
+@single_flight()
+def _fetch_category_rows(category: str, after: Optional[str], fetch_size: int) -> List[Dict]:
+    # Shared by concurrent callers asking for the same rows: treat the result as read-only
+    query = get_supabase().table("memes").select("*").eq("category", category)
+    if after:
+        query = query.gt("timestamp", after)
+    # Always order by id descending (latest first)
+    return query.order("id", desc=True).range(0, fetch_size - 1).execute().data or []
+
 def get_memes_by_category(category: str, page: int, page_size: int, after: Optional[str] = None, random: bool = False, exclude_ids: Optional[list] = None) -> List[Meme]:
     try:
         if exclude_ids is None:
             exclude_ids = []
         start = (page - 1) * page_size
         end = start + page_size - 1
-        query = get_supabase().table("memes").select("*").eq("category", category)
-        if after:
-            query = query.gt("timestamp", after)
-        # Always order by id descending (latest first)
-        query = query.order("id", desc=True)
-        # Fetch a larger pool if exclude_ids is provided
-        fetch_size = (end - start + 1) * 3 if exclude_ids else (end - start + 1)
-        response = query.range(0, fetch_size - 1).execute()
-        memes = [Meme(**item) for item in response.data]
+        # Fetch every row up to the end of the page (a larger pool if exclude_ids is provided)
+        fetch_size = start + ((end - start + 1) * 3 if exclude_ids else (end - start + 1))
+        rows = _fetch_category_rows(category, after, fetch_size)
+        # Trusted rows from our own table: skip re-validation
+        memes = [Meme.from_row(item) for item in rows]
         if exclude_ids:
             memes = [m for m in memes if m.id not in exclude_ids]
         if random:
@@ -52,24 +61,39 @@ def insert_meme(meme_data: dict):
                 # Duplicate found, skip insert
                 print(f"[insert_meme] Duplicate meme found for URL: {meme_data['reddit_post_url']}. Skipping insert.")
                 return
-        get_supabase().table("memes").insert(meme_data).execute()
+        resp = get_supabase().table("memes").insert(meme_data).execute()
+        notify_memes_inserted(resp.data)
     except Exception as e:
         raise RuntimeError(f"Failed to insert meme: {e}")
 
+def notify_memes_inserted(rows):
+    """Hand freshly inserted meme rows to the in-process catalog, trending index and push hub."""
+    from app.services.meme_catalog import meme_catalog
+    from app.services.trending_service import trending_index
+    from app.services.push_hub import push_hub
+    meme_catalog.on_insert(rows)
+    trending_index.on_insert(rows)
+    push_hub.publish_memes(rows)
+
 def like_meme(user_id: str, meme_id: int):
     try:
-        # Insert like if not exists
-        get_supabase().table("meme_likes").insert({"user_id": user_id, "meme_id": meme_id}).execute()
+        # Acknowledged from the write-behind buffer; the insert happens on the next flush
+        from app.services.engagement_buffer import engagement_buffer, engagement_exists, meme_exists
+        state = engagement_buffer.pending_state("like", user_id, meme_id)
+        if state is True or (state is None and engagement_exists("like", user_id, meme_id)):
+            return {"message": "Already liked."}
+        # Checked before acknowledging: the write itself happens later, off the request
+        if not meme_exists(meme_id):
+            raise RuntimeError(f"Meme {meme_id} not found")
+        engagement_buffer.set_state("like", user_id, meme_id, True)
         return {"message": "Meme liked."}
     except Exception as e:
-        # If unique constraint fails, user already liked
-        if "duplicate key value violates unique constraint" in str(e):
-            return {"message": "Already liked."}
         raise RuntimeError(f"Failed to like meme: {e}")
 
 def unlike_meme(user_id: str, meme_id: int):
     try:
-        get_supabase().table("meme_likes").delete().eq("user_id", user_id).eq("meme_id", meme_id).execute()
+        from app.services.engagement_buffer import engagement_buffer
+        engagement_buffer.set_state("like", user_id, meme_id, False)
         return {"message": "Meme unliked."}
     except Exception as e:
         raise RuntimeError(f"Failed to unlike meme: {e}")
@@ -81,8 +105,13 @@ def get_meme_like_count(meme_id: int) -> int:
     except Exception as e:
         raise RuntimeError(f"Failed to get like count: {e}")
 
+@single_flight(copy=lambda row: dict(row) if row else row)
 def get_meme_by_id(meme_id: int):
     try:
+        from app.services.meme_catalog import meme_catalog
+        cached = meme_catalog.get(meme_id)
+        if cached is not None:
+            return cached
         resp = get_supabase().table("memes").select("*").eq("id", meme_id).single().execute()
         if not resp.data:
             return None
@@ -92,16 +121,22 @@ def get_meme_by_id(meme_id: int):
 
 def save_meme(user_id: str, meme_id: int):
     try:
-        get_supabase().table("meme_saves").insert({"user_id": user_id, "meme_id": meme_id}).execute()
+        from app.services.engagement_buffer import engagement_buffer, engagement_exists, meme_exists
+        state = engagement_buffer.pending_state("save", user_id, meme_id)
+        if state is True or (state is None and engagement_exists("save", user_id, meme_id)):
+            return {"message": "Already saved."}
+        # Checked before acknowledging: the write itself happens later, off the request
+        if not meme_exists(meme_id):
+            raise RuntimeError(f"Meme {meme_id} not found")
+        engagement_buffer.set_state("save", user_id, meme_id, True)
         return {"message": "Meme saved."}
     except Exception as e:
-        if "duplicate key value violates unique constraint" in str(e):
-            return {"message": "Already saved."}
         raise RuntimeError(f"Failed to save meme: {e}")
 
 def unsave_meme(user_id: str, meme_id: int):
     try:
-        get_supabase().table("meme_saves").delete().eq("user_id", user_id).eq("meme_id", meme_id).execute()
+        from app.services.engagement_buffer import engagement_buffer
+        engagement_buffer.set_state("save", user_id, meme_id, False)
         return {"message": "Meme unsaved."}
     except Exception as e:
         raise RuntimeError(f"Failed to unsave meme: {e}")
@@ -110,6 +145,9 @@ def get_saved_memes(user_id: str):
     try:
         resp = get_supabase().table("meme_saves").select("meme_id").eq("user_id", user_id).execute()
         meme_ids = [int(row["meme_id"]) for row in resp.data if row.get("meme_id") is not None]
+        # Include saves still waiting in the write-behind buffer
+        from app.services.engagement_buffer import engagement_buffer
+        meme_ids = engagement_buffer.overlay_ids("save", user_id, meme_ids)
         print("DEBUG: meme_ids for user", user_id, meme_ids)
         if not meme_ids:
             return []
@@ -123,11 +161,12 @@ def get_saved_meme_ids(user_id: str):
     try:
         resp = get_supabase().table("meme_saves").select("meme_id").eq("user_id", user_id).execute()
         meme_ids = [row["meme_id"] for row in resp.data]
-        return meme_ids
+        from app.services.engagement_buffer import engagement_buffer
+        return engagement_buffer.overlay_ids("save", user_id, meme_ids)
     except Exception as e:
         raise RuntimeError(f"Failed to get saved meme ids: {e}")
 
-def upload_meme(title: str, category: str, file_url: str, uploader_id: str, uploader_username: str):
+def upload_meme(title: str, category: str, file_url: str, uploader_id: str, uploader_username: str, metadata: Optional[Dict] = None):
     try:
         supabase = get_supabase()
         meme_data = {
@@ -138,10 +177,15 @@ def upload_meme(title: str, category: str, file_url: str, uploader_id: str, uplo
             "subreddit": None,  # Add subreddit field for user uploads
             "timestamp": datetime.utcnow().isoformat(),
             "uploader_id": uploader_id,
-            "uploader_username": uploader_username
+            "uploader_username": uploader_username,
+            **(metadata or {})
         }
         resp = supabase.table("memes").insert(meme_data).execute()
-        return resp.data[0] if resp.data else meme_data
+        meme = resp.data[0] if resp.data else meme_data
+        notify_memes_inserted(resp.data)
+        from app.services.activity_service import record_activity
+        record_activity(uploader_id, "upload", meme.get("id"))
+        return meme
     except Exception as e:
         raise RuntimeError(f"Failed to upload meme: {e}")
 
@@ -184,6 +228,9 @@ def edit_meme(meme_id: int, uploader_id: str, title: Optional[str] = None, categ
         if not update_data:
             return {"message": "Nothing to update."}
         resp = get_supabase().table("memes").update(update_data).eq("id", meme_id).eq("uploader_id", uploader_id).execute()
+        if resp.data:
+            from app.services.meme_catalog import meme_catalog
+            meme_catalog.on_update(resp.data[0])
         return resp.data[0] if resp.data else {"message": "No meme updated."}
     except Exception as e:
         raise RuntimeError(f"Failed to edit meme: {e}")
@@ -191,14 +238,21 @@ def edit_meme(meme_id: int, uploader_id: str, title: Optional[str] = None, categ
 def delete_meme(meme_id: int, uploader_id: str):
     try:
         resp = get_supabase().table("memes").delete().eq("id", meme_id).eq("uploader_id", uploader_id).execute()
+        if resp.data:
+            from app.services.meme_catalog import meme_catalog
+            from app.services.trending_service import trending_index
+            meme_catalog.on_delete(meme_id)
+            trending_index.on_delete(meme_id)
         return {"message": "Meme deleted."}
     except Exception as e:
         raise RuntimeError(f"Failed to delete meme: {e}")
 
+@single_flight()
 def get_meme_counts_batch(meme_ids: List[int]) -> Dict[str, Dict[int, int]]:
     """
     Get like and save counts for multiple memes in batch.
     Returns: {"like_counts": {meme_id: count}, "save_counts": {meme_id: count}}
+    Concurrent calls for the same ids share one result; callers must not modify it.
     """
     like_counts = {}
     save_counts = {}
@@ -228,4 +282,72 @@ def get_meme_counts_batch(meme_ids: List[int]) -> Dict[str, Dict[int, int]]:
     except Exception as e:
         print(f"Error getting batch counts: {e}")
     
-    return {"like_counts": like_counts, "save_counts": save_counts}
\ No newline at end of file
+    return {"like_counts": like_counts, "save_counts": save_counts}
+
+@single_flight(copy=lambda rows: [dict(row) for row in rows])
+def get_memes_by_ids(meme_ids: List[int]) -> List[Dict]:
+    """
+    Meme rows with like/save counts for a list of ids, in the order given; unknown ids
+    are left out. Hot memes come from the catalog, the rest from one row query plus
+    one batch count lookup, however many ids are asked for.
+    """
+    from app.services.meme_catalog import meme_catalog
+    found = {}
+    for meme_id in meme_ids:
+        cached = meme_catalog.get(meme_id)
+        if cached is not None:
+            found[meme_id] = cached
+    missing = [meme_id for meme_id in dict.fromkeys(meme_ids) if meme_id not in found]
+    if missing:
+        try:
+            rows = get_supabase().table("memes").select("*").in_("id", missing).execute().data or []
+        except Exception as e:
+            raise RuntimeError(f"Failed to get memes: {e}")
+        counts = get_meme_counts_batch([row["id"] for row in rows])
+        for row in rows:
+            row["like_count"] = counts["like_counts"].get(row["id"], 0)
+            row["save_count"] = counts["save_counts"].get(row["id"], 0)
+            found[row["id"]] = row
+    return [found[meme_id] for meme_id in dict.fromkeys(meme_ids) if meme_id in found]
+
+def get_engagement_flags(user_id: str, meme_ids: List[int]) -> Optional[Dict[str, set]]:
+    """
+    Which of meme_ids the user has liked and saved, in two queries.
+    Changes still waiting in the engagement buffer are applied on top.
+    Returns None when the lookup fails, so pages still load without the flags.
+    """
+    liked, saved = set(), set()
+    meme_ids = [meme_id for meme_id in meme_ids if meme_id is not None]
+    if not meme_ids or not user_id:
+        return {"liked": liked, "saved": saved}
+    try:
+        likes_resp = get_supabase().table("meme_likes").select("meme_id").eq("user_id", user_id).in_("meme_id", meme_ids).execute()
+        liked.update(row["meme_id"] for row in likes_resp.data or [])
+        saves_resp = get_supabase().table("meme_saves").select("meme_id").eq("user_id", user_id).in_("meme_id", meme_ids).execute()
+        saved.update(row["meme_id"] for row in saves_resp.data or [])
+    except Exception as e:
+        print(f"Error getting engagement flags: {e}")
+        return None
+    from app.services.engagement_buffer import engagement_buffer
+    for kind, flagged in (("like", liked), ("save", saved)):
+        for meme_id in meme_ids:
+            state = engagement_buffer.pending_state(kind, user_id, meme_id)
+            if state is True:
+                flagged.add(meme_id)
+            elif state is False:
+                flagged.discard(meme_id)
+    return {"liked": liked, "saved": saved}
+
+def attach_engagement_flags(memes: List, user_id: str):
+    """Set liked_by_me / saved_by_me on each meme (dict or Meme model) for the requesting user (None if unknown)."""
+    def meme_id(meme):
+        return meme.get("id") if isinstance(meme, dict) else meme.id
+    flags = get_engagement_flags(user_id, [meme_id(meme) for meme in memes])
+    for meme in memes:
+        # Unknown (None) when the lookup failed, rather than failing the whole page
+        liked = meme_id(meme) in flags["liked"] if flags is not None else None
+        saved = meme_id(meme) in flags["saved"] if flags is not None else None
+        if isinstance(meme, dict):
+            meme["liked_by_me"], meme["saved_by_me"] = liked, saved
+        else:
+            meme.liked_by_me, meme.saved_by_me = liked, saved
@@ -0,0 +1,84 @@
+import time
+import threading
+from typing import Optional, Tuple
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate` per second up
+    to `capacity`; refill is computed lazily on access so every check is O(1).
+    """
+
+    def __init__(self, rate: float, capacity: float, tokens: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity if tokens is None else tokens
+        self.updated_at = time.monotonic()
+        # Scheduled window reset: at reset_at (monotonic) the bucket refills and the rate becomes reset_rate
+        self.reset_at: Optional[float] = None
+        self.reset_rate = rate
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if self.reset_at is not None and now >= self.reset_at:
+            self.tokens = self.capacity
+            self.rate = self.reset_rate
+            self.updated_at = now
+            self.reset_at = None
+            return
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> Tuple[bool, float]:
+        """Take tokens if available. Returns (acquired, seconds until enough tokens would be available)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True, 0.0
+            wait = (tokens - self.tokens) / self.rate if self.rate > 0 else float("inf")
+            if self.reset_at is not None:
+                wait = min(wait, self.reset_at - now)
+            return False, wait
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until tokens are available, sleeping exactly as long as the refill needs."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            acquired, wait = self.try_acquire(tokens)
+            if acquired:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait > remaining:
+                    return False
+            # Re-check at least every second in case the rate was raised meanwhile
+            time.sleep(min(wait, 1.0))
+
+    def update(self, rate: Optional[float] = None, capacity: Optional[float] = None, tokens: Optional[float] = None,
+               reset_in: Optional[float] = None, reset_rate: Optional[float] = None):
+        """
+        Adjust the bucket, e.g. from rate-limit headers reported by an API. With
+        `reset_in`, the bucket refills to capacity that many seconds from now and
+        continues at `reset_rate` (default: the current rate), so a rate of 0 until
+        the API's window resets does not block callers forever.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if reset_in is not None:
+                self.reset_at = now + max(reset_in, 0.0)
+                if reset_rate is not None:
+                    self.reset_rate = reset_rate
+                elif rate is None:
+                    self.reset_rate = self.rate
+            if rate is not None:
+                self.rate = rate
+            if capacity is not None:
+                self.capacity = capacity
+            if tokens is not None:
+                self.tokens = min(self.capacity, tokens)
+            else:
+                self.tokens = min(self.capacity, self.tokens)
@@ -0,0 +1,314 @@
+import os
+import math
+import time
+import heapq
+import threading
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, List, Optional
+from app.services.supabase_service import get_supabase, get_meme_counts_batch
+
+# A like/save loses half its weight every TRENDING_HALF_LIFE_HOURS
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "6"))
+TRENDING_LIKE_WEIGHT = float(os.getenv("TRENDING_LIKE_WEIGHT", "1"))
+TRENDING_SAVE_WEIGHT = float(os.getenv("TRENDING_SAVE_WEIGHT", "2"))
+# Weight every meme gets at upload time, so new memes start ranked by recency
+TRENDING_BASE_WEIGHT = float(os.getenv("TRENDING_BASE_WEIGHT", "1"))
+# Memes older than this drop out of the rankings
+TRENDING_MAX_AGE_HOURS = float(os.getenv("TRENDING_MAX_AGE_HOURS", "72"))
+TRENDING_SEED_LIMIT = int(os.getenv("TRENDING_SEED_LIMIT", "3000"))
+# Rankings are reseeded from the database this often, picking up memes and
+# engagement written by other processes
+TRENDING_RESEED_SECONDS = int(os.getenv("TRENDING_RESEED_SECONDS", "900"))
+# A failed seed is retried after this long, doubling up to TRENDING_RESEED_SECONDS
+TRENDING_SEED_RETRY_SECONDS = int(os.getenv("TRENDING_SEED_RETRY_SECONDS", "30"))
+
+# Scores are kept as log2 of the weight forward-decayed to this fixed epoch:
+#   log2(sum(weight * 2 ** ((event_time - EPOCH) / half_life)))
+# Every meme decays at the same rate, so the order of these scores never changes with
+# time; only engagement moves a meme. Log space keeps the growing exponent finite.
+_EPOCH = 1_600_000_000
+_ID_CHUNK = 200
+
+logger = logging.getLogger(__name__)
+
+
+def _half_lives(epoch_seconds: float) -> float:
+    return (epoch_seconds - _EPOCH) / (TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def _log2_add(a: float, b: float) -> float:
+    if a == -math.inf:
+        return b
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def _log2_sub(a: float, b: float) -> float:
+    """log2(2**a - 2**b), or -inf when b is not smaller than a."""
+    if b >= a:
+        return -math.inf
+    return a + math.log2(1 - 2 ** (b - a))
+
+
+def _epoch(value) -> float:
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return time.time()
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class _Ranking:
+    """
+    Max-heap of (score, meme_id) with lazy deletion: an update pushes a new entry and
+    leaves the old one behind; entries that no longer match `scores` are discarded
+    when a read reaches them.
+    """
+
+    def __init__(self):
+        self.scores: Dict[int, float] = {}
+        self.heap: List[tuple] = []
+
+    def set(self, meme_id: int, score: float):
+        self.scores[meme_id] = score
+        heapq.heappush(self.heap, (-score, meme_id))
+
+    def remove(self, meme_id: int):
+        self.scores.pop(meme_id, None)
+
+    def top(self, count: int) -> List[int]:
+        kept, result, seen = [], [], set()
+        while self.heap and len(result) < count:
+            entry = heapq.heappop(self.heap)
+            meme_id = entry[1]
+            if meme_id in seen or self.scores.get(meme_id) != -entry[0]:
+                continue  # Stale or duplicate entry: drop it for good
+            seen.add(meme_id)
+            kept.append(entry)
+            result.append(meme_id)
+        for entry in kept:
+            heapq.heappush(self.heap, entry)
+        if len(self.heap) > 2 * len(self.scores) + 64:
+            self.heap = [(-score, meme_id) for meme_id, score in self.scores.items()]
+            heapq.heapify(self.heap)
+        return result
+
+
+class TrendingIndex:
+    """
+    Time-decayed trending rankings, global and per category, updated as likes and
+    saves are written and served without sorting the memes table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # meme_id -> (category, created_at, score)
+        self._memes: Dict[int, tuple] = {}
+        self._global = _Ranking()
+        self._categories: Dict[str, _Ranking] = {}
+        self._seeded_at = 0.0
+        self._pruned_at = 0.0
+        self.seed_failures = 0
+
+    def _set(self, meme_id: int, category: str, created_at: float, score: float):
+        self._memes[meme_id] = (category, created_at, score)
+        self._global.set(meme_id, score)
+        self._categories.setdefault(category, _Ranking()).set(meme_id, score)
+
+    def _base_score(self, created_at: float) -> float:
+        return math.log2(TRENDING_BASE_WEIGHT) + _half_lives(created_at) if TRENDING_BASE_WEIGHT > 0 else -math.inf
+
+    def seed(self):
+        """
+        Rebuild the rankings from recent memes and their current counts. Memes already
+        ranked keep their score when it is higher, so live engagement is not lost.
+        """
+        since = (datetime.utcnow() - timedelta(hours=TRENDING_MAX_AGE_HOURS)).isoformat()
+        try:
+            rows = (
+                get_supabase().table("memes").select("id, category, timestamp").gt("timestamp", since)
+                .order("id", desc=True).range(0, TRENDING_SEED_LIMIT - 1).execute().data or []
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to seed trending rankings: {e}")
+        like_counts, save_counts = {}, {}
+        meme_ids = [row["id"] for row in rows]
+        for start in range(0, len(meme_ids), _ID_CHUNK):
+            counts = get_meme_counts_batch(meme_ids[start:start + _ID_CHUNK])
+            like_counts.update(counts["like_counts"])
+            save_counts.update(counts["save_counts"])
+        memes = {}
+        for row in rows:
+            created_at = _epoch(row.get("timestamp"))
+            # Engagement times are not stored, so existing counts are dated at upload
+            weight = (TRENDING_BASE_WEIGHT + TRENDING_LIKE_WEIGHT * like_counts.get(row["id"], 0)
+                      + TRENDING_SAVE_WEIGHT * save_counts.get(row["id"], 0))
+            if weight > 0:
+                memes[row["id"]] = (row["category"], created_at, math.log2(weight) + _half_lives(created_at))
+        with self._lock:
+            previous = self._memes
+            self._memes, self._global, self._categories = {}, _Ranking(), {}
+            for meme_id, (category, created_at, score) in memes.items():
+                if meme_id in previous:
+                    score = max(score, previous[meme_id][2])
+                self._set(meme_id, category, created_at, score)
+            self._seeded_at = time.monotonic()
+        logger.info(f"[Trending] Seeded {len(memes)} memes")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.seed()
+                self.seed_failures = 0
+                delay = TRENDING_RESEED_SECONDS
+            except Exception as e:
+                self.seed_failures += 1
+                delay = min(TRENDING_SEED_RETRY_SECONDS * 2 ** (self.seed_failures - 1), TRENDING_RESEED_SECONDS)
+                logger.warning(f"[Trending] {e}; retrying in {delay}s")
+            self._stop.wait(delay)
+
+    def start(self):
+        """Seed the rankings and reseed every TRENDING_RESEED_SECONDS in a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trending_seed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def on_insert(self, rows):
+        """Start ranking newly inserted memes (a row dict or a list of them)."""
+        for row in ([rows] if isinstance(rows, dict) else rows or []):
+            if row.get("id") is None or not row.get("category"):
+                continue
+            created_at = _epoch(row.get("timestamp"))
+            with self._lock:
+                self._set(int(row["id"]), row["category"], created_at, self._base_score(created_at))
+
+    def on_delete(self, meme_id: int):
+        with self._lock:
+            entry = self._memes.pop(int(meme_id), None)
+            if entry is not None:
+                self._global.remove(int(meme_id))
+                self._categories[entry[0]].remove(int(meme_id))
+
+    def on_engagement(self, meme_id: int, kind: str, delta: int, category: Optional[str] = None,
+                      created_at: Optional[str] = None):
+        """
+        Apply `delta` likes or saves happening now. Memes not ranked yet are added
+        when their category and upload time are given.
+        """
+        weight = (TRENDING_LIKE_WEIGHT if kind == "like" else TRENDING_SAVE_WEIGHT) * abs(delta)
+        if weight <= 0:
+            return
+        now = time.time()
+        change = math.log2(weight) + _half_lives(now)
+        meme_id = int(meme_id)
+        with self._lock:
+            entry = self._memes.get(meme_id)
+            if entry is None:
+                if category is None or created_at is None:
+                    return
+                uploaded = _epoch(created_at)
+                if now - uploaded > TRENDING_MAX_AGE_HOURS * 3600:
+                    return
+                entry = (category, uploaded, self._base_score(uploaded))
+            category, uploaded, score = entry
+            if delta > 0:
+                score = _log2_add(score, change)
+            else:
+                # Removing a like dated now can take away more than it once added; never
+                # drop below the upload weight
+                score = max(_log2_sub(score, change), self._base_score(uploaded))
+            self._set(meme_id, category, uploaded, score)
+
+    def _prune(self):
+        if time.monotonic() - self._pruned_at < 60:
+            return
+        self._pruned_at = time.monotonic()
+        cutoff = time.time() - TRENDING_MAX_AGE_HOURS * 3600
+        for meme_id, (category, created_at, _) in list(self._memes.items()):
+            if created_at < cutoff:
+                del self._memes[meme_id]
+                self._global.remove(meme_id)
+                self._categories[category].remove(meme_id)
+
+    def top(self, count: int, category: Optional[str] = None, exclude_ids: Iterable[int] = ()) -> List[int]:
+        """
+        Ids of the `count` highest-scoring memes, globally or within a category.
+        Never queries the database: until the first seed completes only memes
+        inserted or engaged with since startup are ranked.
+        """
+        excluded = set(exclude_ids)
+        with self._lock:
+            self._prune()
+            ranking = self._global if category is None else self._categories.get(category)
+            if ranking is None:
+                return []
+            ranked = ranking.top(count + len(excluded))
+        return [meme_id for meme_id in ranked if meme_id not in excluded][:count]
+
+    def oldest_ranked_id(self, category: Optional[str] = None) -> Optional[int]:
+        """Lowest id ranked globally or in a category; every older meme is unranked."""
+        with self._lock:
+            ranking = self._global if category is None else self._categories.get(category)
+            return min(ranking.scores) if ranking is not None and ranking.scores else None
+
+    def score(self, meme_id: int) -> Optional[float]:
+        """Current decayed trending score of a meme (weight units), if it is ranked."""
+        entry = self._memes.get(int(meme_id))
+        if entry is None:
+            return None
+        return 2 ** (entry[2] - _half_lives(time.time()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "memes": len(self._memes),
+                "heap_entries": len(self._global.heap),
+                "categories": {name: len(r.scores) for name, r in self._categories.items()},
+                "seeded": bool(self._seeded_at),
+                "seed_failures": self.seed_failures,
+            }
+
+
+# Global trending index instance
+trending_index = TrendingIndex()
+
+
+def get_trending_page_ids(page: int, page_size: int, category: Optional[str] = None,
+                          exclude_ids: Iterable[int] = ()) -> List[int]:
+    """
+    Meme ids for one page of the trending feed. When the ranking runs out (ingestion
+    paused past TRENDING_MAX_AGE_HOURS, a page beyond the seeded memes, or the first
+    seed still running) the page continues with the newest unranked memes.
+    """
+    excluded = set(exclude_ids)
+    start = (page - 1) * page_size
+    ranked = trending_index.top(page * page_size, category, excluded)
+    page_ids = ranked[start:]
+    if len(page_ids) >= page_size:
+        return page_ids
+    # Position in the recency listing that follows the ranked memes
+    offset = max(0, start - len(ranked))
+    need = page_size - len(page_ids)
+    floor = trending_index.oldest_ranked_id(category)
+    try:
+        query = get_supabase().table("memes").select("id")
+        if category is not None:
+            query = query.eq("category", category)
+        if floor is not None:
+            query = query.lt("id", floor)
+        # Excluded ids are skipped, not counted, as in the ranked part; only ids are read
+        rows = query.order("id", desc=True).range(0, offset + need + len(excluded) - 1).execute().data or []
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch recent memes: {e}")
+    recent = [row["id"] for row in rows if row["id"] not in excluded]
+    return page_ids + recent[offset:offset + need]
@@ -1,8 +1,7 @@
 import os
 from app.models.user import UserSignup, UserOut, UserInDB
 from supabase import create_client
-from passlib.context import CryptContext
-import cloudinary.uploader
+from app.services.integrations import cloudinary_uploader
 import random, string
 from typing import Optional
 from datetime import date, datetime
@@ -13,22 +12,21 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     raise RuntimeError("Supabase credentials are not set in environment variables.")
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
-CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
-CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
-cloudinary.config(
-    cloud_name=CLOUDINARY_CLOUD_NAME,
-    api_key=CLOUDINARY_API_KEY,
-    api_secret=CLOUDINARY_API_SECRET
-)
+_pwd_context = None
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def get_pwd_context():
+    """passlib context, imported on the first password check instead of at startup"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+    return get_pwd_context().verify(plain, hashed)
 
 def generate_otp(length=6):
     return ''.join(random.choices(string.digits, k=length))
@@ -37,7 +35,7 @@ def create_user(user: UserSignup, profile_pic_file=None) -> UserOut:
     # Upload profile pic if provided
     profile_pic_url = None
     if profile_pic_file:
-        upload_result = cloudinary.uploader.upload(profile_pic_file, folder="profile_pics")
+        upload_result = cloudinary_uploader().upload(profile_pic_file, folder="profile_pics")
         profile_pic_url = upload_result["secure_url"]
     # Supabase Auth signup
     auth_resp = supabase.auth.sign_up({
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the in-process meme catalog.
+
+Loads synthetic memes spread over several categories into a MemeCatalog (no
+database) and reports the bytes held per 100k memes, next to the same rows kept
+as plain dicts and as Meme models, plus the cost of serving a page from it.
+
+    python benchmarks/catalog_memory.py --memes 100000 --categories 10
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.meme import Meme
+from app.services import meme_catalog as catalog_module
+from app.services.meme_catalog import MemeCatalog, CategoryWindow
+from benchmarks.response_bytes import synthetic_rows
+
+CATEGORIES = ["funny", "memes", "dank", "wholesome", "gaming", "anime", "programming", "science", "history", "politics", "sports"]
+
+
+def category_rows(count: int, categories: int):
+    rows = synthetic_rows(count)
+    for index, row in enumerate(rows):
+        row["category"] = CATEGORIES[index % categories]
+        row["subreddit"] = f"r_{CATEGORIES[index % categories]}"
+        row["uploader_username"] = None
+        row["uploader_id"] = None
+        row["duration"] = None
+    return rows
+
+
+def copied(row):
+    # Fresh string objects, so nothing measured is shared with the source rows
+    return {k: ("".join([v[:1], v[1:]]) if isinstance(v, str) else v) for k, v in row.items()}
+
+
+def build_catalog(rows):
+    catalog = MemeCatalog()
+    for row in reversed(rows):
+        window = catalog._windows.get(row["category"])
+        if window is None:
+            window = catalog._windows[row["category"]] = CategoryWindow(row["category"])
+            window.complete = True
+        window.upsert(copied(row), 7, 2)
+        catalog._category_of[row["id"]] = window.category
+    return catalog
+
+
+def measured(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return held, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memes", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    # Hold every synthetic meme rather than the default hot window
+    catalog_module.MEME_CATALOG_WINDOW = args.memes
+    source = category_rows(args.memes, min(args.categories, len(CATEGORIES)))
+    scale = 100_000 / args.memes
+
+    print(f"{args.memes} memes over {args.categories} categories, bytes per 100k memes")
+    results = {}
+    _, results["rows as dicts"] = measured(lambda: [copied(row) for row in source])
+    _, results["Meme models"] = measured(lambda: [Meme.from_row(copied(row)) for row in source])
+    catalog, results["catalog (traced)"] = measured(lambda: build_catalog(source))
+    for name, size in results.items():
+        print(f"  {name:<20} {size * scale / 2**20:8.1f} MiB")
+    report = catalog.memory_report()
+    print(f"  {'catalog (reported)':<20} {report['bytes_per_100k_memes'] / 2**20:8.1f} MiB")
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        catalog.category_page("funny", 1, 20)
+        best = min(best, time.perf_counter() - started)
+    print(f"\n20-item category page from the catalog: {best * 1e6:.0f} us (best of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Cold-start import benchmark.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter, prints the
+slowest imports and fails if a deferred integration is imported at startup or the
+total import time exceeds --max-ms.
+
+    python benchmarks/import_time.py --top 20 --max-ms 1500
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must only be imported on first use (see app/services/integrations.py)
+DEFERRED_MODULES = [
+    "praw", "prawcore", "instagrapi", "instaloader", "google.generativeai",
+    "passlib", "cloudinary", "apscheduler.jobstores.sqlalchemy",
+]
+
+def profile_imports(module: str):
+    """Return {module: (self_us, cumulative_us)} for a fresh import of `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the total import time exceeds this")
+    args = parser.parse_args()
+
+    timings = profile_imports(args.module)
+    total_ms = timings[args.module][1] / 1000
+    print(f"Total import time of {args.module}: {total_ms:.0f} ms ({len(timings)} modules)\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, (self_us, cumulative_us) in sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    failures = [
+        f"{name} is imported at startup"
+        for name in DEFERRED_MODULES if name in timings
+    ]
+    if args.max_ms is not None and total_ms > args.max_ms:
+        failures.append(f"import took {total_ms:.0f} ms, budget is {args.max_ms:.0f} ms")
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nOK: no deferred integration imported at startup")
+
+if __name__ == "__main__":
+    main()
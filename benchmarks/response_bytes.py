@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Bytes-per-request benchmark for the meme list endpoints.
+
+Serves /memes/{category} from synthetic rows (no database) through the real app,
+middleware included, and reports the bytes on the wire for a full response with
+each encoding and for a conditional re-poll that gets a 304.
+
+    python benchmarks/response_bytes.py --page-sizes 20 100
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.meme import Meme
+from app.routes import auth, memes as memes_routes
+from app.middleware import compression
+
+
+def synthetic_rows(count: int):
+    now = datetime(2024, 1, 1)
+    return [
+        {
+            "id": 100000 - i,
+            "title": f"When the build passes on the first try #{i}",
+            "cloudinary_url": f"https://res.cloudinary.com/memee/image/upload/v1700000000/memes/meme_{i}.jpg",
+            "reddit_post_url": f"https://reddit.com/r/memes/comments/abc{i}/when_the_build_passes/",
+            "category": "funny",
+            "subreddit": "memes",
+            "timestamp": (now - timedelta(minutes=i)).isoformat(),
+            "width": 1080,
+            "height": 1350,
+            "bytes": 182000 + i,
+            "dominant_color": "#AABBCC",
+        }
+        for i in range(count)
+    ]
+
+
+def measure(client: TestClient, page_size: int):
+    url = f"/memes/funny?page_size={page_size}"
+    results = {}
+    encodings = ["identity", "gzip"] + (["br"] if compression.brotli is not None else [])
+    etag = None
+    for encoding in encodings:
+        response = client.get(url, headers={"Accept-Encoding": encoding})
+        assert response.status_code == 200, response.text
+        # TestClient transparently decodes; Content-Length is what crossed the wire
+        results[encoding] = int(response.headers.get("content-length", len(response.content)))
+        etag = response.headers.get("etag")
+    response = client.get(url, headers={"Accept-Encoding": encodings[-1], "If-None-Match": etag})
+    results["304"] = len(response.content) if response.status_code == 304 else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100])
+    args = parser.parse_args()
+
+    app.dependency_overrides[auth.get_current_user] = lambda: {"sub": "benchmark-user"}
+    client = TestClient(app)
+    for page_size in args.page_sizes:
+        rows = synthetic_rows(page_size)
+        memes_routes.get_memes_by_category = lambda *a, rows=rows, **k: [Meme(**row) for row in rows]
+        memes_routes.get_meme_counts_batch = lambda ids: {"like_counts": {i: 7 for i in ids}, "save_counts": {i: 2 for i in ids}}
+        memes_routes.attach_engagement_flags = lambda memes, user_id: [
+            setattr(m, "liked_by_me", m.id % 3 == 0) or setattr(m, "saved_by_me", False) for m in memes
+        ]
+        # Measure the database path; the catalog would otherwise try to load the category
+        memes_routes.meme_catalog.category_page = lambda *a, **k: None
+        results = measure(client, page_size)
+        identity = results["identity"]
+        print(f"page_size={page_size}")
+        for name, size in results.items():
+            if size is None:
+                print(f"  {name:>8}: not returned")
+            else:
+                print(f"  {name:>8}: {size:>7} bytes  ({size / identity:6.1%} of identity)")
+    if compression.brotli is None:
+        print("\nbrotli is not installed; only gzip was measured")
+
+
+if __name__ == "__main__":
+    main()
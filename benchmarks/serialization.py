@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for a page of memes.
+
+Compares the old path (validate every row into Meme, validate again against
+response_model, jsonable_encoder + stdlib json) with the trusted-row path
+(Meme.from_row + ORJSONResponse) for the same rows.
+
+    python benchmarks/serialization.py --page-size 100 --repeat 200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app.models.meme import Meme
+from app.middleware.responses import ORJSONResponse
+from benchmarks.response_bytes import synthetic_rows
+
+page_adapter = TypeAdapter(List[Meme])
+
+
+def validated_stdlib(rows):
+    memes = [Meme(**row) for row in rows]
+    # What FastAPI does with response_model=List[Meme] before rendering a JSONResponse
+    validated = page_adapter.validate_python([m.model_dump() for m in memes])
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def validated_pydantic_json(rows):
+    memes = [Meme(**row) for row in rows]
+    return page_adapter.dump_json(page_adapter.validate_python(memes))
+
+
+def trusted_orjson(rows):
+    return ORJSONResponse([Meme.from_row(row) for row in rows]).body
+
+
+PATHS = {
+    "validated + stdlib json": validated_stdlib,
+    "validated + pydantic dump_json": validated_pydantic_json,
+    "trusted rows + orjson": trusted_orjson,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.page_size)
+    # Same content either way (key order and number formatting aside)
+    assert json.loads(trusted_orjson(rows)) == json.loads(validated_stdlib(rows))
+
+    print(f"{args.page_size}-item page, best of {args.repeat} runs")
+    baseline = None
+    for name, path in PATHS.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            path(rows)
+            best = min(best, time.perf_counter() - started)
+        baseline = baseline or best
+        print(f"  {name:<32} {best * 1000:8.3f} ms  ({baseline / best:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
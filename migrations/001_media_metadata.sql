@@ -0,0 +1,16 @@
+-- Layout metadata captured at ingest and by the media metadata backfill.
+-- Apply before deploying with MEDIA_METADATA_ENABLED=true (the default), e.g. in
+-- the Supabase SQL editor; inserts name these columns and fail without them.
+alter table memes add column if not exists width integer;
+alter table memes add column if not exists height integer;
+alter table memes add column if not exists duration real;
+alter table memes add column if not exists bytes bigint;
+-- Hex "#RRGGBB"
+alter table memes add column if not exists dominant_color text;
+-- Last backfill attempt; rows that could not be measured keep width NULL and are retried later
+alter table memes add column if not exists metadata_checked_at timestamptz;
+
+-- Earlier backfills marked unmeasurable rows with width 0
+update memes set width = null where width = 0;
+
+create index if not exists memes_width_null_idx on memes (id desc) where width is null;
@@ -0,0 +1,21 @@
+-- Friends' activity feed (likes, saves, uploads), shared by all workers.
+-- Apply before deploying; likes, saves and uploads still succeed without it, but the
+-- activity feed stays empty and every recorded activity logs an error.
+create table if not exists activities (
+  id bigserial primary key,
+  actor_id text not null,
+  type text not null check (type in ('like', 'save', 'upload')),
+  meme_id bigint not null,
+  -- False for actors above ACTIVITY_FANOUT_MAX_FRIENDS: readers pull these in (fan-in)
+  fanned_out boolean not null default true,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists activities_fan_in_idx on activities (actor_id, id desc) where not fanned_out;
+
+-- One row per friend for fanned-out activities (fan-out on write)
+create table if not exists activity_timelines (
+  user_id text not null,
+  activity_id bigint not null references activities (id) on delete cascade,
+  primary key (user_id, activity_id)
+);
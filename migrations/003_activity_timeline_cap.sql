@@ -0,0 +1,52 @@
+-- Bounded activity timelines and the set of actors readers pull in (fan-in).
+-- Apply after 002_activity_feed.sql.
+
+-- Actors with activities stored for fan-in (fanned_out false): those above
+-- ACTIVITY_FANOUT_MAX_FRIENDS, or whose fan-out failed. Rows are kept when an actor
+-- drops below the threshold so their earlier activities stay readable.
+create table if not exists activity_fan_in_actors (
+  actor_id text primary key,
+  added_at timestamptz not null default now()
+);
+
+insert into activity_fan_in_actors (actor_id)
+select distinct actor_id from activities where not fanned_out
+on conflict do nothing;
+
+-- Fan an activity out to its recipients and trim each recipient's timeline to the
+-- newest max_length entries, in one round trip
+create or replace function fan_out_activity(p_activity_id bigint, p_user_ids text[], p_max_length integer)
+returns void
+language sql
+as $$
+  insert into activity_timelines (user_id, activity_id)
+  select unnest(p_user_ids), p_activity_id
+  on conflict do nothing;
+
+  -- Everything at or below each recipient's (max_length + 1)-th newest entry goes;
+  -- timelines are trimmed on every write, so this walks at most max_length index entries each
+  delete from activity_timelines t
+  using (
+    select recipient.user_id, cutoff.activity_id
+    from unnest(p_user_ids) as recipient(user_id)
+    cross join lateral (
+      select activity_id from activity_timelines x
+      where x.user_id = recipient.user_id
+      order by activity_id desc
+      offset p_max_length limit 1
+    ) cutoff
+  ) trimmed
+  where t.user_id = trimmed.user_id
+    and t.activity_id <= trimmed.activity_id;
+$$;
+
+-- Trim timelines that grew before the cap existed (500 is the default ACTIVITY_TIMELINE_MAX_LENGTH)
+delete from activity_timelines t
+using (
+  select user_id, activity_id,
+         row_number() over (partition by user_id order by activity_id desc) as position
+  from activity_timelines
+) ranked
+where t.user_id = ranked.user_id
+  and t.activity_id = ranked.activity_id
+  and ranked.position > 500;
@@ -0,0 +1,24 @@
+import time
+from types import SimpleNamespace
+from app.services.token_bucket import TokenBucket
+from app.services import reddit_service
+
+
+def test_empty_bucket_with_zero_rate_refills_at_reset():
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    bucket.update(rate=0.0, tokens=0, reset_in=0.2, reset_rate=5.0)
+    acquired, wait = bucket.try_acquire()
+    assert not acquired and wait <= 0.2
+    started = time.monotonic()
+    assert bucket.acquire(timeout=2)
+    assert time.monotonic() - started >= 0.15
+    assert bucket.rate == 5.0 and bucket.tokens == 2
+
+
+def test_reddit_remaining_zero_unblocks_at_reset_timestamp(monkeypatch):
+    bucket = TokenBucket(rate=1.0, capacity=5)
+    monkeypatch.setattr(reddit_service, "reddit_rate_budget", bucket)
+    reddit = SimpleNamespace(auth=SimpleNamespace(limits={"remaining": 0, "reset_timestamp": time.time() + 0.3}))
+    reddit_service._update_rate_budget(reddit)
+    assert not bucket.acquire(timeout=0.05)
+    assert bucket.acquire(timeout=2)